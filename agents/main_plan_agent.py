@@ -2,14 +2,32 @@
 主规划智能体
 简化版：不使用工具，仅使用 LLM 进行意图识别和回答
 """
+import asyncio
 import json
 from typing import AsyncGenerator, Optional
-from agentscope.models import DashScopeChatWrapper
-from agentscope.agents import ReActAgent
 
 from app.config import settings
-from context.memory import MemoryManager
+from chain.cancellation import (
+    CancelToken,
+    GenerationCancelled,
+    bind_cancel_token,
+    get_cancel_token,
+    record_cancellation,
+    unbind_cancel_token,
+)
+from chain.streamer import ResponseAggregator
+from context.assembler import RollingSummary
+from context.memory import MemoryManager, TurnCommit
+from context.long_term import is_preference, long_term_memory, trip_summary
+from context.prompt_builder import ConversationStage, PromptBuilder
+from context.prompt_compiler import CompiledPrompt, prompt_compiler, static
+from context.state_store import StateSnapshot, state_store
 from intent.classifier import IntentClassifier
+from observability.metrics import metrics
+from observability.tracer import current_trace
+from observability.timing import timed_iter
+
+_intent_lanes = metrics.counter("intent_lane_total", "意图分类走快车道/慢车道的次数", ("lane",))
 
 
 class MainPlanAgent:
@@ -18,14 +36,8 @@ class MainPlanAgent:
     负责协调各个子智能体，处理用户请求
     """
 
-    def __init__(self, session_id: str):
-        self.session_id = session_id
-        self.memory_manager = MemoryManager(session_id)
-        self.classifier = IntentClassifier()
-
-    def _get_system_prompt(self) -> str:
-        """获取系统提示词"""
-        return """你是阿里商旅智能助手，专门帮助用户处理差旅相关事务。
+    # 系统提示词
+    SYSTEM_PROMPT = """你是阿里商旅智能助手，专门帮助用户处理差旅相关事务。
 
 你的主要职责：
 1. 理解用户需求，识别用户意图
@@ -43,90 +55,221 @@ class MainPlanAgent:
 - 对于不确定的问题，主动询问用户确认
 - 如果遇到错误，给出清晰的错误提示和解决建议"""
 
+    def __init__(self, session_id: str, user_id: str = None):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.memory_manager = MemoryManager(session_id)
+        self.classifier = IntentClassifier()
+        self.cancel_token: Optional[CancelToken] = None
+        self.summary = RollingSummary(self.memory_manager)
+        self.prompt_builder = PromptBuilder()
+
+    def _get_system_prompt(self) -> str:
+        """获取系统提示词"""
+        # 系统提示词完全静态，作为稳定前缀以命中前缀缓存；会话数据通过上下文传入
+        return prompt_compiler.compile("main_plan_agent.system", [static(self.SYSTEM_PROMPT)]).text
+
+    async def compile_prompt(self, message: str) -> CompiledPrompt:
+        """
+        编译主 Prompt：近期对话在预算内逐字保留，滑出窗口的早期对话折叠进滚动摘要
+        （只在有新对话滑出时写回摘要），并附上召回的用户长期记忆
+        """
+        context = await self.memory_manager.get_context(limit=settings.context_cache_window)
+        history = self.prompt_builder.assembler.fit_history(context, settings.context_history_tokens)
+        summary = await self.summary.fold(context[:len(context) - len(history)])
+        memories = []
+        if self.user_id:
+            # 向量化与索引读取是同步操作，放到线程中执行
+            memories = await asyncio.to_thread(long_term_memory.recall, self.user_id, message)
+        return self.prompt_builder.compile_main_prompt(message, history, summary, memories)
+
     async def chat(self, message: str) -> dict:
-        """处理用户消息（非流式）"""
-        # 1. 意图分类（快车道/慢车道）
-        intent_result = self.classifier.classify(message)
+        """处理用户消息（非流式），与流式接口共用同一生成管线"""
+        aggregator = ResponseAggregator()
+        async for _ in self.stream_chat(message, aggregator=aggregator):
+            pass
+        return aggregator.result()
 
-        if intent_result and intent_result.get("type") == "simple":
-            # 快车道：直接路由
-            result = await self._handle_simple_intent(message, intent_result)
-        else:
-            # 慢车道：简单回答（暂时不使用工具）
-            result = await self._handle_simple_intent(message, {"intent": "chat", "type": "simple"})
+    async def stream_chat(
+        self,
+        message: str,
+        aggregator: Optional[ResponseAggregator] = None
+    ) -> AsyncGenerator[dict, None]:
+        """
+        处理用户消息（流式）
 
-        # 保存到记忆
-        await self.memory_manager.add_user_message(message)
-        await self.memory_manager.add_assistant_message(result["message"])
+        Args:
+            message: 用户消息
+            aggregator: 增量聚合器，生成的每个数据块都会折叠进去
+        """
+        aggregator = aggregator or ResponseAggregator()
+        cancel_token = CancelToken()
+        ctx_token = bind_cancel_token(cancel_token)
+        self.cancel_token = cancel_token
+        turn = self._run_turn(message, aggregator, cancel_token)
 
-        return result
+        try:
+            async for chunk in turn:
+                yield chunk
+        except GenerationCancelled:
+            # 主动取消：结束流，不再继续生成
+            record_cancellation(cancel_token)
+        except (GeneratorExit, asyncio.CancelledError):
+            # 客户端断开：停止生成并记录节省的开销
+            cancel_token.cancel("client_disconnect")
+            record_cancellation(cancel_token)
+            raise
+        finally:
+            # 关闭下游生成器，使子智能体流与工具调用一并停止
+            await turn.aclose()
+            unbind_cancel_token(ctx_token)
+
+    def cancel(self, reason: str = "cancelled"):
+        """取消进行中的生成"""
+        if self.cancel_token:
+            self.cancel_token.cancel(reason)
+
+    async def _run_turn(
+        self,
+        message: str,
+        aggregator: ResponseAggregator,
+        cancel_token: CancelToken
+    ) -> AsyncGenerator[dict, None]:
+        """执行一轮对话的生成管线"""
+        # 恢复状态机：一次主键查询，无需回放对话历史
+        snapshot = await state_store.load(self.session_id)
+        self.prompt_builder.restore(snapshot)
 
-    async def stream_chat(self, message: str) -> AsyncGenerator[dict, None]:
-        """处理用户消息（流式）"""
-        # 1. 意图分类
+        # 1. 意图分类（快车道/慢车道）
         intent_result = self.classifier.classify(message)
 
         # 发送意图识别结果
-        yield {
+        intent_chunk = {
             "type": "intent",
             "intent": intent_result.get("intent") if intent_result else "unknown",
             "channel": "fast" if intent_result and intent_result.get("type") == "simple" else "slow"
         }
+        aggregator.add(intent_chunk)
+        _intent_lanes.labels(intent_chunk["channel"]).inc()
+        trace = current_trace()
+        if trace is not None:
+            # 意图与车道参与尾部采样决定
+            trace.input = message
+            trace.intent = intent_chunk["intent"]
+            trace.lane = intent_chunk["channel"]
+            trace.span("intent", input=message, output=intent_result)
+        yield intent_chunk
 
-        if intent_result and intent_result.get("type") == "simple":
-            # 快车道
-            async for chunk in self._handle_simple_intent_stream(message, intent_result):
-                yield chunk
+        if not (intent_result and intent_result.get("type") == "simple"):
+            # 慢车道：简单回答（暂时不使用工具）
+            intent_result = {"intent": "chat", "type": "simple"}
+            # 慢车道需要完整上下文：折叠滚动摘要、召回长期记忆并编译主 Prompt
+            prompt = await self.compile_prompt(message)
+            if trace is not None:
+                trace.span("prompt", input=prompt.text, output={
+                    "fingerprint": prompt.fingerprint,
+                    "prefix_tokens": prompt.prefix_tokens,
+                    "tail_tokens": prompt.tail_tokens,
+                })
         else:
-            async for chunk in self._handle_simple_intent_stream(message, {"intent": "chat", "type": "simple"}):
-                yield chunk
+            # 推进状态机
+            self.prompt_builder.set_stage(self.prompt_builder.get_next_stage(intent_result["intent"]))
+        for key, value in (intent_result.get("entities") or {}).items():
+            self.prompt_builder.update_info(key, value)
+
+        async for chunk in timed_iter("agent", self._handle_simple_intent_stream(message, intent_result)):
+            cancel_token.raise_if_cancelled()
+            aggregator.add(chunk)
+            if chunk.get("type") == "text":
+                cancel_token.progress()
+            elif chunk.get("type") == "done":
+                # 记忆、消息、会话更新时间与状态快照作为一轮统一提交，之后再结束流
+                turn = self.memory_manager.new_turn()
+                turn.add_user_message(message)
+                turn.add_assistant_message(aggregator.message, extra_data={
+                    "intent": aggregator.intent,
+                    "response_type": aggregator.response_type,
+                })
+                await self._commit_turn(turn, snapshot)
+                if self.user_id:
+                    await asyncio.to_thread(self._remember, message)
+                if trace is not None:
+                    trace.output = aggregator.message
+            yield chunk
+
+    async def _commit_turn(self, turn: TurnCommit, snapshot: StateSnapshot):
+        """
+        提交一轮对话；状态有变化时快照随本轮在同一事务中以 CAS 写入，
+        版本冲突时整轮回滚，基于最新快照重放本轮变更后重试，多次冲突则只提交对话
+        """
+        for _ in range(3):
+            if not self.prompt_builder.apply_to(snapshot):
+                break
+            turn.state = snapshot
+            if await self.memory_manager.commit_turn(turn):
+                return
 
-    async def _handle_simple_intent(self, message: str, intent_result: dict) -> dict:
-        """处理简单意图"""
+            # 并发写入冲突：以最新快照为基础，合并本轮的阶段与槽位
+            stage = self.prompt_builder.current_stage
+            slots = self.prompt_builder.get_collected_info()
+            snapshot = await state_store.load(self.session_id)
+            self.prompt_builder.restore(snapshot)
+            self.prompt_builder.set_stage(stage)
+            self.prompt_builder.collected_info.update(slots)
+
+        turn.state = None
+        await self.memory_manager.commit_turn(turn)
+
+    def _remember(self, message: str):
+        """沉淀跨会话的长期记忆：用户偏好与确认的行程（同步执行，重复内容由长期记忆去重）"""
+        if is_preference(message):
+            long_term_memory.remember(self.user_id, message, "preference", self.session_id)
+
+        slots = self.prompt_builder.get_collected_info()
+        if self.prompt_builder.current_stage == ConversationStage.ORDER_CONFIRM and slots:
+            long_term_memory.remember(self.user_id, trip_summary(slots), "trip", self.session_id)
+
+    def _resolve_response(self, message: str, intent_result: dict) -> tuple:
+        """根据意图确定响应文本，返回 (响应文本, 意图, 响应类型)"""
         intent = intent_result.get("intent")
 
         # 根据意图返回不同的响应
         if intent == "trip_planner" or "规划" in message:
-            return {
-                "message": "好的，我来帮您规划出差行程。请告诉我以下信息：\n1. 目的地是哪里？\n2. 出发时间是什么时候？\n3. 计划什么时候返回？\n4. 出差目的是什么？",
-                "intent": intent_result.get("intent"),
-                "type": "trip_plan"
-            }
+            return (
+                "好的，我来帮您规划出差行程。请告诉我以下信息：\n1. 目的地是哪里？\n2. 出发时间是什么时候？\n3. 计划什么时候返回？\n4. 出差目的是什么？",
+                intent,
+                "trip_plan"
+            )
         elif intent == "rag_agent" or "政策" in message or "差标" in message:
-            return {
-                "message": "关于差旅政策，我为您查询到以下信息：\n\n差标是指本次差旅形成中，出行人乘坐飞机以及入住酒店等差旅类目的费用标准。\n\n预算指的是本次差旅出行的整体预算费用，包括交通、住宿、餐饮等各项支出。\n\n如果您想了解更多具体政策，请告诉我您想了解哪方面的内容。",
-                "intent": intent_result.get("intent"),
-                "type": "policy_query"
-            }
+            return (
+                "关于差旅政策，我为您查询到以下信息：\n\n差标是指本次差旅形成中，出行人乘坐飞机以及入住酒店等差旅类目的费用标准。\n\n预算指的是本次差旅出行的整体预算费用，包括交通、住宿、餐饮等各项支出。\n\n如果您想了解更多具体政策，请告诉我您想了解哪方面的内容。",
+                intent,
+                "policy_query"
+            )
         elif intent == "apply" or "申请" in message:
-            return {
-                "message": "好的，我来帮您申请订单。请先确认您的行程信息，我已经记录了您之前的出差需求。",
-                "intent": intent_result.get("intent"),
-                "type": "apply"
-            }
+            return (
+                "好的，我来帮您申请订单。请先确认您的行程信息，我已经记录了您之前的出差需求。",
+                intent,
+                "apply"
+            )
         else:
             # 默认对话
-            return {
-                "message": f"收到您的消息：{message}\n\n我是阿里商旅智能助手，可以帮您：\n- 规划出差行程\n- 查询差旅政策\n- 申请订单\n\n请问有什么可以帮到您的？",
-                "intent": "chat",
-                "type": "chat"
-            }
+            return (
+                f"收到您的消息：{message}\n\n我是阿里商旅智能助手，可以帮您：\n- 规划出差行程\n- 查询差旅政策\n- 申请订单\n\n请问有什么可以帮到您的？",
+                "chat",
+                "chat"
+            )
 
     async def _handle_simple_intent_stream(self, message: str, intent_result: dict) -> AsyncGenerator[dict, None]:
         """处理简单意图（流式）"""
-        intent = intent_result.get("intent")
+        response, intent, response_type = self._resolve_response(message, intent_result)
 
-        if intent == "trip_planner" or "规划" in message:
-            response = "好的，我来帮您规划出差行程。请告诉我以下信息：\n1. 目的地是哪里？\n2. 出发时间是什么时候？\n3. 计划什么时候返回？\n4. 出差目的是什么？"
-        elif intent == "rag_agent" or "政策" in message or "差标" in message:
-            response = "关于差旅政策，我为您查询到以下信息：\n\n差标是指本次差旅形成中，出行人乘坐飞机以及入住酒店等差旅类目的费用标准。\n\n预算指的是本次差旅出行的整体预算费用，包括交通、住宿、餐饮等各项支出。"
-        elif intent == "apply" or "申请" in message:
-            response = "好的，我来帮您申请订单。请先确认您的行程信息。"
-        else:
-            response = f"收到您的消息：{message}\n\n我是阿里商旅智能助手，可以帮您规划出差行程、查询差旅政策、申请订单。"
+        cancel_token = get_cancel_token()
+        if cancel_token:
+            cancel_token.expect(len(response))
 
         # 流式输出
         for char in response:
             yield {"type": "text", "content": char}
 
-        yield {"type": "done"}
+        yield {"type": "done", "intent": intent, "response_type": response_type}
@@ -6,13 +6,35 @@ from agentscope.agents import ReActAgent
 from agentscope.models import DashScopeChatWrapper
 
 from app.config import settings
+from chain.cancellation import check_cancelled
+from context.assembler import token_counter
 from context.memory import MemoryManager
+from context.prompt_compiler import prompt_compiler, static
+from observability.metrics import llm_call, llm_stream
+from observability.timing import stage, timed_iter
 from agents.tools import knowledge_tools
 
 
 class RAGAgent:
     """RAG 知识库智能体"""
 
+    # 系统提示词
+    SYSTEM_PROMPT = """你是阿里商旅的知识库助手。
+
+你的职责是回答用户关于差旅政策、企业制度等相关问题。
+
+可查询的内容：
+- 差旅费用标准（差标）
+- 报销政策
+- 预订流程
+- 企业差旅规定
+
+工作流程：
+1. 理解用户的问题
+2. 搜索相关知识库内容
+3. 结合知识库内容给出准确的回答
+4. 如果知识库没有相关内容，请明确告知用户"""
+
     def __init__(self, session_id: str):
         self.session_id = session_id
         self.memory_manager = MemoryManager(session_id)
@@ -29,27 +51,17 @@ class RAGAgent:
         )
 
     def _get_system_prompt(self) -> str:
-        return """你是阿里商旅的知识库助手。
-
-你的职责是回答用户关于差旅政策、企业制度等相关问题。
-
-可查询的内容：
-- 差旅费用标准（差标）
-- 报销政策
-- 预订流程
-- 企业差旅规定
-
-工作流程：
-1. 理解用户的问题
-2. 搜索相关知识库内容
-3. 结合知识库内容给出准确的回答
-4. 如果知识库没有相关内容，请明确告知用户"""
+        """获取系统提示词"""
+        # 系统提示词完全静态，作为稳定前缀以命中前缀缓存；会话数据通过上下文传入
+        return prompt_compiler.compile("rag_agent.system", [static(self.SYSTEM_PROMPT)]).text
 
     async def query(self, user_input: str) -> dict:
         """查询知识库"""
         context = await self.memory_manager.get_context(agent_name="rag_agent")
 
-        response = self.agent(user_input, context)
+        with stage("agent_rag"), llm_call("rag_agent") as call:
+            response = self.agent(user_input, context)
+        call.tokens(token_counter.count(user_input), token_counter.count(response.content))
 
         return {
             "message": response.content,
@@ -61,5 +73,8 @@ class RAGAgent:
         """流式查询知识库"""
         context = await self.memory_manager.get_context(agent_name="rag_agent")
 
-        async for chunk in self.agent.stream_run(user_input, context):
+        stream = llm_stream("rag_agent", self.agent.stream_run(user_input, context), token_counter.count)
+        async for chunk in timed_iter("agent_rag", stream):
+            # 客户端断开后不再继续向下游生成
+            check_cancelled()
             yield chunk
@@ -5,16 +5,22 @@
 from typing import List
 from agentscope.service import ServiceToolkit
 
+from chain.cancellation import check_cancelled
+from observability.timing import timed
+
 
 # 创建工具包
 toolkit = ServiceToolkit()
 
 
 # 定义工具函数
+@timed("tool_search_knowledge")
 def search_knowledge(query: str, top_k: int = 3) -> str:
     """搜索知识库"""
     from knowledge.client import KnowledgeClient
 
+    check_cancelled()
+
     client = KnowledgeClient()
     results = client.sync_query(query, top_k)
 
@@ -29,10 +35,13 @@ def search_knowledge(query: str, top_k: int = 3) -> str:
     return output
 
 
+@timed("tool_query_trip_policy")
 def query_trip_policy(policy_type: str = "差标") -> str:
     """查询差旅政策"""
     from knowledge.client import KnowledgeClient
 
+    check_cancelled()
+
     client = KnowledgeClient()
     results = client.sync_query(f"什么是{policy_type}", top_k=1)
 
@@ -42,6 +51,7 @@ def query_trip_policy(policy_type: str = "差标") -> str:
         return f"未找到关于{policy_type}的相关政策"
 
 
+@timed("tool_plan_trip")
 def plan_trip(
     destination: str,
     start_date: str = None,
@@ -69,6 +79,7 @@ def plan_trip(
     return output
 
 
+@timed("tool_book_ticket")
 def book_ticket(
     ticket_type: str,
     from_city: str,
@@ -88,6 +99,7 @@ def book_ticket(
 """
 
 
+@timed("tool_collect_trip_info")
 def collect_trip_info(info_type: str, info: str) -> str:
     """收集出差信息"""
     return f"已收集 {info_type}: {info}，请问还有其他信息需要补充吗？"
@@ -6,13 +6,34 @@ from agentscope.agents import ReActAgent
 from agentscope.models import DashScopeChatWrapper
 
 from app.config import settings
+from chain.cancellation import check_cancelled
+from context.assembler import token_counter
 from context.memory import MemoryManager
+from context.prompt_compiler import prompt_compiler, static
+from observability.metrics import llm_call, llm_stream
+from observability.timing import stage, timed_iter
 from agents.tools import trip_tools
 
 
 class TripPlannerAgent:
     """行程规划智能体"""
 
+    # 系统提示词
+    SYSTEM_PROMPT = """你是阿里商旅的行程规划专家。
+
+你的职责是帮助用户规划完整的出差行程。
+
+工作流程：
+1. 首先收集用户的出差信息（目的地、时间、目的等）
+2. 根据收集的信息为用户规划行程
+3. 提供交通和住宿建议
+4. 引导用户完成订单申请
+
+重要提示：
+- 遵循循序渐进的原则，不要一次性询问所有问题
+- 根据用户的回答逐步补充行程信息
+- 在信息收集完成后，主动给出行程规划建议"""
+
     def __init__(self, session_id: str):
         self.session_id = session_id
         self.memory_manager = MemoryManager(session_id)
@@ -29,26 +50,17 @@ class TripPlannerAgent:
         )
 
     def _get_system_prompt(self) -> str:
-        return """你是阿里商旅的行程规划专家。
-
-你的职责是帮助用户规划完整的出差行程。
-
-工作流程：
-1. 首先收集用户的出差信息（目的地、时间、目的等）
-2. 根据收集的信息为用户规划行程
-3. 提供交通和住宿建议
-4. 引导用户完成订单申请
-
-重要提示：
-- 遵循循序渐进的原则，不要一次性询问所有问题
-- 根据用户的回答逐步补充行程信息
-- 在信息收集完成后，主动给出行程规划建议"""
+        """获取系统提示词"""
+        # 系统提示词完全静态，作为稳定前缀以命中前缀缓存；会话数据通过上下文传入
+        return prompt_compiler.compile("trip_planner.system", [static(self.SYSTEM_PROMPT)]).text
 
     async def plan(self, user_input: str) -> dict:
         """规划行程"""
         context = await self.memory_manager.get_context(agent_name="trip_planner")
 
-        response = self.agent(user_input, context)
+        with stage("agent_trip_planner"), llm_call("trip_planner") as call:
+            response = self.agent(user_input, context)
+        call.tokens(token_counter.count(user_input), token_counter.count(response.content))
 
         return {
             "message": response.content,
@@ -60,5 +72,8 @@ class TripPlannerAgent:
         """流式规划行程"""
         context = await self.memory_manager.get_context(agent_name="trip_planner")
 
-        async for chunk in self.agent.stream_run(user_input, context):
+        stream = llm_stream("trip_planner", self.agent.stream_run(user_input, context), token_counter.count)
+        async for chunk in timed_iter("agent_trip_planner", stream):
+            # 客户端断开后不再继续向下游生成
+            check_cancelled()
             yield chunk
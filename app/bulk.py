@@ -0,0 +1,240 @@
+"""
+批量导出导入模块
+以 NDJSON 流式导出会话、状态、消息与记忆，每行为 {"table": 表名, "row": 行}，
+与保留策略的归档格式一致；支持 gzip / zstd 压缩。
+导出使用服务端游标逐批读取，导入按块多行插入，内存占用与数据量无关
+"""
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from sqlalchemy import DateTime, insert, select
+
+from app.config import settings
+from app.database import async_session, Conversation, ConversationState, Message, SessionMemory
+from app.serialization import loads, ndjson_line
+
+
+# 可导出导入的表，按导出顺序排列
+TABLES = {
+    model.__tablename__: model
+    for model in (Conversation, ConversationState, Message, SessionMemory)
+}
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+MEDIA_TYPES = {
+    "none": "application/x-ndjson",
+    "gzip": "application/gzip",
+    "zstd": "application/zstd",
+}
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class BulkError(ValueError):
+    """导出导入参数或数据错误"""
+
+
+def _zstandard():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        raise BulkError("zstd 压缩需要安装 zstandard")
+
+
+class _Compressor:
+    """流式压缩"""
+
+    def __init__(self, compression: str):
+        if compression not in COMPRESSIONS:
+            raise BulkError(f"不支持的压缩格式: {compression}")
+        self.compression = compression
+        if compression == "gzip":
+            self._obj = zlib.compressobj(wbits=31)
+        elif compression == "zstd":
+            self._obj = _zstandard().ZstdCompressor().compressobj()
+        else:
+            self._obj = None
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data) if self._obj else data
+
+    def flush(self) -> bytes:
+        return self._obj.flush() if self._obj else b""
+
+
+class _Decompressor:
+    """流式解压，按首个数据块的魔数识别格式"""
+
+    def __init__(self):
+        self._obj = None
+        self._detected = False
+
+    def decompress(self, data: bytes) -> bytes:
+        if not data:
+            return b""
+        if not self._detected:
+            self._detected = True
+            if data.startswith(_GZIP_MAGIC):
+                self._obj = zlib.decompressobj(wbits=31)
+            elif data.startswith(_ZSTD_MAGIC):
+                self._obj = _zstandard().ZstdDecompressor().decompressobj()
+        if self._obj is None:
+            return data
+        try:
+            return self._obj.decompress(data)
+        except Exception as e:
+            raise BulkError(f"解压失败: {e}")
+
+
+def _table_query(model, user_id: Optional[str]):
+    """某表的导出查询，指定 user_id 时只导出该用户的会话"""
+    query = select(model.__table__)
+    if user_id is None:
+        return query
+    if model is Conversation:
+        return query.where(Conversation.user_id == user_id)
+    return query.where(model.session_id.in_(
+        select(Conversation.session_id).where(Conversation.user_id == user_id)
+    ))
+
+
+async def export_ndjson(
+    user_id: Optional[str] = None,
+    tables: Iterable[str] = None,
+    compression: str = "none",
+    session_factory=async_session
+) -> AsyncIterator[bytes]:
+    """
+    流式导出
+
+    Args:
+        user_id: 只导出该用户的会话及其数据；为空时导出全部
+        tables: 要导出的表，默认全部
+        compression: none / gzip / zstd
+    """
+    compressor = _Compressor(compression)
+    names = list(tables or TABLES)
+    for name in names:
+        if name not in TABLES:
+            raise BulkError(f"不支持的表: {name}")
+
+    async def generate():
+        batch_size = settings.bulk_batch_size
+        async with session_factory() as db:
+            for name in names:
+                # 服务端游标逐批读取
+                result = await db.stream(
+                    _table_query(TABLES[name], user_id).execution_options(yield_per=batch_size)
+                )
+                async for rows in result.mappings().partitions(batch_size):
+                    data = b"".join(ndjson_line({"table": name, "row": dict(row)}) for row in rows)
+                    chunk = compressor.compress(data)
+                    if chunk:
+                        yield chunk
+
+        tail = compressor.flush()
+        if tail:
+            yield tail
+
+    return generate()
+
+
+def _row_decoder(model):
+    """将 JSON 行还原为可插入的取值"""
+    columns = {c.key: c for c in model.__table__.columns}
+    datetimes = [key for key, c in columns.items() if isinstance(c.type, DateTime)]
+
+    def decode(row: dict) -> dict:
+        row = {k: v for k, v in row.items() if k in columns}
+        for key in datetimes:
+            if isinstance(row.get(key), str):
+                row[key] = datetime.fromisoformat(row[key])
+        return row
+
+    return decode
+
+
+def _insert_statement(model, dialect: str, on_conflict: str):
+    """多行插入语句；skip 模式下跳过主键已存在的行"""
+    if on_conflict == "skip":
+        if dialect == "sqlite":
+            from sqlalchemy.dialects import sqlite
+            return sqlite.insert(model.__table__).on_conflict_do_nothing()
+        if dialect == "postgresql":
+            from sqlalchemy.dialects import postgresql
+            return postgresql.insert(model.__table__).on_conflict_do_nothing()
+    return insert(model.__table__)
+
+
+async def import_ndjson(
+    chunks: AsyncIterator[bytes],
+    on_conflict: str = "skip",
+    session_factory=async_session
+) -> Dict[str, int]:
+    """
+    流式导入，自动识别 gzip / zstd 压缩
+
+    Args:
+        chunks: 请求体数据块
+        on_conflict: skip 跳过已存在的行；fail 遇到冲突时报错
+
+    Returns:
+        各表读取的行数
+    """
+    if on_conflict not in ("skip", "fail"):
+        raise BulkError(f"不支持的冲突处理方式: {on_conflict}")
+
+    batch_size = settings.bulk_batch_size
+    decompressor = _Decompressor()
+    decoders = {name: _row_decoder(model) for name, model in TABLES.items()}
+    buffers: Dict[str, List[dict]] = {name: [] for name in TABLES}
+    counts: Dict[str, int] = {}
+    remainder = b""
+    line_no = 0
+
+    async with session_factory() as db:
+        dialect = db.bind.dialect.name
+
+        async def write(name: str):
+            rows, buffers[name] = buffers[name], []
+            if rows:
+                await db.execute(_insert_statement(TABLES[name], dialect, on_conflict), rows)
+                await db.commit()
+                counts[name] = counts.get(name, 0) + len(rows)
+
+        def parse(line: bytes) -> Optional[str]:
+            nonlocal line_no
+            line_no += 1
+            if not line.strip():
+                return None
+            try:
+                record = loads(line)
+                name = record["table"]
+                if name not in TABLES:
+                    raise BulkError(f"第 {line_no} 行: 不支持的表 {name}")
+                buffers[name].append(decoders[name](record["row"]))
+            except (ValueError, KeyError, TypeError) as e:
+                if isinstance(e, BulkError):
+                    raise
+                raise BulkError(f"第 {line_no} 行无效: {e!r}")
+            return name
+
+        async for chunk in chunks:
+            data = remainder + decompressor.decompress(chunk)
+            lines = data.split(b"\n")
+            remainder = lines.pop()
+            for line in lines:
+                name = parse(line)
+                if name and len(buffers[name]) >= batch_size:
+                    await write(name)
+
+        if remainder:
+            parse(remainder)
+        for name in TABLES:
+            await write(name)
+
+    return counts
@@ -1,6 +1,6 @@
 # 配置管理
 import os
-from typing import Optional
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -32,10 +32,116 @@ class Settings(BaseSettings):
 
     # 数据库配置
     database_url: str = "sqlite+aiosqlite:///./data/agentchekong.db"
+    database_echo: bool = False  # 打印全部 SQL，仅排查问题时开启
+    database_profile: str = "auto"  # auto 按 URL 选择 sqlite/postgres；default 不调优
+
+    # SQLite 存储配置
+    sqlite_journal_mode: str = "wal"
+    sqlite_synchronous: str = "normal"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kb: int = 64 * 1024
+
+    # PostgreSQL 存储配置
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    pg_statement_cache_size: int = 500
 
     # 会话配置
     session_expire_hours: int = 24
 
+    # 分页配置
+    page_size_max: int = 200
+    export_page_size: int = 500
+
+    # JSON 序列化配置：auto 优先 orjson，json 强制使用标准库
+    json_backend: str = "auto"
+
+    # 批量导出导入配置
+    bulk_batch_size: int = 2000
+
+    # 日志配置：log_level 为根 logger 级别，debug 开启时只把应用自身的 logger 调到 DEBUG；
+    # log_format 为 json 或 text，DEBUG 日志按调用点每秒限流
+    log_dir: str = "./logs"
+    log_level: str = "INFO"
+    log_format: str = "json"
+    log_queue_size: int = 10000
+    log_debug_rate_limit: int = 20
+
+    # 追踪导出配置：trace_export_dir 为空时不写本地文件
+    trace_export_dir: str = "./data/traces"
+    trace_export_batch_size: int = 100
+    trace_export_flush_interval_ms: int = 1000
+    trace_export_max_queue: int = 10000
+
+    # 追踪采样配置：头部按意图/路由比例（JSON 对象），尾部保留慢请求、出错与慢车道
+    trace_sample_ratio: float = 0.1
+    trace_sample_routes: Dict[str, float] = {}
+    trace_sample_intents: Dict[str, float] = {}
+    trace_tail_latency_ms: int = 2000
+    trace_tail_errors: bool = True
+    trace_tail_slow_lane: bool = True
+    trace_max_buffered_events: int = 200
+
+    # 本地追踪存储配置：不受采样影响记录每轮对话的阶段耗时，路径为空时关闭
+    trace_store_path: str = "./data/trace_store.db"
+    trace_store_retention_days: int = 7
+
+    # 指标配置：事件循环延迟采样间隔，0 表示不采样
+    metrics_loop_lag_interval_ms: int = 500
+
+    # 事件循环阻塞检测：默认关闭，阻塞超过阈值时记录调用栈、会话与路由
+    loop_watchdog_enabled: bool = False
+    loop_watchdog_threshold_ms: int = 100
+    loop_watchdog_stack_limit: int = 30
+
+    # 启动预热配置
+    warmup_enabled: bool = True
+    warmup_db_connections: int = 5
+    warmup_cache_snapshot: str = "./data/context_cache_snapshot.json"
+    warmup_cache_sessions: int = 500
+    warmup_synthetic_turn: bool = False
+
+    # 会话保留策略配置：默认关闭；开启后按 session_expire_hours 归档并删除不活跃的会话
+    retention_enabled: bool = False
+    retention_interval_minutes: int = 60
+    retention_session_batch: int = 100
+    retention_row_batch: int = 500
+    retention_archive_dir: str = "./data/archive"
+    retention_archive_compression: str = "zstd"
+
+    # 记忆写后缓冲配置：连续失败 memory_flush_max_retries 次后逐行写入并丢弃坏行
+    memory_write_behind: bool = True
+    memory_flush_interval_ms: int = 50
+    memory_flush_batch_size: int = 500
+    memory_max_pending: int = 10000
+    memory_flush_max_retries: int = 5
+
+    # 会话上下文缓存配置：进程内缓存，多个工作进程服务同一会话时会读到旧窗口，需按会话粘性路由或关闭
+    context_cache_enabled: bool = True
+    context_cache_window: int = 50
+    context_cache_max_sessions: int = 10000
+    context_cache_max_bytes: int = 64 * 1024 * 1024
+
+    # 上下文 token 预算配置
+    context_token_budget: int = 3000
+    context_history_tokens: int = 1500
+    context_summary_tokens: int = 600
+    context_summary_line_tokens: int = 48
+
+    # 长期记忆配置：索引目录由第一个打开它的进程独占，多工作进程时其余进程的长期记忆不可用
+    long_term_memory_enabled: bool = True
+    long_term_memory_dir: str = "./data/long_term"
+    long_term_memory_dim: int = 256
+    long_term_recall_k: int = 3
+
+    # WebSocket 多路复用配置
+    ws_initial_credit: int = 256
+    ws_max_streams: int = 32
+
     class Config:
         env_file = ".env"
         extra = "allow"
@@ -50,7 +156,7 @@ def init_config():
     """初始化配置"""
     # 确保必要的目录存在
     os.makedirs("./data", exist_ok=True)
-    os.makedirs("./logs", exist_ok=True)
+    os.makedirs(settings.log_dir, exist_ok=True)
 
     # 检查必要的配置
     if not settings.dashscope_api_key:
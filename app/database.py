@@ -4,11 +4,11 @@
 import uuid
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import String, DateTime, Text, Float, JSON
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy import String, DateTime, Text, Float, Integer, JSON, Index
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
-from app.config import settings
+from app.storage import create_engine
 
 
 class Base(DeclarativeBase):
@@ -27,6 +27,13 @@ class Conversation(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
     extra_data: Mapped[dict] = mapped_column(JSON, default=dict)
 
+    __table_args__ = (
+        # 用户会话列表按 (更新时间, 会话ID) 分页
+        Index("ix_conversations_user_updated_session", "user_id", "updated_at", "session_id"),
+        # 过期会话清理
+        Index("ix_conversations_updated", "updated_at"),
+    )
+
 
 class Message(Base):
     """消息表"""
@@ -39,6 +46,11 @@ class Message(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     extra_data: Mapped[dict] = mapped_column(JSON, default=dict)
 
+    __table_args__ = (
+        # 消息按 (创建时间, ID) 分页
+        Index("ix_messages_session_created_id", "session_id", "created_at", "id"),
+    )
+
 
 class SessionMemory(Base):
     """会话记忆表"""
@@ -51,6 +63,26 @@ class SessionMemory(Base):
     content: Mapped[str] = mapped_column(Text)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
 
+    __table_args__ = (
+        # 最近窗口 / 全部上下文
+        Index("ix_session_memories_session_created", "session_id", "created_at"),
+        # 按智能体取上下文
+        Index("ix_session_memories_session_agent_created", "session_id", "agent_name", "created_at"),
+        # 按类型取最近记忆（意图、摘要）
+        Index("ix_session_memories_session_type_created", "session_id", "memory_type", "created_at"),
+    )
+
+
+class ConversationState(Base):
+    """会话状态快照表"""
+    __tablename__ = "conversation_states"
+
+    session_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=1)
+    stage: Mapped[str] = mapped_column(String(32))
+    slots: Mapped[dict] = mapped_column(JSON, default=dict)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+
 
 class EvaluationResult(Base):
     """评测结果表"""
@@ -67,12 +99,8 @@ class EvaluationResult(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
 
 
-# 数据库引擎
-engine = create_async_engine(
-    settings.database_url,
-    echo=settings.debug,
-    future=True,
-)
+# 数据库引擎（按 database_url 选择 SQLite / PostgreSQL 存储配置）
+engine = create_engine()
 
 # 会话工厂
 async_session = async_sessionmaker(
@@ -83,10 +111,13 @@ async_session = async_sessionmaker(
 
 
 async def init_db():
-    """初始化数据库"""
+    """初始化数据库：建表后执行未应用的迁移"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+    from app.migrations import run_migrations
+    await run_migrations(engine)
+
 
 async def get_db():
     """获取数据库会话"""
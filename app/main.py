@@ -3,10 +3,13 @@ import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 
 from app.config import init_config, settings
-from app.routers import chat, conversation, knowledge
+from app.routers import bulk, chat, conversation, knowledge
+from app.serialization import FastJSONResponse
+from observability.metrics import CONTENT_TYPE, RequestMetricsMiddleware, metrics
+from observability.timing import ServerTimingMiddleware
 
 
 @asynccontextmanager
@@ -16,15 +19,69 @@ async def lifespan(app: FastAPI):
     init_config()
     print(f"🚀 {settings.app_name} 启动中...")
 
+    # 日志经队列由后台线程写出
+    from observability.logger import setup_logging, shutdown_logging
+    setup_logging()
+
     # 初始化数据库
     from app.database import init_db
     await init_db()
 
+    # 启动过期会话清理
+    from context.retention import retention_sweeper
+    if settings.retention_enabled:
+        retention_sweeper.start()
+
+    # 事件循环延迟采样
+    from observability.event_loop import loop_block_watchdog, loop_lag_monitor
+    loop_lag_monitor.start()
+    if settings.loop_watchdog_enabled:
+        loop_block_watchdog.start()
+
+    # 追踪异步批量导出
+    from observability.exporter import trace_exporter
+    trace_exporter.start()
+
+    # 后台预热，完成后 /health 才报告就绪
+    from app.warmup import mark_ready, save_cache_snapshot, warm_up
+    warmup_task = None
+    if settings.warmup_enabled:
+        warmup_task = asyncio.create_task(warm_up())
+    else:
+        mark_ready()
+
     yield
 
     # 关闭时执行
     print(f"🛑 {settings.app_name} 关闭中...")
 
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+        try:
+            await warmup_task
+        except asyncio.CancelledError:
+            pass
+
+    await retention_sweeper.stop()
+    await loop_lag_monitor.stop()
+    await loop_block_watchdog.stop()
+
+    # 落库写后缓冲中的剩余记忆
+    from context.memory import write_buffer
+    await write_buffer.stop()
+
+    # 导出剩余追踪记录
+    await trace_exporter.stop()
+
+    # 保存热点会话快照，供下次启动预热缓存
+    save_cache_snapshot()
+
+    # 刷写长期记忆索引
+    from context.long_term import long_term_memory
+    long_term_memory.close()
+
+    shutdown_logging()
+
 
 # 创建 FastAPI 应用
 app = FastAPI(
@@ -32,6 +89,7 @@ app = FastAPI(
     description="阿里商旅多智能体差旅助手 API",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # 配置 CORS
@@ -41,8 +99,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# 分阶段耗时，写入 Server-Timing 响应头
+app.add_middleware(ServerTimingMiddleware)
+
+# 按路由记录请求数与耗时
+app.add_middleware(RequestMetricsMiddleware)
+
 
 # 注册路由
 app.include_router(
@@ -60,6 +125,11 @@ app.include_router(
     prefix=settings.api_prefix,
     tags=["知识库"]
 )
+app.include_router(
+    bulk.router,
+    prefix=settings.api_prefix,
+    tags=["数据迁移"]
+)
 
 
 @app.get("/")
@@ -74,8 +144,31 @@ async def root():
 
 @app.get("/health")
 async def health():
-    """健康检查"""
-    return {"status": "healthy"}
+    """就绪检查：预热完成前返回 503"""
+    from app.warmup import warmup_state
+
+    if not warmup_state.ready:
+        return FastJSONResponse(
+            {"status": "warming", "warmup": warmup_state.to_dict()},
+            status_code=503
+        )
+
+    return {
+        "status": "healthy" if warmup_state.ok else "degraded",
+        "warmup": warmup_state.to_dict()
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus 指标导出"""
+    return Response(metrics.expose(), media_type=CONTENT_TYPE)
+
+
+@app.get("/health/live")
+async def health_live():
+    """存活检查"""
+    return {"status": "alive"}
 
 
 if __name__ == "__main__":
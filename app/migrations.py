@@ -0,0 +1,221 @@
+"""
+数据库迁移模块
+按版本号顺序执行迁移，已应用的版本记录在 schema_migrations 表中。
+create_all 只会创建缺失的表，已有数据库上的索引等变更需要通过迁移补齐。
+多个工作进程可同时启动：每个迁移先占用版本号再执行，版本号已被其他进程应用时视为成功。
+PostgreSQL 上索引迁移在事务外以 CONCURRENTLY 方式执行，建索引期间不阻塞表的写入
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL 事务级咨询锁的键，串行化各进程的迁移
+_ADVISORY_LOCK_KEY = 0x61676368
+
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(128), nullable=False),
+    Column("applied_at", DateTime, default=datetime.now),
+)
+
+
+@dataclass
+class Migration:
+    """单个迁移"""
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+    # False 时 PostgreSQL 上在事务外逐条执行（CONCURRENTLY 不能在事务中使用），各步骤须可重复执行
+    transactional: bool = True
+
+
+# PostgreSQL 上并发建索引失败会留下无效索引
+_INVALID_INDEX = text(
+    "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+    "WHERE c.relname = :name AND NOT i.indisvalid"
+)
+
+
+def _create_index(name: str, table: str, *columns: str) -> Callable[[Connection], None]:
+    """创建索引（已存在则跳过）；PostgreSQL 上并发创建"""
+    def step(conn: Connection):
+        if conn.dialect.name != "postgresql":
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+            return
+        # 无效索引会被 IF NOT EXISTS 跳过，先删除再重建
+        if conn.execute(_INVALID_INDEX, {"name": name}).first():
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+    return step
+
+
+def _drop_index(name: str) -> Callable[[Connection], None]:
+    """删除索引（不存在则跳过）；PostgreSQL 上并发删除"""
+    def step(conn: Connection):
+        concurrently = " CONCURRENTLY" if conn.dialect.name == "postgresql" else ""
+        conn.execute(text(f"DROP INDEX{concurrently} IF EXISTS {name}"))
+
+    return step
+
+
+def _ddl(*steps: Callable[[Connection], None]) -> Callable[[Connection], None]:
+    """按顺序执行 DDL；迁移自带语句，不依赖模型的当前声明"""
+    def upgrade(conn: Connection):
+        for step in steps:
+            step(conn)
+
+    return upgrade
+
+
+# 迁移列表，只追加，不修改已发布的版本
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "composite_indexes",
+        _ddl(
+            _create_index("ix_session_memories_session_created", "session_memories", "session_id", "created_at"),
+            _create_index("ix_session_memories_session_agent_created", "session_memories", "session_id", "agent_name", "created_at"),
+            _create_index("ix_session_memories_session_type_created", "session_memories", "session_id", "memory_type", "created_at"),
+            # 消息与用户会话列表的索引直接按版本 2 的分页顺序创建，新库上不会先建后删
+            _create_index("ix_messages_session_created_id", "messages", "session_id", "created_at", "id"),
+            _create_index("ix_conversations_user_updated_session", "conversations", "user_id", "updated_at", "session_id"),
+            _create_index("ix_conversations_updated", "conversations", "updated_at"),
+        ),
+        transactional=False,
+    ),
+    Migration(
+        2,
+        "keyset_pagination_indexes",
+        _ddl(
+            # 分页按 (时间, 主键) 排序，主键作为同一时间的次序；新库上已由版本 1 建好
+            _create_index("ix_messages_session_created_id", "messages", "session_id", "created_at", "id"),
+            _create_index("ix_conversations_user_updated_session", "conversations", "user_id", "updated_at", "session_id"),
+            # 早期版本 1 创建过的旧索引
+            _drop_index("ix_messages_session_created"),
+            _drop_index("ix_conversations_user_updated"),
+        ),
+        transactional=False,
+    ),
+]
+
+
+async def applied_versions(engine: AsyncEngine) -> set:
+    """已应用的迁移版本"""
+    async with engine.begin() as conn:
+        return await _versions(conn)
+
+
+async def _versions(conn: AsyncConnection) -> set:
+    await conn.run_sync(_metadata.create_all)
+    result = await conn.execute(select(schema_migrations.c.version))
+    return set(result.scalars().all())
+
+
+def _record(migration: Migration):
+    return schema_migrations.insert().values(
+        version=migration.version,
+        name=migration.name,
+        applied_at=datetime.now(),
+    )
+
+
+def _is_locked(error: OperationalError) -> bool:
+    """SQLite 等待写锁超过忙等待时间"""
+    return "database is locked" in str(error.orig)
+
+
+async def _lock(conn: AsyncConnection):
+    """PostgreSQL 上获取事务级咨询锁，提交或回滚时自动释放"""
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+
+
+async def _apply(engine: AsyncEngine, migration: Migration) -> bool:
+    """
+    在独立事务中应用一个迁移：先写入版本号再执行升级
+    SQLite 上该写入即取得写锁（相当于 BEGIN IMMEDIATE），PostgreSQL 上先取得咨询锁
+
+    Returns:
+        False 表示版本号已被其他进程写入
+    """
+    try:
+        async with engine.begin() as conn:
+            await _lock(conn)
+            await conn.execute(_record(migration))
+            await conn.run_sync(migration.upgrade)
+    except IntegrityError:
+        return False
+    return True
+
+
+async def _apply_online(engine: AsyncEngine, migration: Migration) -> bool:
+    """
+    PostgreSQL 上在事务外应用一个迁移：持有会话级咨询锁（与事务级锁互斥）逐条自动提交，
+    升级完成后才写入版本号；中途失败时版本号未写入，下次启动重新执行
+
+    Returns:
+        False 表示版本号已被其他进程写入
+    """
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+        try:
+            if migration.version in await _versions(conn):
+                return False
+            await conn.run_sync(migration.upgrade)
+            await conn.execute(_record(migration))
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+    return True
+
+
+async def run_migrations(engine: AsyncEngine) -> List[int]:
+    """
+    执行未应用的迁移，每个迁移在独立事务中执行
+    并发的其他进程等到提交后因主键冲突失败，按已应用处理；SQLite 上等待写锁超过
+    忙等待时间（持锁进程在执行耗时的迁移）时重新读取已应用版本后重试
+
+    Returns:
+        本次应用的版本号
+    """
+    applied = await applied_versions(engine)
+    newly_applied = []
+    online = engine.dialect.name == "postgresql"
+
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        while migration.version not in applied:
+            try:
+                if online and not migration.transactional:
+                    done = await _apply_online(engine, migration)
+                else:
+                    done = await _apply(engine, migration)
+            except OperationalError as e:
+                if not _is_locked(e):
+                    raise
+                # 持锁进程退出时锁随之释放，因此一直重试直到其提交
+                logger.info("等待写锁超时，重新读取已应用版本后重试迁移: %04d %s", migration.version, migration.name)
+                applied = await applied_versions(engine)
+                continue
+
+            if done:
+                newly_applied.append(migration.version)
+                logger.info("数据库迁移已应用: %04d %s", migration.version, migration.name)
+            else:
+                logger.info("数据库迁移已由其他进程应用: %04d %s", migration.version, migration.name)
+            break
+
+    return newly_applied
@@ -36,6 +36,7 @@ class ChatRequest(BaseModel):
     session_id: str = Field(description="会话ID")
     message: str = Field(description="用户消息")
     stream: bool = Field(default=True, description="是否流式输出")
+    user_id: Optional[str] = Field(default=None, description="用户ID，用于召回长期记忆")
 
 
 class ChatResponse(BaseModel):
@@ -0,0 +1,144 @@
+"""
+分页模块
+基于游标的键集分页：按 (时间, 主键) 排序，游标记录上一页最后一行的排序键，
+翻页代价与页码无关，且新写入不会导致重复或遗漏
+"""
+import base64
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import DateTime, Select, tuple_
+
+from app.config import settings
+from app.database import async_session
+from app.serialization import dumps, loads, ndjson_line
+
+
+def encode_cursor(values: list) -> str:
+    """编码游标"""
+    raw = dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: list) -> list:
+    """解码游标，按列类型还原取值"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [
+            datetime.fromisoformat(v) if isinstance(c.type, DateTime) else v
+            for c, v in zip(columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
+def paginate(query: Select, columns: list, cursor: Optional[str], limit: int, descending: bool = True) -> Select:
+    """
+    为查询加上键集分页条件
+
+    Args:
+        query: 原查询
+        columns: 排序键，最后一列须唯一（通常为主键）
+        cursor: 上一页返回的游标
+        limit: 每页条数
+        descending: 是否倒序
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        keys = tuple_(*columns)
+        query = query.where(keys < tuple_(*values) if descending else keys > tuple_(*values))
+
+    order = [c.desc() if descending else c.asc() for c in columns]
+    # 多取一条用于判断是否还有下一页
+    return query.order_by(*order).limit(limit + 1)
+
+
+def next_page(rows: list, columns: list, limit: int) -> Tuple[list, Optional[str]]:
+    """
+    截取一页并生成下一页游标
+
+    Returns:
+        (本页行, 下一页游标；没有下一页时为 None)
+    """
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, encode_cursor([getattr(rows[-1], c.key) for c in columns])
+
+
+def clamp_limit(limit: int) -> int:
+    """限制每页条数"""
+    return max(1, min(limit, settings.page_size_max))
+
+
+async def fetch_page(
+    query: Select,
+    columns: list,
+    cursor: Optional[str],
+    limit: int,
+    serialize: Callable[[object], dict],
+    descending: bool = True
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    读取一页
+
+    Returns:
+        (序列化后的行, 下一页游标)
+    """
+    async with async_session() as db:
+        result = await db.execute(paginate(query, columns, cursor, limit, descending))
+        rows = list(result.scalars().all())
+
+    rows, next_cursor = next_page(rows, columns, limit)
+    return [serialize(r) for r in rows], next_cursor
+
+
+async def iter_pages(
+    fetch: Callable[[Optional[str]], Awaitable[Tuple[List[dict], Optional[str]]]],
+    cursor: Optional[str] = None
+) -> AsyncIterator[dict]:
+    """从游标起逐页读取，逐行产出"""
+    while True:
+        rows, cursor = await fetch(cursor)
+        for row in rows:
+            yield row
+        if cursor is None:
+            return
+
+
+def export_ndjson(
+    query: Select,
+    columns: list,
+    cursor: Optional[str],
+    serialize: Callable[[object], dict],
+    descending: bool = True,
+    header: Optional[dict] = None
+) -> StreamingResponse:
+    """
+    流式 NDJSON 导出，每行一个 JSON 对象；按 export_page_size 逐页读取，
+    内存占用与总行数无关
+
+    Args:
+        header: 可选的首行
+    """
+    # 响应开始后无法再返回 400，先校验游标
+    if cursor:
+        decode_cursor(cursor, columns)
+
+    async def generate():
+        if header is not None:
+            yield ndjson_line(header)
+        rows = iter_pages(
+            lambda c: fetch_page(query, columns, c, settings.export_page_size, serialize, descending),
+            cursor
+        )
+        async for row in rows:
+            yield ndjson_line(row)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
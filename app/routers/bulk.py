@@ -0,0 +1,62 @@
+"""
+批量导出导入路由
+"""
+import time
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
+
+from app.bulk import BulkError, MEDIA_TYPES, export_ndjson, import_ndjson
+from context.memory import write_buffer
+
+router = APIRouter()
+
+
+@router.get("/bulk/export")
+async def bulk_export(
+    user_id: Optional[str] = None,
+    tables: Optional[List[str]] = Query(default=None),
+    compression: str = "none"
+):
+    """
+    流式导出会话、状态、消息与记忆（NDJSON，可选 gzip / zstd 压缩）
+
+    每行格式为 {"table": 表名, "row": 行}
+    """
+    # 先落库写后缓冲中的数据
+    await write_buffer.flush()
+
+    try:
+        stream = await export_ndjson(user_id=user_id, tables=tables, compression=compression)
+    except BulkError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    suffix = {"none": "", "gzip": ".gz", "zstd": ".zst"}[compression]
+    return StreamingResponse(
+        stream,
+        media_type=MEDIA_TYPES[compression],
+        headers={"Content-Disposition": f'attachment; filename="export-{user_id or "all"}.ndjson{suffix}"'}
+    )
+
+
+@router.post("/bulk/import")
+async def bulk_import(request: Request, on_conflict: str = "skip"):
+    """
+    流式导入导出文件，自动识别 gzip / zstd 压缩
+
+    on_conflict=skip 时跳过主键已存在的行，重复导入是幂等的
+    """
+    start = time.perf_counter()
+    try:
+        counts = await import_ndjson(request.stream(), on_conflict=on_conflict)
+    except BulkError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IntegrityError as e:
+        raise HTTPException(status_code=409, detail=f"数据冲突: {e.orig}")
+
+    return {
+        "rows": counts,
+        "rows_total": sum(counts.values()),
+        "elapsed_seconds": round(time.perf_counter() - start, 3)
+    }
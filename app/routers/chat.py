@@ -2,30 +2,56 @@
 对话路由
 """
 import uuid
-import json
-from typing import AsyncGenerator
-from fastapi import APIRouter, HTTPException
+from typing import AsyncGenerator, Optional
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
 
+from app.config import settings
 from app.models import ChatRequest, ChatResponse
+from app.serialization import FastJSONResponse, dumps_str, loads, sse_event
 from agents.main_plan_agent import MainPlanAgent
+from chain.multiplexer import StreamMultiplexer
+from observability.metrics import track_stream
+from observability.tracer import langfuse_client
+from observability.timing import get_timings, stage
 
 router = APIRouter()
 
 
+def _trace_metadata(request: ChatRequest) -> dict:
+    return {"session_id": request.session_id, "user_id": request.user_id}
+
+
 @router.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """聊天接口"""
     # 获取或创建智能体
-    agent = MainPlanAgent(session_id=request.session_id)
+    agent = MainPlanAgent(session_id=request.session_id, user_id=request.user_id)
 
     # 处理消息
     if request.stream:
         # 流式响应
         async def generate():
-            async for chunk in agent.stream_chat(request.message):
-                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
-            yield f"data: [DONE]\n\n"
+            route = http_request.url.path
+            stream = track_stream(route, langfuse_client.trace_stream(
+                "chat", agent.stream_chat(request.message), _trace_metadata(request), route
+            ))
+            try:
+                async for chunk in stream:
+                    if await http_request.is_disconnected():
+                        # 客户端已断开，停止生成
+                        break
+                    with stage("sse_write"):
+                        yield sse_event(chunk)
+                else:
+                    # 流式响应头已发出，阶段耗时作为最后一个事件补充
+                    timings = get_timings()
+                    if timings is not None:
+                        yield sse_event({"type": "timing", **timings.to_dict()})
+                    yield b"data: [DONE]\n\n"
+            finally:
+                # 断开或取消时关闭智能体流，取消信号沿子智能体与工具调用传播
+                await stream.aclose()
 
         return StreamingResponse(
             generate(),
@@ -33,42 +59,153 @@ async def chat(request: ChatRequest):
         )
     else:
         # 非流式响应
-        result = await agent.chat(request.message)
-        return result
+        async with langfuse_client.trace("chat", _trace_metadata(request), http_request.url.path):
+            result = await agent.chat(request.message)
+        return FastJSONResponse(result)
 
 
 @router.post("/chat/simple")
-async def chat_simple(request: ChatRequest):
+async def chat_simple(request: ChatRequest, http_request: Request):
     """简单聊天接口（非流式）"""
-    agent = MainPlanAgent(session_id=request.session_id)
-    result = await agent.chat(request.message)
-    return result
+    agent = MainPlanAgent(session_id=request.session_id, user_id=request.user_id)
+    async with langfuse_client.trace("chat", _trace_metadata(request), http_request.url.path):
+        result = await agent.chat(request.message)
+    return FastJSONResponse(result)
+
+
+def _parse_ws_frame(text: str) -> dict:
+    """
+    解析并校验 WebSocket 客户端消息
+
+    Raises:
+        ValueError: JSON 无效或字段取值无效
+        TypeError: 消息不是 JSON 对象（含二进制帧）或字段类型错误
+    """
+    if not isinstance(text, str):
+        raise TypeError("不支持二进制帧")
+    frame = loads(text)
+    if not isinstance(frame, dict):
+        raise TypeError("消息必须是 JSON 对象")
+
+    session_id = frame.get("session_id")
+    if session_id is not None and not isinstance(session_id, str):
+        raise TypeError("session_id 必须是字符串")
+
+    op = frame.get("op")
+    parsed = {"op": op, "session_id": session_id, "user_id": frame.get("user_id")}
+    if op == "chat":
+        message = frame.get("message", "")
+        if not isinstance(message, str):
+            raise TypeError("message 必须是字符串")
+        parsed["message"] = message
+    elif op == "credit":
+        credit = frame.get("credit", 0)
+        if isinstance(credit, bool) or not isinstance(credit, (int, str)):
+            raise TypeError("credit 必须是整数")
+        credit = int(credit)
+        if credit < 0:
+            raise ValueError("credit 不能为负数")
+        parsed["credit"] = credit
+    return parsed
+
+
+@router.websocket("/chat/ws")
+async def chat_ws(websocket: WebSocket):
+    """
+    多路复用聊天接口（WebSocket）
+    单个连接上可同时进行多个 session_id 的流式对话，数据块格式与 SSE 一致，
+    每帧额外携带 session_id。
+
+    客户端消息：
+    - {"op": "chat", "session_id": "...", "message": "...", "user_id": "..."}  开始一轮对话
+    - {"op": "credit", "session_id": "...", "credit": 64}    补充流控额度
+    - {"op": "cancel", "session_id": "..."}                  取消进行中的流
+    """
+    await websocket.accept()
+
+    async def send_frame(frame: dict):
+        await websocket.send_text(dumps_str(frame))
+
+    mux = StreamMultiplexer(
+        send_frame,
+        initial_credit=settings.ws_initial_credit,
+        max_streams=settings.ws_max_streams
+    )
+
+    try:
+        while True:
+            # 单帧格式错误只回复错误帧，不关闭连接，以免中断其上的其他流
+            try:
+                frame = _parse_ws_frame(await websocket.receive_text())
+            except (ValueError, TypeError, KeyError) as e:
+                await send_frame({"type": "error", "content": f"无效的消息: {e}"})
+                continue
+
+            op = frame["op"]
+            session_id = frame["session_id"]
+
+            if not session_id:
+                await send_frame({"type": "error", "content": "缺少 session_id"})
+                continue
+
+            if op == "chat":
+                agent = MainPlanAgent(session_id=session_id, user_id=frame.get("user_id"))
+                route = websocket.url.path
+                stream = langfuse_client.trace_stream(
+                    "chat", agent.stream_chat(frame["message"]),
+                    {"session_id": session_id, "user_id": frame.get("user_id")}, route
+                )
+                await mux.open(session_id, track_stream(route, stream))
+            elif op == "credit":
+                mux.grant(session_id, frame["credit"])
+            elif op == "cancel":
+                mux.cancel(session_id)
+            else:
+                await mux.send(session_id, {"type": "error", "content": f"未知操作: {op}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await mux.close()
 
 
 @router.get("/chat/history/{session_id}")
-async def get_chat_history(session_id: str, limit: int = 50):
-    """获取聊天历史"""
+async def get_chat_history(
+    session_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    format: str = "json"
+):
+    """
+    获取聊天历史（按时间倒序，游标分页）
+
+    format=ndjson 时从 cursor 起流式导出全部消息
+    """
     from sqlalchemy import select
-    from app.database import async_session, Message
-
-    async with async_session() as session:
-        result = await session.execute(
-            select(Message)
-            .where(Message.session_id == session_id)
-            .order_by(Message.created_at.desc())
-            .limit(limit)
-        )
-        messages = result.scalars().all()
+    from app.database import Message
+    from app.pagination import clamp_limit, export_ndjson, fetch_page
+    from context.memory import write_buffer
+
+    # 本轮对话可能仍在写后缓冲中
+    await write_buffer.sync_session(session_id)
+
+    columns = [Message.created_at, Message.id]
+    query = select(Message).where(Message.session_id == session_id)
 
+    def serialize(m) -> dict:
         return {
-            "session_id": session_id,
-            "messages": [
-                {
-                    "id": m.id,
-                    "role": m.role,
-                    "content": m.content,
-                    "created_at": m.created_at.isoformat()
-                }
-                for m in messages
-            ]
+            "id": m.id,
+            "role": m.role,
+            "content": m.content,
+            "created_at": m.created_at
         }
+
+    if format == "ndjson":
+        return export_ndjson(query, columns, cursor, serialize)
+
+    messages, next_cursor = await fetch_page(query, columns, cursor, clamp_limit(limit), serialize)
+
+    return FastJSONResponse({
+        "session_id": session_id,
+        "messages": messages,
+        "next_cursor": next_cursor
+    })
@@ -2,12 +2,16 @@
 会话路由
 """
 import uuid
+from typing import Optional
 from fastapi import APIRouter, HTTPException
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import async_session, Conversation, Message
+from app.database import async_session, Conversation, ConversationState, Message, SessionMemory
+from context.memory import context_cache, write_buffer
 from app.models import ConversationCreate, ConversationResponse
+from app.pagination import clamp_limit, export_ndjson, fetch_page
+from app.serialization import FastJSONResponse
 
 router = APIRouter()
 
@@ -35,77 +39,113 @@ async def create_conversation(request: ConversationCreate):
         )
 
 
+def _conversation_dict(c: Conversation) -> dict:
+    return {
+        "session_id": c.session_id,
+        "title": c.title,
+        "created_at": c.created_at,
+        "updated_at": c.updated_at
+    }
+
+
+def _message_dict(m: Message) -> dict:
+    return {
+        "id": m.id,
+        "role": m.role,
+        "content": m.content,
+        "created_at": m.created_at
+    }
+
+
 @router.get("/conversations/{user_id}")
-async def get_conversations(user_id: str, limit: int = 20):
-    """获取用户的会话列表"""
-    async with async_session() as db:
-        result = await db.execute(
-            select(Conversation)
-            .where(Conversation.user_id == user_id)
-            .order_by(Conversation.updated_at.desc())
-            .limit(limit)
-        )
-        conversations = result.scalars().all()
-
-        return {
-            "user_id": user_id,
-            "conversations": [
-                {
-                    "session_id": c.session_id,
-                    "title": c.title,
-                    "created_at": c.created_at.isoformat(),
-                    "updated_at": c.updated_at.isoformat()
-                }
-                for c in conversations
-            ]
-        }
+async def get_conversations(
+    user_id: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    format: str = "json"
+):
+    """
+    获取用户的会话列表（按更新时间倒序，游标分页）
+
+    format=ndjson 时从 cursor 起流式导出全部会话
+    """
+    columns = [Conversation.updated_at, Conversation.session_id]
+    query = select(Conversation).where(Conversation.user_id == user_id)
+
+    if format == "ndjson":
+        return export_ndjson(query, columns, cursor, _conversation_dict)
+
+    conversations, next_cursor = await fetch_page(
+        query, columns, cursor, clamp_limit(limit), _conversation_dict
+    )
+
+    return FastJSONResponse({
+        "user_id": user_id,
+        "conversations": conversations,
+        "next_cursor": next_cursor
+    })
 
 
 @router.get("/conversations/detail/{session_id}")
-async def get_conversation(session_id: str):
-    """获取会话详情"""
+async def get_conversation(
+    session_id: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    format: str = "json"
+):
+    """
+    获取会话详情，消息按时间正序游标分页
+
+    format=ndjson 时首行为会话信息，其后逐行流式导出全部消息
+    """
+    await write_buffer.sync_session(session_id)
+
     async with async_session() as db:
-        result = await db.execute(
-            select(Conversation).where(Conversation.session_id == session_id)
-        )
-        conversation = result.scalar_one_or_none()
+        conversation = await db.get(Conversation, session_id)
+
+    if not conversation:
+        raise HTTPException(status_code=404, detail="会话不存在")
 
-        if not conversation:
-            raise HTTPException(status_code=404, detail="会话不存在")
+    columns = [Message.created_at, Message.id]
+    query = select(Message).where(Message.session_id == session_id)
 
-        # 获取消息
-        msg_result = await db.execute(
-            select(Message)
-            .where(Message.session_id == session_id)
-            .order_by(Message.created_at)
+    if format == "ndjson":
+        return export_ndjson(
+            query, columns, cursor, _message_dict,
+            descending=False,
+            header=_conversation_dict(conversation)
         )
-        messages = msg_result.scalars().all()
-
-        return {
-            "session_id": conversation.session_id,
-            "title": conversation.title,
-            "created_at": conversation.created_at.isoformat(),
-            "updated_at": conversation.updated_at.isoformat(),
-            "messages": [
-                {
-                    "id": m.id,
-                    "role": m.role,
-                    "content": m.content,
-                    "created_at": m.created_at.isoformat()
-                }
-                for m in messages
-            ]
-        }
+
+    messages, next_cursor = await fetch_page(
+        query, columns, cursor, clamp_limit(limit), _message_dict, descending=False
+    )
+
+    return FastJSONResponse({
+        **_conversation_dict(conversation),
+        "messages": messages,
+        "next_cursor": next_cursor
+    })
 
 
 @router.delete("/conversations/{session_id}")
 async def delete_conversation(session_id: str):
     """删除会话"""
-    async with async_session() as db:
+    # 暂停刷写：进行中的刷写先完成，之后丢弃的未落库行不会在删除后被写回
+    async with write_buffer.paused(), async_session() as db:
+        write_buffer.discard_session(session_id)
+        context_cache.remove(session_id)
+
         # 删除消息
         await db.execute(
             delete(Message).where(Message.session_id == session_id)
         )
+        # 删除会话记忆与状态快照
+        await db.execute(
+            delete(SessionMemory).where(SessionMemory.session_id == session_id)
+        )
+        await db.execute(
+            delete(ConversationState).where(ConversationState.session_id == session_id)
+        )
         # 删除会话
         await db.execute(
             delete(Conversation).where(Conversation.session_id == session_id)
@@ -4,24 +4,32 @@
 from fastapi import APIRouter, HTTPException
 
 from app.models import KnowledgeQuery, KnowledgeResult
-from knowledge.client import KnowledgeClient
 
 router = APIRouter()
-knowledge_client = KnowledgeClient()
+_knowledge_client = None
+
+
+def get_knowledge_client():
+    """知识库客户端，首次请求时创建"""
+    global _knowledge_client
+    if _knowledge_client is None:
+        from knowledge.client import KnowledgeClient
+        _knowledge_client = KnowledgeClient()
+    return _knowledge_client
 
 
 @router.post("/knowledge/query")
 async def query_knowledge(request: KnowledgeQuery):
     """查询知识库"""
     try:
-        results = await knowledge_client.query(
+        results = await get_knowledge_client().query(
             query=request.query,
             top_k=request.top_k,
             threshold=request.threshold
         )
         return {
             "query": request.query,
-            "results": [r.dict() for r in results]
+            "results": [r.model_dump() for r in results]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -31,7 +39,7 @@ async def query_knowledge(request: KnowledgeQuery):
 async def knowledge_health():
     """知识库健康检查"""
     try:
-        status = await knowledge_client.health_check()
+        status = await get_knowledge_client().health_check()
         return {"status": "healthy" if status else "unhealthy"}
     except Exception:
         return {"status": "unavailable"}
@@ -0,0 +1,119 @@
+"""
+JSON 序列化模块
+API 响应、SSE 数据块、WebSocket 帧与 NDJSON 导出共用的序列化入口；
+安装了 orjson 时使用 orjson，否则退化为标准库 json，可通过 json_backend 配置切换
+"""
+import dataclasses
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+from uuid import UUID
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """序列化库不直接支持的类型"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (UUID, Decimal)):
+        return str(obj) if isinstance(obj, UUID) else float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"无法序列化类型: {type(obj).__name__}")
+
+
+class StdlibSerializer:
+    """标准库 json 序列化"""
+
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonSerializer:
+    """orjson 序列化：原生支持 datetime、dataclass、UUID，输出 UTF-8 字节"""
+
+    name = "orjson"
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+def get_serializer(backend: str = "auto"):
+    """按名称选择序列化实现，auto 优先 orjson"""
+    if backend in ("auto", "orjson") and orjson is not None:
+        return OrjsonSerializer()
+    if backend == "orjson":
+        print("警告: 未安装 orjson，使用标准库 json 序列化")
+    return StdlibSerializer()
+
+
+# 当前序列化实现
+serializer = get_serializer(settings.json_backend)
+
+
+def set_backend(backend: str):
+    """切换序列化实现"""
+    global serializer
+    serializer = get_serializer(backend)
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化为 UTF-8 字节"""
+    return serializer.dumps(obj)
+
+
+def dumps_str(obj: Any) -> str:
+    """序列化为字符串"""
+    return serializer.dumps(obj).decode("utf-8")
+
+
+def loads(data) -> Any:
+    """反序列化"""
+    return serializer.loads(data)
+
+
+def sse_event(obj: Any) -> bytes:
+    """SSE 数据块"""
+    return b"data: " + serializer.dumps(obj) + b"\n\n"
+
+
+def ndjson_line(obj: Any) -> bytes:
+    """NDJSON 行"""
+    return serializer.dumps(obj) + b"\n"
+
+
+class FastJSONResponse(Response):
+    """
+    使用当前序列化实现的 JSON 响应
+    作为默认响应类；接口直接返回该响应时可跳过 jsonable_encoder 的逐字段转换
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return serializer.dumps(content)
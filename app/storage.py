@@ -0,0 +1,134 @@
+"""
+存储配置模块
+按数据库类型选择引擎参数：
+- SQLite：WAL 日志、synchronous=NORMAL、内存映射与忙等待，适合单机部署
+- PostgreSQL（asyncpg）：连接池容量、预编译语句缓存与连接预检，适合生产部署
+"""
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.config import settings
+from observability.metrics import metrics
+
+
+def _sqlite_is_memory(url) -> bool:
+    return url.database in (None, "", ":memory:") or "mode=memory" in str(url)
+
+
+def sqlite_pragmas(in_memory: bool = False) -> dict:
+    """SQLite 每个连接执行的 PRAGMA"""
+    pragmas = {
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "cache_size": -settings.sqlite_cache_size_kb,
+        "temp_store": "memory",
+    }
+    if not in_memory:
+        pragmas = {
+            "journal_mode": settings.sqlite_journal_mode,
+            "mmap_size": settings.sqlite_mmap_size,
+            **pragmas,
+        }
+    return pragmas
+
+
+def _sqlite_engine(url, **kwargs) -> AsyncEngine:
+    """SQLite 引擎：连接建立时设置 PRAGMA"""
+    pragmas = sqlite_pragmas(_sqlite_is_memory(url))
+    engine = create_async_engine(
+        url,
+        connect_args={"timeout": settings.sqlite_busy_timeout_ms / 1000},
+        **kwargs,
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
+
+
+def _postgres_engine(url, **kwargs) -> AsyncEngine:
+    """PostgreSQL 引擎：连接池与语句缓存"""
+    if url.drivername in ("postgresql", "postgres"):
+        url = url.set(drivername="postgresql+asyncpg")
+
+    # SQLAlchemy 侧的预编译语句缓存；使用 pgbouncer 事务池时应设为 0
+    url = url.update_query_dict({
+        "prepared_statement_cache_size": str(settings.pg_statement_cache_size)
+    })
+
+    return create_async_engine(
+        url,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args={
+            # asyncpg 侧的语句缓存
+            "statement_cache_size": settings.pg_statement_cache_size,
+            "server_settings": {"application_name": settings.app_name},
+        },
+        **kwargs,
+    )
+
+
+def storage_profile(database_url: str = None, profile: str = None) -> str:
+    """
+    解析存储配置名称
+
+    Returns:
+        "sqlite" / "postgres" / "default"（不做调优）
+    """
+    profile = profile or settings.database_profile
+    if profile != "auto":
+        return profile
+
+    backend = make_url(database_url or settings.database_url).get_backend_name()
+    if backend == "sqlite":
+        return "sqlite"
+    if backend == "postgresql":
+        return "postgres"
+    return "default"
+
+
+_QUERY_OPERATIONS = {"select", "insert", "update", "delete"}
+
+
+def _instrument(engine: AsyncEngine) -> AsyncEngine:
+    """按语句类型记录 SQL 执行耗时"""
+    histogram = metrics.histogram("db_query_duration_seconds", "SQL 语句执行耗时", ("operation",))
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started_at = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        operation = statement[:6].lower()
+        if operation not in _QUERY_OPERATIONS:
+            operation = "other"
+        histogram.labels(operation).observe(time.perf_counter() - context._query_started_at)
+
+    return engine
+
+
+def create_engine(database_url: str = None, profile: str = None) -> AsyncEngine:
+    """按存储配置创建异步引擎"""
+    url = make_url(database_url or settings.database_url)
+    kwargs = {"echo": settings.database_echo, "future": True}
+
+    profile = storage_profile(str(url), profile)
+    if profile == "sqlite":
+        engine = _sqlite_engine(url, **kwargs)
+    elif profile == "postgres":
+        engine = _postgres_engine(url, **kwargs)
+    else:
+        engine = create_async_engine(url, **kwargs)
+    return _instrument(engine)
@@ -0,0 +1,226 @@
+"""
+启动预热
+在生命周期内后台执行：打开数据库连接池、创建共享客户端、编译意图匹配表、
+从快照预热上下文缓存，可选跑一轮合成对话；全部完成后 /health 才报告就绪
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmupStep:
+    """单个预热步骤的结果"""
+    name: str
+    ok: bool = True
+    duration_ms: float = 0.0
+    detail: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "ok": self.ok,
+            "duration_ms": round(self.duration_ms, 3),
+            "detail": self.detail,
+        }
+
+
+@dataclass
+class WarmupState:
+    """预热状态"""
+    ready: bool = False
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    steps: List[WarmupStep] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        """所有步骤是否成功"""
+        return all(step.ok for step in self.steps)
+
+    def to_dict(self) -> dict:
+        duration = None
+        if self.started_at is not None and self.finished_at is not None:
+            duration = round((self.finished_at - self.started_at) * 1000, 3)
+        return {
+            "ready": self.ready,
+            "duration_ms": duration,
+            "steps": [step.to_dict() for step in self.steps],
+        }
+
+
+async def _warm_database():
+    """打开连接池中的若干连接"""
+    from sqlalchemy import text
+    from app.database import engine
+
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(max(1, settings.warmup_db_connections))))
+    return f"{max(1, settings.warmup_db_connections)} 个连接"
+
+
+async def _warm_intent():
+    """编译快车道匹配表"""
+    from intent.classifier import IntentClassifier
+    exact, _ = IntentClassifier.matchers()
+    IntentClassifier().classify("你好")
+    return f"{len(exact)} 个模式"
+
+
+async def _warm_tokenizer():
+    """加载分词器"""
+    from context.assembler import token_counter
+    token_counter.count("预热")
+
+
+async def _warm_knowledge_client():
+    """创建知识库客户端"""
+    from app.routers.knowledge import get_knowledge_client
+    get_knowledge_client()
+
+
+async def _warm_intent_model():
+    """创建慢车道意图识别器"""
+    from intent.recognizer import get_recognizer
+    get_recognizer()
+
+
+async def _warm_toolkit():
+    """注册智能体工具"""
+    import agents.tools.trip_tools  # noqa: F401
+
+
+async def _warm_long_term_memory():
+    """打开长期记忆索引"""
+    from context.long_term import long_term_memory
+    if not long_term_memory.available:
+        return "未启用"
+    count = await asyncio.to_thread(long_term_memory.warm)
+    return "索引被其他进程占用" if count is None else f"{count} 条记忆"
+
+
+async def _warm_cache():
+    """从快照预热上下文缓存"""
+    from context.memory import MemoryManager
+
+    if not settings.context_cache_enabled:
+        return "未启用"
+
+    path = settings.warmup_cache_snapshot
+    if not path or not os.path.exists(path):
+        return "无快照"
+
+    with open(path, "r", encoding="utf-8") as f:
+        session_ids = json.load(f)[:settings.warmup_cache_sessions]
+
+    # 快照按最近使用在前，逆序加载使其在 LRU 中保持原有顺序
+    for session_id in reversed(session_ids):
+        await MemoryManager(session_id).prime_cache()
+    return f"{len(session_ids)} 个会话"
+
+
+async def _warm_synthetic_turn():
+    """跑一轮合成对话，预热完整对话链路，结束后清理"""
+    from sqlalchemy import delete
+    from agents.main_plan_agent import MainPlanAgent
+    from app.database import async_session, ConversationState, Message, SessionMemory
+    from context.memory import context_cache, write_buffer
+
+    session_id = f"warmup-{uuid.uuid4()}"
+    try:
+        # 快车道意图走模板回复，覆盖状态机与整轮提交，不调用外部模型
+        await MainPlanAgent(session_id=session_id).chat("为我规划行程")
+    finally:
+        write_buffer.discard_session(session_id)
+        context_cache.remove(session_id)
+        async with async_session() as db:
+            for model in (Message, SessionMemory, ConversationState):
+                await db.execute(delete(model).where(model.session_id == session_id))
+            await db.commit()
+
+
+# 预热步骤（按顺序执行，单步失败不影响其他步骤）
+STEPS: List[tuple] = [
+    ("database", _warm_database),
+    ("intent_matchers", _warm_intent),
+    ("tokenizer", _warm_tokenizer),
+    ("knowledge_client", _warm_knowledge_client),
+    ("intent_model", _warm_intent_model),
+    ("toolkit", _warm_toolkit),
+    ("long_term_memory", _warm_long_term_memory),
+    ("context_cache", _warm_cache),
+]
+
+
+async def _run_step(name: str, func: Callable[[], Awaitable]) -> WarmupStep:
+    step = WarmupStep(name)
+    start = time.perf_counter()
+    try:
+        step.detail = await func()
+    except Exception as e:
+        step.ok = False
+        step.detail = f"{type(e).__name__}: {e}"
+        logger.exception("预热步骤 %s 失败", name)
+    step.duration_ms = (time.perf_counter() - start) * 1000
+    return step
+
+
+async def warm_up() -> WarmupState:
+    """执行全部预热步骤，完成后标记就绪"""
+    state = warmup_state
+    state.ready = False
+    state.steps = []
+    state.started_at = time.perf_counter()
+
+    steps = list(STEPS)
+    if settings.warmup_synthetic_turn:
+        steps.append(("synthetic_turn", _warm_synthetic_turn))
+
+    for name, func in steps:
+        state.steps.append(await _run_step(name, func))
+
+    state.finished_at = time.perf_counter()
+    state.ready = True
+    logger.info("预热完成: %s", json.dumps(state.to_dict(), ensure_ascii=False))
+    return state
+
+
+def mark_ready():
+    """跳过预热直接就绪"""
+    warmup_state.ready = True
+
+
+def save_cache_snapshot() -> int:
+    """保存上下文缓存中的热点会话，供下次启动预热"""
+    from context.memory import context_cache
+
+    path = settings.warmup_cache_snapshot
+    if not path or not settings.context_cache_enabled:
+        return 0
+
+    session_ids = context_cache.session_ids(settings.warmup_cache_sessions)
+    if not session_ids:
+        return 0
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(session_ids, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return len(session_ids)
+
+
+# 全局实例
+warmup_state = WarmupState()
@@ -0,0 +1,103 @@
+"""
+批量导出导入基准
+
+在临时 SQLite 库中写入指定数量的消息，分别以 none / gzip / zstd 流式导出，
+再将导出文件导入一个空库，统计耗时与吞吐。
+
+用法：
+    python -m benchmarks.bench_bulk_transfer --messages 1000000
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.bulk import export_ndjson, import_ndjson
+from app.database import Base
+from app.storage import create_engine
+
+
+def session_factory(path: str):
+    engine = create_engine(f"sqlite+aiosqlite:///{path}")
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def create_schema(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+def load(path: str, messages: int, sessions: int):
+    """用递归 CTE 批量写入测试数据"""
+    db = sqlite3.connect(path)
+    base = datetime.now() - timedelta(days=30)
+    created = f"datetime('{base:%Y-%m-%d %H:%M:%S}', '+' || x || ' seconds')"
+    db.execute(f"""
+        INSERT INTO messages (id, session_id, role, content, created_at, extra_data)
+        WITH RECURSIVE seq(x) AS (SELECT 0 UNION ALL SELECT x + 1 FROM seq WHERE x < {messages - 1})
+        SELECT printf('g-%09d', x), printf('s-%06d', x % {sessions}),
+               CASE x % 2 WHEN 0 THEN 'user' ELSE 'assistant' END,
+               '帮我规划下周去杭州的出差行程，住在西湖附近', {created}, '{{}}' FROM seq
+    """)
+    db.execute(f"""
+        INSERT INTO conversations (session_id, user_id, title, created_at, updated_at, extra_data)
+        WITH RECURSIVE seq(x) AS (SELECT 0 UNION ALL SELECT x + 1 FROM seq WHERE x < {sessions - 1})
+        SELECT printf('s-%06d', x), printf('u-%04d', x % 100), '会话', {created}, {created}, '{{}}' FROM seq
+    """)
+    db.commit()
+    db.close()
+
+
+async def main(args):
+    directory = tempfile.mkdtemp()
+    source = os.path.join(directory, "source.db")
+    engine, factory = session_factory(source)
+    await create_schema(engine)
+
+    start = time.perf_counter()
+    load(source, args.messages, args.sessions)
+    print(f"写入 {args.messages} 条消息、{args.sessions} 个会话，用时 {time.perf_counter() - start:.1f}s")
+
+    exports = {}
+    for compression in ("none", "gzip", "zstd"):
+        path = os.path.join(directory, f"export.ndjson.{compression}")
+        start = time.perf_counter()
+        size = 0
+        with open(path, "wb") as f:
+            async for chunk in await export_ndjson(compression=compression, session_factory=factory):
+                f.write(chunk)
+                size += len(chunk)
+        elapsed = time.perf_counter() - start
+        exports[compression] = path
+        print(
+            f"export {compression:<5} elapsed={elapsed:6.2f}s  rows/s={args.messages / elapsed:10.0f}  "
+            f"size={size / 1024 / 1024:8.1f}MB"
+        )
+    await engine.dispose()
+
+    target = os.path.join(directory, "target.db")
+    engine, factory = session_factory(target)
+    await create_schema(engine)
+
+    async def read_file(path: str):
+        with open(path, "rb") as f:
+            while chunk := f.read(64 * 1024):
+                yield chunk
+
+    start = time.perf_counter()
+    counts = await import_ndjson(read_file(exports["zstd"]), session_factory=factory)
+    elapsed = time.perf_counter() - start
+    print(f"import zstd  elapsed={elapsed:6.2f}s  rows/s={sum(counts.values()) / elapsed:10.0f}  rows={counts}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量导出导入基准")
+    parser.add_argument("--messages", type=int, default=1_000_000, help="消息数")
+    parser.add_argument("--sessions", type=int, default=10_000, help="会话数")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,74 @@
+"""
+长期记忆召回基准
+
+向内存映射索引批量写入向量（分布在多个用户下），
+然后测量按用户 top-k 召回的延迟，以及重新打开索引的耗时。
+
+用法：
+    python -m benchmarks.bench_long_term_recall --vectors 1000000 --users 10000
+"""
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from context.long_term import HashingEmbedder, VectorIndex
+
+
+def main(args):
+    path = tempfile.mkdtemp(prefix="ltm-bench-")
+    rng = np.random.default_rng(0)
+    per_user = args.vectors // args.users
+
+    try:
+        index = VectorIndex(path, args.dim)
+
+        start = time.perf_counter()
+        for u in range(args.users):
+            vectors = rng.standard_normal((per_user, args.dim), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            index.add(f"user-{u}", vectors, [{"text": f"偏好 {u}-{i}"} for i in range(per_user)])
+        index.flush()
+        insert_elapsed = time.perf_counter() - start
+        print(f"inserted {index.count} vectors ({args.users} users) in {insert_elapsed:.1f}s")
+
+        # 增量插入单条
+        embedder = HashingEmbedder(args.dim)
+        start = time.perf_counter()
+        index.add("user-0", embedder.embed("住在西溪园区附近"), [{"text": "住在西溪园区附近"}])
+        print(f"single insert: {(time.perf_counter() - start) * 1000:.3f}ms")
+        index.close()
+
+        start = time.perf_counter()
+        index = VectorIndex(path, args.dim)
+        print(f"reopen: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        latencies = []
+        for i in range(args.queries):
+            user = f"user-{rng.integers(args.users)}"
+            query = embedder.embed(f"出差住哪里 {i}")
+            start = time.perf_counter()
+            index.search(user, query, args.k)
+            latencies.append(time.perf_counter() - start)
+
+        latencies.sort()
+        print(
+            f"recall k={args.k}: p50={statistics.median(latencies) * 1000:.3f}ms "
+            f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.3f}ms"
+        )
+        index.close()
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="长期记忆召回基准")
+    parser.add_argument("--vectors", type=int, default=1_000_000, help="向量总数")
+    parser.add_argument("--users", type=int, default=10_000, help="用户数")
+    parser.add_argument("--dim", type=int, default=256, help="向量维度")
+    parser.add_argument("--queries", type=int, default=2000, help="召回次数")
+    parser.add_argument("-k", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,66 @@
+"""
+记忆写后缓冲基准
+
+模拟多个会话并发对话，每轮写入一条用户消息和一条助手消息，
+对比逐条提交与写后缓冲两种模式下的提交次数与耗时。
+
+用法：
+    python -m benchmarks.bench_memory_write --sessions 200 --turns 10
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import event
+
+from app.config import settings
+from app.database import engine, init_db
+from context.memory import MemoryManager, write_buffer
+
+
+async def run(sessions: int, turns: int, write_behind: bool) -> tuple:
+    """并发执行对话写入，返回 (提交次数, 耗时)"""
+    settings.memory_write_behind = write_behind
+    commits = 0
+
+    def on_commit(conn):
+        nonlocal commits
+        commits += 1
+
+    event.listen(engine.sync_engine, "commit", on_commit)
+
+    async def one_session(i: int):
+        memory = MemoryManager(f"bench-{'wb' if write_behind else 'sync'}-{i}")
+        for t in range(turns):
+            await memory.add_user_message(f"第 {t} 轮用户消息")
+            await memory.add_assistant_message(f"第 {t} 轮助手回复")
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(one_session(i) for i in range(sessions)))
+        await write_buffer.stop()
+    finally:
+        event.remove(engine.sync_engine, "commit", on_commit)
+
+    return commits, time.perf_counter() - start
+
+
+async def main(args):
+    await init_db()
+    total_turns = args.sessions * args.turns
+
+    for write_behind in (False, True):
+        commits, elapsed = await run(args.sessions, args.turns, write_behind)
+        name = "write-behind" if write_behind else "per-row"
+        print(
+            f"{name:<13} turns={total_turns:<6} commits={commits:<6} "
+            f"commits/turn={commits / total_turns:6.3f}  "
+            f"elapsed={elapsed:6.2f}s  turns/s={total_turns / elapsed:8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="记忆写后缓冲基准")
+    parser.add_argument("--sessions", type=int, default=200, help="并发会话数")
+    parser.add_argument("--turns", type=int, default=10, help="每个会话的对话轮数")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,56 @@
+"""
+Prompt 前缀缓存友好度报告
+
+模拟一段多轮会话，经各调用点构建 Prompt，输出每个调用点的
+可缓存前缀占比与不同前缀数量（越少越容易命中服务端前缀缓存）。
+
+用法：
+    python -m benchmarks.bench_prompt_prefix --turns 20
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from context.prompt_builder import ConversationStage, PromptBuilder
+from context.prompt_compiler import prompt_compiler
+from intent.recognizer import IntentRecognizer
+
+QUERIES = [
+    "帮我规划下周的北京出差行程",
+    "下周三出发，周五回来",
+    "住在西溪园区附近",
+    "什么是差标",
+    "为我提申请",
+]
+
+
+def main(args):
+    builder = PromptBuilder()
+    recognizer = IntentRecognizer.__new__(IntentRecognizer)
+    context = []
+    start = datetime.now()
+
+    for turn in range(args.turns):
+        query = QUERIES[turn % len(QUERIES)]
+        builder.set_stage(builder.get_next_stage("trip_planner" if turn % 2 else "rag_agent"))
+        builder.update_info("turn", turn)
+
+        builder.build_main_prompt(query, context)
+        builder.build_intent_prompt(query)
+        recognizer._build_prompt(query, context)
+
+        timestamp = (start + timedelta(seconds=turn)).isoformat()
+        context.append({"role": "user", "content": query, "timestamp": timestamp})
+        context.append({"role": "assistant", "content": f"第 {turn} 轮回复", "timestamp": timestamp})
+
+    print(f"{'call site':<28} {'calls':>6} {'cacheable':>10} {'reused':>8} {'prefixes':>9}")
+    for site, stats in sorted(prompt_compiler.stats().items()):
+        print(
+            f"{site:<28} {stats['calls']:>6} {stats['cacheable_ratio']:>9.1%} "
+            f"{stats['prefix_reuse_ratio']:>7.1%} {stats['distinct_prefixes']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt 前缀缓存友好度报告")
+    parser.add_argument("--turns", type=int, default=20, help="模拟对话轮数")
+    main(parser.parse_args())
@@ -0,0 +1,177 @@
+"""
+热点查询执行计划基准
+
+构造一个只有单列索引的旧库并写入大量记忆、消息和会话，
+先查看热点查询的执行计划，再执行迁移补齐组合索引，
+检查每个热点查询都走索引、且排序由索引完成。
+
+用法：
+    python -m benchmarks.bench_query_plans --rows 10000000
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import Base, Conversation, Message, SessionMemory
+from app.migrations import MIGRATIONS, run_migrations
+from app.pagination import encode_cursor, paginate
+
+
+SESSION = "s-000042"
+USER = "u-0042"
+
+
+def hot_queries():
+    """与 MemoryManager / 会话接口分页一致的热点查询"""
+    cutoff = datetime(2000, 1, 1)
+    # 翻到中间某页
+    page_cursor = encode_cursor([datetime.now() - timedelta(days=15), "m"])
+    return {
+        "memory.window": select(SessionMemory)
+            .where(SessionMemory.session_id == SESSION)
+            .order_by(SessionMemory.created_at.desc()).limit(50),
+        "memory.context": select(SessionMemory)
+            .where(SessionMemory.session_id == SESSION, SessionMemory.memory_type != "summary")
+            .order_by(SessionMemory.created_at.desc()).limit(10),
+        "memory.agent_context": select(SessionMemory)
+            .where(SessionMemory.session_id == SESSION, SessionMemory.agent_name == "main")
+            .order_by(SessionMemory.created_at.desc()).limit(10),
+        "memory.latest_intent": select(SessionMemory)
+            .where(SessionMemory.session_id == SESSION, SessionMemory.memory_type == "intent_result")
+            .order_by(SessionMemory.created_at.desc()).limit(1),
+        "memory.agent_memory": select(SessionMemory)
+            .where(SessionMemory.session_id == SESSION, SessionMemory.agent_name == "main")
+            .order_by(SessionMemory.created_at),
+        "messages.history": paginate(
+            select(Message).where(Message.session_id == SESSION),
+            [Message.created_at, Message.id], page_cursor, 20),
+        "messages.detail": paginate(
+            select(Message).where(Message.session_id == SESSION),
+            [Message.created_at, Message.id], page_cursor, 100, descending=False),
+        "conversations.list": paginate(
+            select(Conversation).where(Conversation.user_id == USER),
+            [Conversation.updated_at, Conversation.session_id], page_cursor, 20),
+        "retention.expired": select(Conversation.session_id)
+            .where(Conversation.updated_at < cutoff),
+    }
+
+
+def explain(db: sqlite3.Connection, stmt) -> list:
+    """EXPLAIN QUERY PLAN 的明细行"""
+    sql = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    return [row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def check(plan: list) -> bool:
+    """全部表访问都走索引，且无额外排序"""
+    for step in plan:
+        if step.startswith("SCAN") and "INDEX" not in step:
+            return False
+        if "TEMP B-TREE" in step:
+            return False
+    return True
+
+
+def time_query(db: sqlite3.Connection, stmt, repeat: int = 50) -> float:
+    """平均执行耗时（毫秒）"""
+    sql = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        db.execute(sql).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def report(db: sqlite3.Connection, title: str) -> bool:
+    print(f"\n== {title} ==")
+    ok = True
+    for name, stmt in hot_queries().items():
+        plan = explain(db, stmt)
+        passed = check(plan)
+        ok &= passed
+        print(f"{'PASS' if passed else 'FAIL'} {name:<22} {time_query(db, stmt):8.3f}ms  {' | '.join(plan)}")
+    return ok
+
+
+def load(path: str, rows: int, sessions: int):
+    """用递归 CTE 批量写入测试数据"""
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=OFF")
+    db.execute("PRAGMA synchronous=OFF")
+    base = datetime.now() - timedelta(days=30)
+    agents = "CASE x % 3 WHEN 0 THEN 'user' WHEN 1 THEN 'main' ELSE 'summarizer' END"
+    types = ("CASE x % 4 WHEN 0 THEN 'user_message' WHEN 1 THEN 'assistant_message' "
+             "WHEN 2 THEN 'intent_result' ELSE 'summary' END")
+    session = f"printf('s-%06d', x % {sessions})"
+    created = f"datetime('{base:%Y-%m-%d %H:%M:%S}', '+' || (x / {sessions}) || ' seconds')"
+
+    start = time.perf_counter()
+    db.execute(f"""
+        INSERT INTO session_memories (id, session_id, agent_name, memory_type, content, created_at)
+        WITH RECURSIVE seq(x) AS (SELECT 0 UNION ALL SELECT x + 1 FROM seq WHERE x < {rows - 1})
+        SELECT printf('m-%09d', x), {session}, {agents}, {types}, '记忆内容', {created} FROM seq
+    """)
+    db.execute(f"""
+        INSERT INTO messages (id, session_id, role, content, created_at, extra_data)
+        WITH RECURSIVE seq(x) AS (SELECT 0 UNION ALL SELECT x + 1 FROM seq WHERE x < {rows // 2 - 1})
+        SELECT printf('g-%09d', x), {session}, 'user', '消息内容', {created}, '{{}}' FROM seq
+    """)
+    db.execute(f"""
+        INSERT INTO conversations (session_id, user_id, title, created_at, updated_at, extra_data)
+        WITH RECURSIVE seq(x) AS (SELECT 0 UNION ALL SELECT x + 1 FROM seq WHERE x < {sessions - 1})
+        SELECT {session}, printf('u-%04d', x % 1000), '会话', {created}, {created}, '{{}}' FROM seq
+    """)
+    db.commit()
+    db.execute("ANALYZE")
+    db.close()
+    print(f"写入 {rows} 条记忆、{rows // 2} 条消息、{sessions} 个会话，用时 {time.perf_counter() - start:.1f}s")
+
+
+async def main(args):
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+    # 旧库：只有建表时的单列索引
+    composite = {
+        index.name
+        for table in Base.metadata.tables.values()
+        for index in table.indexes
+        if len(index.columns) > 1 or index.name == "ix_conversations_updated"
+    }
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for name in composite:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    load(path, args.rows, args.sessions)
+
+    db = sqlite3.connect(path)
+    report(db, "迁移前")
+    db.close()
+
+    start = time.perf_counter()
+    applied = await run_migrations(engine)
+    print(f"\n迁移 {applied}（共 {len(MIGRATIONS)} 个）用时 {time.perf_counter() - start:.1f}s")
+    await engine.dispose()
+
+    db = sqlite3.connect(path)
+    db.execute("ANALYZE")
+    ok = report(db, "迁移后")
+    db.close()
+
+    print(f"\n{'全部热点查询走索引' if ok else '存在未走索引的热点查询'}")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="热点查询执行计划基准")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="记忆行数（消息为其一半）")
+    parser.add_argument("--sessions", type=int, default=100_000, help="会话数")
+    parser.add_argument("--db", default=None, help="数据库文件路径，默认使用临时目录")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""
+序列化微基准
+
+按接口构造典型负载，对比原有路径（jsonable_encoder + JSONResponse / 标准库 json.dumps）
+与统一序列化入口在标准库与 orjson 两种实现下的耗时。
+
+用法：
+    python -m benchmarks.bench_serialization --repeat 2000
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import serialization
+from app.models import KnowledgeResult
+from app.serialization import FastJSONResponse
+
+
+def payloads() -> dict:
+    """各接口的典型负载：(原有路径, 新路径)"""
+    now = datetime.now()
+    messages = [
+        {"id": f"m-{i}", "role": "user" if i % 2 else "assistant",
+         "content": "帮我规划下周去杭州的出差行程，住在西湖附近" * 3, "created_at": now - timedelta(minutes=i)}
+        for i in range(50)
+    ]
+    conversations = [
+        {"session_id": f"s-{i}", "title": f"杭州出差 {i}", "created_at": now, "updated_at": now}
+        for i in range(20)
+    ]
+    chat_result = {
+        "message": "已为您规划好行程：\n" + "第一天：上午抵达杭州东站，入住西湖附近协议酒店。" * 10,
+        "intent": "plan_trip", "type": "plan",
+        "thought_chain": [{"step": i, "content": "查询差旅政策"} for i in range(5)],
+        "tools_used": ["search_knowledge", "query_trip_policy"],
+        "metadata": {"channel": "fast"},
+    }
+    knowledge = [
+        KnowledgeResult(content="一线城市住宿标准为每晚 600 元" * 5, source="差旅制度.pdf", similarity=0.9)
+        for _ in range(3)
+    ]
+    sse_chunk = {"type": "text", "content": "杭"}
+    bulk_row = {"table": "messages", "row": {**messages[0], "session_id": "s-1", "extra_data": {}}}
+
+    def iso(rows):
+        return [{**r, **{k: v.isoformat() for k, v in r.items() if isinstance(v, datetime)}} for r in rows]
+
+    return {
+        "POST /chat (SSE chunk)": (
+            lambda: f"data: {json.dumps(sse_chunk, ensure_ascii=False)}\n\n",
+            lambda: serialization.sse_event(sse_chunk),
+        ),
+        "POST /chat (non-stream)": (
+            lambda: JSONResponse(jsonable_encoder(chat_result)).body,
+            lambda: FastJSONResponse(chat_result).body,
+        ),
+        "GET /chat/history": (
+            lambda: JSONResponse(jsonable_encoder({"session_id": "s-1", "messages": iso(messages)})).body,
+            lambda: FastJSONResponse({"session_id": "s-1", "messages": messages, "next_cursor": None}).body,
+        ),
+        "GET /conversations": (
+            lambda: JSONResponse(jsonable_encoder({"user_id": "u-1", "conversations": iso(conversations)})).body,
+            lambda: FastJSONResponse({"user_id": "u-1", "conversations": conversations, "next_cursor": None}).body,
+        ),
+        "POST /knowledge/query": (
+            lambda: JSONResponse(jsonable_encoder({"query": "住宿标准", "results": [r.dict() for r in knowledge]})).body,
+            lambda: FastJSONResponse({"query": "住宿标准", "results": [r.model_dump() for r in knowledge]}).body,
+        ),
+        "GET /bulk/export (row)": (
+            lambda: (json.dumps(bulk_row, ensure_ascii=False, default=str) + "\n").encode("utf-8"),
+            lambda: serialization.ndjson_line(bulk_row),
+        ),
+    }
+
+
+def measure(fn, repeat: int) -> float:
+    """单次平均耗时（微秒）"""
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main(args):
+    import warnings
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    print(f"{'endpoint':<26}{'baseline':>12}{'json':>12}{'orjson':>12}{'speedup':>10}")
+    for name, (baseline, fast) in payloads().items():
+        base = measure(baseline, args.repeat)
+        serialization.set_backend("json")
+        stdlib = measure(fast, args.repeat)
+        serialization.set_backend("orjson")
+        best = measure(fast, args.repeat)
+        print(f"{name:<26}{base:10.1f}us{stdlib:10.1f}us{best:10.1f}us{base / best:9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="序列化微基准")
+    parser.add_argument("--repeat", type=int, default=2000, help="每项重复次数")
+    main(parser.parse_args())
@@ -0,0 +1,105 @@
+"""
+阶段计时开销基准
+
+测量 stage 上下文管理器、timed 装饰器（同步/协程）与 timed_iter 每个阶段的额外开销，
+分别在未开启计时与开启计时两种情况下统计，超出预算时以非零状态退出。
+
+用法：
+    python -m benchmarks.bench_stage_timer --repeat 200000
+"""
+import argparse
+import asyncio
+import time
+
+from observability.timing import StageTimings, _current_timings, stage, timed, timed_iter
+
+# 每个阶段的开销预算（微秒）
+STAGE_BUDGET_US = 5.0
+
+
+def _plain():
+    return None
+
+
+@timed("sync")
+def _timed_plain():
+    return None
+
+
+async def _coro():
+    return None
+
+
+@timed("async")
+async def _timed_coro():
+    return None
+
+
+async def _items(n: int):
+    for i in range(n):
+        yield i
+
+
+def per_call_us(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+async def per_await_us(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+async def per_item_us(make, repeat: int) -> float:
+    start = time.perf_counter()
+    async for _ in make(repeat):
+        pass
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def with_stage():
+    with stage("ctx"):
+        pass
+
+
+def measure(repeat: int) -> dict:
+    """各计时方式相对无计时基线的额外开销（微秒）"""
+    base_call = per_call_us(_plain, repeat)
+    base_await = asyncio.run(per_await_us(_coro, repeat))
+    base_item = asyncio.run(per_item_us(_items, repeat))
+
+    return {
+        "stage": per_call_us(with_stage, repeat) - base_call,
+        "timed(sync)": per_call_us(_timed_plain, repeat) - base_call,
+        "timed(async)": asyncio.run(per_await_us(_timed_coro, repeat)) - base_await,
+        "timed_iter": asyncio.run(per_item_us(lambda n: timed_iter("iter", _items(n)), repeat)) - base_item,
+    }
+
+
+def main(args):
+    failures = []
+    for label, timings in (("未开启计时", None), ("开启计时", StageTimings())):
+        # asyncio.run 复制当前上下文，协程内同样可见
+        _current_timings.set(timings)
+        overhead = measure(args.repeat)
+        print(f"{label}:")
+        for name, us in overhead.items():
+            print(f"  {name:14s} {us:6.3f}µs")
+            if us > args.budget:
+                failures.append(f"{label} {name}")
+
+    if failures:
+        print(f"FAIL: 超出 {args.budget}µs 预算: {', '.join(failures)}")
+        raise SystemExit(1)
+    print(f"PASS (budget {args.budget}µs/stage)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="阶段计时开销基准")
+    parser.add_argument("--repeat", type=int, default=200000, help="每项重复次数")
+    parser.add_argument("--budget", type=float, default=STAGE_BUDGET_US, help="每个阶段的开销预算（微秒）")
+    main(parser.parse_args())
@@ -0,0 +1,147 @@
+"""
+冷启动基准
+
+1. 用 python -X importtime 导入 app.main，统计导入总耗时与最重的模块，
+   并检查重型依赖（agentscope、dashscope、httpx、numpy、zstandard）没有在启动时加载
+2. 启动 uvicorn，测量从进程启动到首个 /health/live 请求成功的时间，
+   以及到 /health 报告预热完成（就绪）的时间
+
+超出预算时以非零状态退出，可用于回归检查。
+
+用法：
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+# 回归预算（毫秒）
+IMPORT_BUDGET_MS = 1000
+FIRST_REQUEST_BUDGET_MS = 1500
+READY_BUDGET_MS = 3000
+
+# 应在首次使用时才加载的重型依赖
+LAZY_MODULES = ("agentscope", "dashscope", "httpx", "numpy", "zstandard")
+
+PROBE = (
+    "import sys, app.main; "
+    "print(','.join(sorted({m.split('.')[0] for m in sys.modules} & set(sys.argv[1].split(',')))))"
+)
+
+
+def import_time() -> tuple:
+    """
+    导入 app.main 的耗时
+
+    Returns:
+        (app.main 累计耗时毫秒, [(累计微秒, 直接依赖)], 已加载的重型依赖)
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE, ",".join(LAZY_MODULES)],
+        capture_output=True, text=True, check=True
+    )
+
+    total_us = 0
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # 名称前的缩进表示嵌套层级，只保留 app.main 的直接依赖
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if name.strip() == "app.main":
+            total_us = int(cumulative_us)
+        elif depth == 1:
+            modules.append((int(cumulative_us), name.strip()))
+
+    loaded = [m for m in proc.stdout.strip().split(",") if m]
+    return total_us / 1000, modules, loaded
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ok(url: str, start: float, timeout: float) -> float:
+    """轮询直到返回 200，返回自 start 起的耗时（毫秒）"""
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                if resp.status == 200:
+                    return (time.perf_counter() - start) * 1000
+        except OSError:
+            # 连接失败或预热中的 503
+            time.sleep(0.005)
+    raise TimeoutError(f"{url} 未在超时时间内返回 200")
+
+
+def startup_times(timeout: float = 30.0) -> tuple:
+    """
+    启动 uvicorn 的耗时
+
+    Returns:
+        (到首个请求成功的毫秒数, 到预热完成就绪的毫秒数)
+    """
+    port = free_port()
+    env = {**os.environ, "RETENTION_ENABLED": "false"}
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env
+    )
+    try:
+        first_ms = _wait_ok(f"http://127.0.0.1:{port}/health/live", start, timeout)
+        ready_ms = _wait_ok(f"http://127.0.0.1:{port}/health", start, timeout)
+        return first_ms, ready_ms
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(args):
+    imports = [import_time() for _ in range(args.runs)]
+    import_ms = statistics.median(total for total, _, _ in imports)
+    _, modules, loaded = imports[-1]
+
+    print(f"import app.main: median={import_ms:.0f}ms (budget {args.import_budget}ms)")
+    for us, name in sorted(modules, reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f}ms  {name}")
+    print(f"启动时加载的重型依赖: {', '.join(loaded) or '无'}")
+
+    runs = [startup_times() for _ in range(args.runs)]
+    first_ms = statistics.median(first for first, _ in runs)
+    ready_ms = statistics.median(ready for _, ready in runs)
+    print(f"time to first request: median={first_ms:.0f}ms (budget {args.first_request_budget}ms)")
+    print(f"time to ready: median={ready_ms:.0f}ms (budget {args.ready_budget}ms)")
+
+    failures = []
+    if import_ms > args.import_budget:
+        failures.append("导入耗时超出预算")
+    if first_ms > args.first_request_budget:
+        failures.append("首个请求耗时超出预算")
+    if ready_ms > args.ready_budget:
+        failures.append("预热就绪耗时超出预算")
+    if loaded:
+        failures.append(f"重型依赖被提前加载: {', '.join(loaded)}")
+
+    if failures:
+        print("FAIL: " + "；".join(failures))
+        raise SystemExit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="冷启动基准")
+    parser.add_argument("--runs", type=int, default=5, help="重复次数，取中位数")
+    parser.add_argument("--top", type=int, default=10, help="列出最重的模块数")
+    parser.add_argument("--import-budget", type=int, default=IMPORT_BUDGET_MS, help="导入耗时预算（毫秒）")
+    parser.add_argument("--first-request-budget", type=int, default=FIRST_REQUEST_BUDGET_MS, help="首个请求耗时预算（毫秒）")
+    parser.add_argument("--ready-budget", type=int, default=READY_BUDGET_MS, help="预热就绪耗时预算（毫秒）")
+    main(parser.parse_args())
@@ -0,0 +1,81 @@
+"""
+追踪导出基准
+
+对比请求路径上的追踪开销：
+- 原有方式：每个 trace 结束时同步 flush（用固定延迟模拟一次网络往返）
+- 批量导出：trace 结束时只入队，由后台任务按批导出到本地文件
+
+用法：
+    python -m benchmarks.bench_trace_export --traces 2000 --flush-ms 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from observability.exporter import FileSink, TraceExporter
+from observability.tracer import LangfuseClient
+
+
+async def sync_flush_trace(flush_seconds: float):
+    """原有方式：span 创建后同步 flush"""
+    time.sleep(flush_seconds)
+
+
+async def run_batched(traces: int, directory: str) -> tuple:
+    exporter = TraceExporter([FileSink(directory)], flush_interval=0.1, batch_size=200, max_queue=traces * 4)
+    exporter.start()
+    client = LangfuseClient(exporter)
+
+    latencies = []
+    for i in range(traces):
+        start = time.perf_counter()
+        async with client.trace("chat", {"turn": i}) as trace:
+            trace.span("intent", input="为我规划行程", output="trip_planner")
+            trace.generation("llm", input="为我规划行程", output="好的" * 20, model="qwen-plus")
+        latencies.append(time.perf_counter() - start)
+
+    drain_start = time.perf_counter()
+    await exporter.stop()
+    return latencies, time.perf_counter() - drain_start
+
+
+async def run_sync(traces: int, flush_seconds: float) -> list:
+    latencies = []
+    for _ in range(traces):
+        start = time.perf_counter()
+        await sync_flush_trace(flush_seconds)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(label: str, latencies: list):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:10s} mean={statistics.mean(latencies) * 1e6:10.1f}µs  p99={p99 * 1e6:10.1f}µs")
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        batched, drain = asyncio.run(run_batched(args.traces, directory))
+        lines = sum(
+            sum(1 for _ in open(os.path.join(directory, name), "rb"))
+            for name in os.listdir(directory)
+        )
+
+    sync = asyncio.run(run_sync(min(args.traces, args.sync_traces), args.flush_ms / 1000))
+
+    print(f"traces={args.traces}  模拟 flush 延迟={args.flush_ms}ms")
+    report("sync", sync)
+    report("batched", batched)
+    print(f"关闭时导出剩余记录耗时 {drain * 1000:.1f}ms，文件共 {lines} 行（预期 {args.traces * 3}）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="追踪导出基准")
+    parser.add_argument("--traces", type=int, default=2000, help="批量导出的 trace 数")
+    parser.add_argument("--sync-traces", type=int, default=100, help="同步 flush 方式的 trace 数")
+    parser.add_argument("--flush-ms", type=float, default=20.0, help="模拟的一次 flush 网络往返（毫秒）")
+    main(parser.parse_args())
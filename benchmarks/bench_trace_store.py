@@ -0,0 +1,81 @@
+"""
+本地追踪存储写入基准
+
+构造带多层阶段的 trace 记录，按导出器的批量写入本地追踪存储，统计每秒写入的 span 数；
+低于目标吞吐时以非零状态退出。
+
+用法：
+    python -m benchmarks.bench_trace_store --turns 5000 --spans 12 --batch 100
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from observability.trace_store import TraceStore
+
+# 目标吞吐（span/秒）
+TARGET_SPANS_PER_SECOND = 5000
+
+STAGES = ["state", "intent", "intent;intent_llm", "intent;intent_llm;llm", "memory_read", "knowledge",
+          "agent", "agent;agent_rag", "agent;agent_rag;llm", "agent;agent_rag;tool_search_knowledge",
+          "sse_write", "memory_write"]
+
+
+def make_turn(session: str, spans: int) -> dict:
+    stages = [
+        {"path": STAGES[i % len(STAGES)] + ("" if i < len(STAGES) else f"_{i}"),
+         "start_ms": i * 10.0, "ms": 10.0 + i, "count": 1 + i % 3}
+        for i in range(spans)
+    ]
+    return {
+        "kind": "trace",
+        "id": str(uuid.uuid4()),
+        "name": "chat",
+        "sampled": False,
+        "metadata": {"session_id": session, "route": "/api/v1/chat", "intent": "trip_planner",
+                     "lane": "slow", "duration_ms": 350.0},
+        "timestamp": datetime.now(),
+        "stages": stages,
+    }
+
+
+def main(args) -> int:
+    events = [make_turn(f"s{i % 50}", args.spans) for i in range(args.turns)]
+    with tempfile.TemporaryDirectory() as directory:
+        store = TraceStore(os.path.join(directory, "trace_store.db"))
+        store.conn  # 建表不计入耗时
+
+        start = time.perf_counter()
+        written = 0
+        for i in range(0, len(events), args.batch):
+            written += store.write(events[i:i + args.batch])
+        elapsed = time.perf_counter() - start
+
+        query_start = time.perf_counter()
+        store.slowest(20)
+        store.stage_breakdown("s1")
+        for turn in store.turns("s1", 10):
+            store.spans(turn["trace_id"])
+        query_ms = (time.perf_counter() - query_start) * 1000
+        store.close()
+
+    rate = written / elapsed
+    print(f"turns={args.turns}  spans={written}  batch={args.batch}")
+    print(f"写入耗时 {elapsed * 1000:.1f}ms，{rate:,.0f} span/秒，{args.turns / elapsed:,.0f} 轮/秒")
+    print(f"CLI 查询（最慢轮次 + 阶段汇总 + 单会话火焰图）耗时 {query_ms:.1f}ms")
+    if rate < TARGET_SPANS_PER_SECOND:
+        print(f"低于目标吞吐 {TARGET_SPANS_PER_SECOND} span/秒")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地追踪存储写入基准")
+    parser.add_argument("--turns", type=int, default=5000, help="写入的轮数")
+    parser.add_argument("--spans", type=int, default=12, help="每轮的 span 数")
+    parser.add_argument("--batch", type=int, default=100, help="每批写入的记录数（对应 trace_export_batch_size）")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,122 @@
+"""
+WebSocket 多路复用与 SSE 并发会话基准
+
+在单个 worker 上启动服务，分别以 SSE（每轮一个新连接）和 WebSocket
+（单连接复用全部会话）跑相同数量的并发会话，对比吞吐与单轮延迟。
+
+用法：
+    python -m benchmarks.bench_ws_vs_sse --sessions 200 --turns 3
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+import uvicorn
+import websockets
+
+from app.config import settings
+from app.main import app
+
+MESSAGE = "帮我规划下周的北京出差行程"
+
+
+async def run_sse(base_url: str, sessions: int, turns: int) -> list:
+    """SSE：每轮对话新建一个连接"""
+    latencies = []
+
+    async def one_session(i: int):
+        for _ in range(turns):
+            start = time.perf_counter()
+            async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+                async with client.stream(
+                    "POST",
+                    f"{settings.api_prefix}/chat",
+                    json={"session_id": f"sse-{i}", "message": MESSAGE, "stream": True}
+                ) as response:
+                    async for line in response.aiter_lines():
+                        if line == "data: [DONE]":
+                            break
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one_session(i) for i in range(sessions)))
+    return latencies
+
+
+async def run_ws(ws_url: str, sessions: int, turns: int) -> list:
+    """WebSocket：单连接复用所有会话"""
+    latencies = []
+    remaining = {f"ws-{i}": turns for i in range(sessions)}
+    started = {}
+
+    async with websockets.connect(ws_url, max_size=None) as ws:
+        async def start_turn(session_id: str):
+            started[session_id] = time.perf_counter()
+            await ws.send(json.dumps({"op": "chat", "session_id": session_id, "message": MESSAGE}))
+
+        for session_id in remaining:
+            await start_turn(session_id)
+
+        while remaining:
+            frame = json.loads(await ws.recv())
+            session_id = frame.get("session_id")
+            if frame.get("type") == "text":
+                # 每收到一个数据块归还一个额度
+                await ws.send(json.dumps({"op": "credit", "session_id": session_id, "credit": 1}))
+            elif frame.get("type") in ("done", "error"):
+                latencies.append(time.perf_counter() - started[session_id])
+                remaining[session_id] -= 1
+                if remaining[session_id]:
+                    await start_turn(session_id)
+                else:
+                    del remaining[session_id]
+
+    return latencies
+
+
+def report(name: str, latencies: list, elapsed: float):
+    """输出结果"""
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0.0
+    print(
+        f"{name:<4} turns={len(latencies):<6} "
+        f"throughput={len(latencies) / elapsed:8.1f} turns/s  "
+        f"p50={statistics.median(latencies) * 1000:7.1f}ms  "
+        f"p99={p99 * 1000:7.1f}ms"
+    )
+
+
+async def main(args):
+    # 单连接需要承载全部会话
+    settings.ws_max_streams = max(settings.ws_max_streams, args.sessions)
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning")
+    server = uvicorn.Server(config)
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    ws_url = f"ws://127.0.0.1:{args.port}{settings.api_prefix}/chat/ws"
+
+    try:
+        start = time.perf_counter()
+        latencies = await run_sse(base_url, args.sessions, args.turns)
+        report("SSE", latencies, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        latencies = await run_ws(ws_url, args.sessions, args.turns)
+        report("WS", latencies, time.perf_counter() - start)
+    finally:
+        server.should_exit = True
+        await serve_task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WebSocket vs SSE 并发会话基准")
+    parser.add_argument("--sessions", type=int, default=100, help="并发会话数")
+    parser.add_argument("--turns", type=int, default=3, help="每个会话的对话轮数")
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""
+生成取消
+客户端断开时，沿主智能体、子智能体流和工具调用传播取消信号
+"""
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from observability.metrics import metrics
+
+
+class GenerationCancelled(Exception):
+    """生成已被取消"""
+
+
+class CancelToken:
+    """
+    取消令牌
+    记录本轮生成的进度，取消时据此估算节省的 token 数与耗时
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self.reason: Optional[str] = None
+        self.started_at = time.perf_counter()
+        self.emitted_tokens = 0
+        self.expected_tokens: Optional[int] = None
+
+    def expect(self, tokens: int):
+        """登记本轮预计生成的 token 数（已知时）"""
+        self.expected_tokens = tokens
+
+    def progress(self, tokens: int = 1):
+        """记录已生成的 token 数"""
+        self.emitted_tokens += tokens
+
+    def cancel(self, reason: str = "cancelled"):
+        """触发取消"""
+        if not self.cancelled:
+            self.cancelled = True
+            self.reason = reason
+
+    def raise_if_cancelled(self):
+        """已取消时抛出 GenerationCancelled"""
+        if self.cancelled:
+            raise GenerationCancelled(self.reason)
+
+    def saved(self) -> tuple:
+        """估算节省的 (token 数, 秒数)"""
+        if self.expected_tokens is None:
+            return 0, 0.0
+
+        remaining = max(self.expected_tokens - self.emitted_tokens, 0)
+        if not self.emitted_tokens:
+            return remaining, 0.0
+
+        # 按已生成部分的平均速率估算剩余耗时
+        elapsed = time.perf_counter() - self.started_at
+        return remaining, elapsed / self.emitted_tokens * remaining
+
+
+# 当前轮次的取消令牌，子智能体与工具通过它感知取消
+_current_token: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+
+def get_cancel_token() -> Optional[CancelToken]:
+    """获取当前轮次的取消令牌"""
+    return _current_token.get()
+
+
+def bind_cancel_token(token: CancelToken):
+    """绑定当前轮次的取消令牌，返回用于恢复的 contextvar Token"""
+    return _current_token.set(token)
+
+
+def unbind_cancel_token(ctx_token):
+    """解绑取消令牌"""
+    try:
+        _current_token.reset(ctx_token)
+    except ValueError:
+        # 生成器在其他上下文中被关闭
+        pass
+
+
+def check_cancelled():
+    """供工具和子智能体在关键点检查取消"""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def record_cancellation(token: CancelToken):
+    """记录取消指标"""
+    saved_tokens, saved_seconds = token.saved()
+    metrics.counter("chat_cancelled_total", "因客户端断开而取消的生成次数").inc()
+    metrics.counter("chat_cancel_saved_tokens_total", "取消生成节省的 token 数").inc(saved_tokens)
+    metrics.counter("chat_cancel_saved_seconds_total", "取消生成节省的秒数").inc(saved_seconds)
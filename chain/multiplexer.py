@@ -0,0 +1,134 @@
+"""
+流多路复用器
+在单个 WebSocket 连接上复用多个 session_id 的流式输出
+"""
+import asyncio
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Optional
+
+
+class StreamChannel:
+    """
+    单个会话流
+    基于信用额度（credit）实现流控：每发送一个数据块消耗一个额度，
+    额度耗尽时暂停发送，直到客户端补充额度
+    """
+
+    def __init__(self, session_id: str, credit: int):
+        self.session_id = session_id
+        self.credit = credit
+        self.task: Optional[asyncio.Task] = None
+        # 客户端主动取消时为取消原因，流结束时据此发送终止帧
+        self.cancel_reason: Optional[str] = None
+        self._credit_available = asyncio.Event()
+        if credit > 0:
+            self._credit_available.set()
+
+    def grant(self, credit: int):
+        """补充发送额度"""
+        self.credit += credit
+        if self.credit > 0:
+            self._credit_available.set()
+
+    async def acquire(self):
+        """获取一个发送额度，额度不足时等待"""
+        await self._credit_available.wait()
+        self.credit -= 1
+        if self.credit <= 0:
+            self._credit_available.clear()
+
+    def cancel(self, reason: Optional[str] = None):
+        """取消流；指定 reason 时流结束前向客户端发送 cancelled 终止帧"""
+        if self.task and not self.task.done():
+            self.cancel_reason = reason
+            self.task.cancel()
+
+
+class StreamMultiplexer:
+    """
+    流多路复用器
+    核心职责：
+    1. 为每个 session_id 维护独立的流与流控额度
+    2. 串行化对底层连接的写入，保证帧不交错
+    3. 客户端取消的流以 {"type": "cancelled"} 帧结束，连接关闭时静默取消所有未完成的流
+    """
+
+    def __init__(
+        self,
+        send: Callable[[dict], Awaitable[None]],
+        initial_credit: int = 256,
+        max_streams: int = 32
+    ):
+        self._send = send
+        self._send_lock = asyncio.Lock()
+        self.initial_credit = initial_credit
+        self.max_streams = max_streams
+        self.channels: Dict[str, StreamChannel] = {}
+
+    async def send(self, session_id: str, chunk: dict):
+        """向连接写入一帧"""
+        async with self._send_lock:
+            await self._send({"session_id": session_id, **chunk})
+
+    async def open(
+        self,
+        session_id: str,
+        generator: AsyncGenerator[dict, None]
+    ) -> bool:
+        """
+        打开一个会话流
+
+        Returns:
+            是否成功打开（同一会话已有进行中的流或超过并发上限时失败）
+        """
+        channel = self.channels.get(session_id)
+        if channel and channel.task and not channel.task.done():
+            await self.send(session_id, {"type": "error", "content": "该会话已有进行中的流"})
+            return False
+
+        if len(self.channels) >= self.max_streams:
+            await self.send(session_id, {"type": "error", "content": "并发流数量超过上限"})
+            return False
+
+        channel = StreamChannel(session_id, self.initial_credit)
+        channel.task = asyncio.create_task(self._pump(channel, generator))
+        self.channels[session_id] = channel
+        return True
+
+    async def _pump(self, channel: StreamChannel, generator: AsyncGenerator[dict, None]):
+        """将生成器的数据块按流控额度写入连接"""
+        try:
+            async for chunk in generator:
+                await channel.acquire()
+                await self.send(channel.session_id, chunk)
+        except asyncio.CancelledError:
+            if channel.cancel_reason:
+                # 终止帧不占流控额度，客户端据此区分已取消与停滞的流
+                await self.send(channel.session_id, {"type": "cancelled", "reason": channel.cancel_reason})
+            raise
+        except Exception as e:
+            await self.send(channel.session_id, {"type": "error", "content": str(e)})
+        finally:
+            await generator.aclose()
+            self.channels.pop(channel.session_id, None)
+
+    def grant(self, session_id: str, credit: int):
+        """为会话流补充额度"""
+        channel = self.channels.get(session_id)
+        if channel:
+            channel.grant(credit)
+
+    def cancel(self, session_id: str):
+        """取消会话流（客户端发起），流结束时发送 cancelled 终止帧"""
+        channel = self.channels.get(session_id)
+        if channel:
+            channel.cancel("client_cancel")
+
+    async def close(self):
+        """关闭所有会话流"""
+        channels = list(self.channels.values())
+        for channel in channels:
+            channel.cancel()
+        tasks = [c.task for c in channels if c.task]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.channels.clear()
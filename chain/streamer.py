@@ -2,11 +2,12 @@
 流式输出模块
 实现 Server-Sent Events (SSE) 流式输出
 """
-import json
+import io
 import asyncio
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator, AsyncIterable, Iterable, Optional, Union
 from dataclasses import dataclass
 
+from app.serialization import dumps_str
 from chain.collector import TaskCollector
 
 
@@ -18,6 +19,62 @@ class StreamChunk:
     metadata: dict = None
 
 
+class ResponseAggregator:
+    """
+    增量响应聚合器
+    在数据块产生时逐个折叠，每个数据块 O(1) 处理，不保留数据块列表
+    """
+
+    def __init__(self):
+        self._text = io.StringIO()
+        self.thought_chain = []
+        self.tools_used = []
+        self.intent = None
+        self.channel = None
+        self.response_type = None
+        self.error = None
+        self.chunk_count = 0
+
+    def add(self, chunk: dict):
+        """折叠单个数据块"""
+        self.chunk_count += 1
+        chunk_type = chunk.get("type")
+
+        if chunk_type == "text":
+            self._text.write(chunk.get("content", ""))
+        elif chunk_type == "intent":
+            self.intent = chunk.get("intent")
+            self.channel = chunk.get("channel")
+        elif chunk_type == "thought":
+            self.thought_chain.append(chunk)
+        elif chunk_type == "tool_use":
+            self.tools_used.append(chunk.get("tool_name"))
+        elif chunk_type == "done":
+            self.intent = chunk.get("intent", self.intent)
+            self.response_type = chunk.get("response_type", self.response_type)
+        elif chunk_type == "error":
+            self.error = chunk.get("content")
+
+    @property
+    def message(self) -> str:
+        """当前已聚合的文本"""
+        return self._text.getvalue()
+
+    def result(self, **metadata) -> dict:
+        """构建结构化的最终响应"""
+        result = {
+            "message": self.message,
+            "intent": self.intent,
+            "type": self.response_type,
+            "thought_chain": self.thought_chain,
+            "tools_used": self.tools_used,
+            "metadata": {"channel": self.channel, **metadata},
+        }
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
 class Streamer:
     """
     流式输出器
@@ -92,39 +149,34 @@ class Streamer:
         if chunk.metadata:
             data["metadata"] = chunk.metadata
 
-        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+        return f"data: {dumps_str(data)}\n\n"
 
-    async def aggregate_response(self, chunks: list) -> dict:
+    async def aggregate_response(
+        self,
+        chunks: Union[Iterable[dict], AsyncIterable[dict]]
+    ) -> dict:
         """
         聚合响应
 
         Args:
-            chunks: 数据块列表
+            chunks: 数据块序列或异步生成器，逐个折叠，不会整体缓存
 
         Returns:
             结构化的最终响应
         """
-        text_content = []
-        thought_chain = []
-        tools_used = []
-
-        for chunk in chunks:
-            if chunk.get("type") == "text":
-                text_content.append(chunk.get("content", ""))
-            elif chunk.get("type") == "thought":
-                thought_chain.append(chunk)
-            elif chunk.get("type") == "tool_use":
-                tools_used.append(chunk.get("tool_name"))
-
-        return {
-            "message": "".join(text_content),
-            "thought_chain": thought_chain,
-            "tools_used": tools_used,
-            "metadata": {
-                "card_data": self.card_data,
-                "task_status": self.collector.get_tasks()
-            }
-        }
+        aggregator = ResponseAggregator()
+
+        if hasattr(chunks, "__aiter__"):
+            async for chunk in chunks:
+                aggregator.add(chunk)
+        else:
+            for chunk in chunks:
+                aggregator.add(chunk)
+
+        return aggregator.result(
+            card_data=self.card_data,
+            task_status=self.collector.get_tasks()
+        )
 
 
 def create_sse_response(generator: AsyncGenerator) -> AsyncGenerator[str, None]:
@@ -0,0 +1,259 @@
+"""
+上下文工程 - Token 预算装配
+按 token 计数装配上下文，并维护增量更新的滚动会话摘要
+"""
+import json
+import re
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+
+from app.config import settings
+
+
+# 中日韩字符，每个字符约等于一个 token
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+class TokenCounter:
+    """
+    Token 计数器
+    优先使用 DashScope 分词器，不可用时退化为按字符估算；分词器只加载一次，计数结果带缓存
+    """
+
+    def __init__(self, model: str = None, cache_size: int = 4096):
+        self.model = model or settings.dashscope_model
+        self._tokenizer = None
+        self._loaded = False
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    def _load_tokenizer(self):
+        """加载分词器"""
+        self._loaded = True
+        try:
+            from dashscope import get_tokenizer
+            self._tokenizer = get_tokenizer(self.model)
+        except Exception:
+            self._tokenizer = None
+
+    def _count(self, text: str) -> int:
+        """计算 token 数"""
+        if not text:
+            return 0
+
+        if not self._loaded:
+            self._load_tokenizer()
+
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text))
+
+        # 估算：中文按字计数，其余约 4 个字符一个 token
+        cjk = len(_CJK_PATTERN.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """截断文本到不超过 max_tokens"""
+        if self.count(text) <= max_tokens:
+            return text
+
+        # 二分查找满足预算的最长前缀
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.count(text[:mid] + "…") <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low] + "…" if low else ""
+
+
+# 全局实例
+token_counter = TokenCounter()
+
+
+@dataclass
+class ContextSection:
+    """上下文片段"""
+    name: str
+    text: str
+    priority: int = 10       # 数值越小越优先
+    required: bool = False   # 必选片段不参与裁剪
+    truncatable: bool = True
+
+
+class ContextAssembler:
+    """
+    上下文装配器
+    在给定 token 预算内按优先级填充片段：必选片段先占预算，
+    其余片段按优先级放入，放不下时截断或丢弃
+    """
+
+    def __init__(self, budget: int = None, counter: TokenCounter = None):
+        self.budget = budget or settings.context_token_budget
+        self.counter = counter or token_counter
+
+    def assemble(self, sections: List[ContextSection]) -> dict:
+        """
+        装配片段
+
+        Returns:
+            {名称: 文本}，只包含被选中的片段；另含 "_tokens" 为总 token 数
+        """
+        chosen = {}
+        used = 0
+
+        for section in sorted(sections, key=lambda s: (not s.required, s.priority)):
+            if not section.text:
+                continue
+
+            tokens = self.counter.count(section.text)
+            remaining = self.budget - used
+
+            if section.required or tokens <= remaining:
+                chosen[section.name] = section.text
+                used += tokens
+            elif section.truncatable and remaining > 0:
+                text = self.counter.truncate(section.text, remaining)
+                if text:
+                    chosen[section.name] = text
+                    used += self.counter.count(text)
+
+        chosen["_tokens"] = used
+        return chosen
+
+    def fit_history(self, context: List[dict], budget: int) -> List[dict]:
+        """
+        从最新的对话开始向前填充，直到用完预算
+
+        Returns:
+            预算内的对话（旧的在前）
+        """
+        selected = []
+        used = 0
+        for message in reversed(context):
+            tokens = self.counter.count(format_message(message))
+            if used + tokens > budget:
+                break
+            selected.append(message)
+            used += tokens
+        selected.reverse()
+        return selected
+
+
+_ROLE_LABELS = {"user": "用户", "assistant": "助手"}
+
+
+def format_message(message: dict) -> str:
+    """格式化单条对话"""
+    label = _ROLE_LABELS.get(message.get("role"), message.get("role", "用户"))
+    return f"{label}: {message.get('content', '')}"
+
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?])|\n")
+
+
+def _first_sentence(text: str) -> str:
+    """取第一个非空句子"""
+    for part in _SENTENCE_END.split(text or ""):
+        if part.strip():
+            return part.strip()
+    return ""
+
+
+class RollingSummary:
+    """
+    滚动会话摘要
+    只折叠已滑出逐字保留窗口的早期对话：将新滑出的消息压缩为摘要条目追加，
+    超出预算时丢弃最早的条目，不会重新生成整段摘要。
+    摘要在构建 Prompt 时按需折叠，以每个会话一行（固定 id）的 summary 记忆持久化
+    """
+
+    AGENT_NAME = "summarizer"
+    MEMORY_TYPE = "summary"
+
+    def __init__(self, memory_manager, counter: TokenCounter = None):
+        self.memory_manager = memory_manager
+        self.counter = counter or token_counter
+        self.max_tokens = settings.context_summary_tokens
+        self.line_tokens = settings.context_summary_line_tokens
+
+    @staticmethod
+    def memory_id(session_id: str) -> str:
+        """会话摘要行的固定 id"""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"summary:{session_id}"))
+
+    async def load(self) -> dict:
+        """加载当前摘要"""
+        latest = await self.memory_manager.get_latest_memory(self.MEMORY_TYPE, self.AGENT_NAME)
+        if latest:
+            try:
+                return json.loads(latest["content"])
+            except (TypeError, ValueError):
+                pass
+        return {"entries": [], "upto": None}
+
+    async def fold(self, messages: List[dict]) -> dict:
+        """将尚未折叠的早期对话追加到摘要，有变化时覆盖保存"""
+        summary = await self.advance(messages)
+        if summary is None:
+            return await self.load()
+
+        await self.memory_manager.put_agent_memory(
+            self.memory_id(self.memory_manager.session_id), self.AGENT_NAME, self.MEMORY_TYPE, self.dumps(summary)
+        )
+        return summary
+
+    async def advance(self, messages: List[dict]) -> Optional[dict]:
+        """
+        计算追加尚未折叠的对话后的摘要，不保存
+
+        Args:
+            messages: 已滑出逐字保留窗口的对话（旧的在前）
+
+        Returns:
+            新摘要；没有新对话时返回 None
+        """
+        summary = await self.load()
+        upto = summary.get("upto")
+
+        new_messages = [m for m in messages if not upto or m["timestamp"] > upto]
+        if not new_messages:
+            return None
+
+        entries = summary["entries"]
+        for message in new_messages:
+            # 每条只保留首句，再按单条预算截断
+            condensed = {**message, "content": _first_sentence(message.get("content", ""))}
+            entries.append({
+                "ts": message["timestamp"],
+                "text": self.counter.truncate(format_message(condensed), self.line_tokens),
+            })
+
+        # 超出摘要预算时丢弃最早的条目
+        total = sum(self.counter.count(e["text"]) for e in entries)
+        while entries and total > self.max_tokens:
+            total -= self.counter.count(entries.pop(0)["text"])
+
+        return {"entries": entries, "upto": new_messages[-1]["timestamp"]}
+
+    @staticmethod
+    def dumps(summary: dict) -> str:
+        """序列化摘要"""
+        return json.dumps(summary, ensure_ascii=False)
+
+
+def summary_text(summary: Optional[dict], before: Optional[str] = None) -> str:
+    """
+    渲染摘要文本
+
+    Args:
+        summary: 摘要
+        before: 只保留早于该时间的条目，避免与逐字保留的近期对话重复
+    """
+    if not summary:
+        return ""
+    return "\n".join(
+        e["text"] for e in summary.get("entries", [])
+        if before is None or e["ts"] < before
+    )
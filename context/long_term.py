@@ -0,0 +1,355 @@
+"""
+上下文工程 - 长期记忆
+按 user_id 保存历史行程摘要与偏好的向量，支持 top-k 召回；
+向量存放在内存映射文件中，增量追加写入；索引目录同一时间只允许一个进程打开（单写者）
+"""
+import json
+import logging
+import os
+import threading
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows 下不做跨进程加锁
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# numpy 导入较慢，首次使用长期记忆时再加载
+np = None
+_numpy_missing = False
+
+
+def _load_numpy() -> bool:
+    """加载 numpy，返回是否可用"""
+    global np, _numpy_missing
+    if np is None and not _numpy_missing:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            _numpy_missing = True
+    return np is not None
+
+
+# 表达长期偏好的关键词：只收明确表达习惯或喜好的说法，"一般""附近"这类普通用语不算
+PREFERENCE_KEYWORDS = ("总是", "每次都", "一向", "习惯", "喜欢", "偏好", "常住", "优先选", "尽量选")
+
+# 与已有记忆的相似度不低于该值且文本相同时视为重复
+_DUPLICATE_SCORE = 0.999
+
+
+class HashingEmbedder:
+    """
+    本地哈希向量化
+    将字符 1~3 元组哈希到固定维度并归一化，无需外部模型即可做相似度召回
+    """
+
+    def __init__(self, dim: int = 256):
+        _load_numpy()
+        self.dim = dim
+
+    def embed(self, text: str) -> "np.ndarray":
+        """文本向量化"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        text = text.strip()
+        for n in (1, 2, 3):
+            for i in range(len(text) - n + 1):
+                h = zlib.crc32(text[i:i + n].encode("utf-8"))
+                vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class IndexLockedError(RuntimeError):
+    """索引目录已被其他进程打开"""
+
+
+class VectorIndex:
+    """
+    向量索引
+    文件布局（均为追加写入）：
+    - vectors.f32  向量，内存映射，容量按倍数扩展
+    - owners.i32   每行所属用户编号，内存映射
+    - meta.jsonl   每行元数据
+    - offsets.i64  元数据在 meta.jsonl 中的偏移
+    - users.jsonl  用户编号表（行号即编号）
+    召回时只扫描该用户的行。
+    打开时对目录下的 index.lock 加非阻塞排他锁，其他进程已打开时抛出 IndexLockedError
+    """
+
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, path: str, dim: int = 256):
+        if not _load_numpy():
+            raise ImportError("向量索引需要安装 numpy")
+        self.path = path
+        self.dim = dim
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = self._acquire_lock(os.path.join(path, "index.lock"))
+
+        self._header_path = os.path.join(path, "header.json")
+        self._meta_path = os.path.join(path, "meta.jsonl")
+        self._users_path = os.path.join(path, "users.jsonl")
+
+        header = self._read_json(self._header_path, {"dim": dim, "count": 0, "capacity": 0})
+        if header["capacity"] and header["dim"] != dim:
+            raise ValueError(f"索引维度不一致: {header['dim']} != {dim}")
+
+        self.count = header["count"]
+        self.capacity = 0
+        self._vectors = self._owners = self._offsets = None
+        self._ensure_capacity(max(header["capacity"], self.INITIAL_CAPACITY))
+
+        self._user_codes: Dict[str, int] = {}
+        if os.path.exists(self._users_path):
+            with open(self._users_path, "r", encoding="utf-8") as f:
+                for code, line in enumerate(f):
+                    self._user_codes[json.loads(line)] = code
+        self._users_file = open(self._users_path, "a", encoding="utf-8")
+        self._meta_file = open(self._meta_path, "ab")
+        self._rows_by_user = self._build_user_rows()
+
+    @staticmethod
+    def _acquire_lock(lock_path: str):
+        """对锁文件加非阻塞排他锁，锁随文件句柄关闭释放"""
+        lock_file = open(lock_path, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                raise IndexLockedError(f"长期记忆索引已被其他进程打开: {os.path.dirname(lock_path)}")
+        return lock_file
+
+    @staticmethod
+    def _read_json(path: str, default):
+        if not os.path.exists(path):
+            return default
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _open_memmap(self, name: str, dtype, shape) -> "np.memmap":
+        """打开（必要时扩展）内存映射文件"""
+        file_path = os.path.join(self.path, name)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(file_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(file_path, dtype=dtype, mode="r+", shape=shape)
+
+    def _ensure_capacity(self, needed: int):
+        """容量不足时按倍数扩展"""
+        if needed <= self.capacity:
+            return
+
+        capacity = max(self.capacity, self.INITIAL_CAPACITY)
+        while capacity < needed:
+            capacity *= 2
+
+        for mm in (self._vectors, self._owners, self._offsets):
+            if mm is not None:
+                mm.flush()
+
+        self._vectors = self._open_memmap("vectors.f32", np.float32, (capacity, self.dim))
+        self._owners = self._open_memmap("owners.i32", np.int32, (capacity,))
+        self._offsets = self._open_memmap("offsets.i64", np.int64, (capacity,))
+        self.capacity = capacity
+
+    def _build_user_rows(self) -> Dict[int, "np.ndarray"]:
+        """按用户分组行号"""
+        owners = np.asarray(self._owners[:self.count])
+        order = np.argsort(owners, kind="stable")
+        codes, starts = np.unique(owners[order], return_index=True)
+        groups = np.split(order, starts[1:]) if len(order) else []
+        return {int(code): rows.astype(np.int64) for code, rows in zip(codes, groups)}
+
+    def _user_code(self, user_id: str) -> int:
+        """获取或分配用户编号"""
+        code = self._user_codes.get(user_id)
+        if code is None:
+            code = self._user_codes[user_id] = len(self._user_codes)
+            self._users_file.write(json.dumps(user_id, ensure_ascii=False) + "\n")
+            self._users_file.flush()
+        return code
+
+    def add(self, user_id: str, vectors: "np.ndarray", metas: List[dict]):
+        """增量追加向量"""
+        vectors = np.atleast_2d(vectors).astype(np.float32)
+        n = len(vectors)
+        start = self.count
+        self._ensure_capacity(start + n)
+
+        code = self._user_code(user_id)
+        offset = self._meta_file.tell()
+        offsets = []
+        lines = []
+        for meta in metas:
+            line = (json.dumps(meta, ensure_ascii=False) + "\n").encode("utf-8")
+            offsets.append(offset)
+            offset += len(line)
+            lines.append(line)
+        self._meta_file.write(b"".join(lines))
+        self._meta_file.flush()
+
+        self._vectors[start:start + n] = vectors
+        self._owners[start:start + n] = code
+        self._offsets[start:start + n] = offsets
+        self.count += n
+
+        rows = np.arange(start, start + n, dtype=np.int64)
+        existing = self._rows_by_user.get(code)
+        self._rows_by_user[code] = rows if existing is None else np.concatenate([existing, rows])
+
+        self._write_header()
+
+    def _write_header(self):
+        with open(self._header_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "count": self.count, "capacity": self.capacity}, f)
+
+    def search(self, user_id: str, query: "np.ndarray", k: int = 3) -> List[tuple]:
+        """
+        召回该用户最相似的 k 条
+
+        Returns:
+            [(行号, 相似度)]，按相似度降序
+        """
+        code = self._user_codes.get(user_id)
+        rows = self._rows_by_user.get(code) if code is not None else None
+        if rows is None or not len(rows):
+            return []
+
+        scores = self._vectors[rows] @ query
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def meta(self, row: int) -> dict:
+        """读取行元数据"""
+        with open(self._meta_path, "rb") as f:
+            f.seek(int(self._offsets[row]))
+            return json.loads(f.readline())
+
+    def flush(self):
+        """刷写内存映射与头信息"""
+        self._vectors.flush()
+        self._owners.flush()
+        self._offsets.flush()
+        self._write_header()
+
+    def close(self):
+        """关闭索引"""
+        self.flush()
+        self._meta_file.close()
+        self._users_file.close()
+        self._lock_file.close()
+
+
+class LongTermMemory:
+    """
+    用户长期记忆
+    保存跨会话的行程摘要和偏好，规划时按 user_id 召回。
+    读写均为同步的 CPU 与文件操作，异步代码中应通过 asyncio.to_thread 调用；
+    进程内以锁串行访问索引，与已有记忆完全相同的文本不重复写入
+    """
+
+    def __init__(self, path: str = None, dim: int = None):
+        self.path = path or settings.long_term_memory_dir
+        self.dim = dim or settings.long_term_memory_dim
+        self._index: Optional[VectorIndex] = None
+        self._embedder: Optional[HashingEmbedder] = None
+        self._lock = threading.Lock()
+        self._locked_out = False
+
+    @property
+    def available(self) -> bool:
+        """是否可用（需要 numpy，且索引未被其他进程占用）"""
+        return settings.long_term_memory_enabled and not self._locked_out and _load_numpy()
+
+    def _ensure_index(self) -> Optional[VectorIndex]:
+        """首次使用时打开索引，需持有 _lock；索引被其他进程占用时返回 None"""
+        if self._index is None and not self._locked_out:
+            try:
+                self._index = VectorIndex(self.path, self.dim)
+            except IndexLockedError as e:
+                self._locked_out = True
+                logger.warning("%s，本进程不使用长期记忆", e)
+                return None
+            self._embedder = HashingEmbedder(self.dim)
+        return self._index
+
+    def warm(self) -> Optional[int]:
+        """
+        打开索引并加载用户行分组，供启动预热在线程中调用
+
+        Returns:
+            索引中的记忆条数；不可用或被其他进程占用时返回 None
+        """
+        if not self.available:
+            return None
+        with self._lock:
+            index = self._ensure_index()
+            return index.count if index is not None else None
+
+    def remember(self, user_id: str, text: str, kind: str = "preference", session_id: str = None):
+        """写入一条长期记忆，与该用户已有记忆重复时跳过"""
+        if not self.available or not user_id or not text:
+            return
+
+        with self._lock:
+            index = self._ensure_index()
+            if index is None:
+                return
+            vector = self._embedder.embed(text)
+            for row, score in index.search(user_id, vector, 1):
+                if score >= _DUPLICATE_SCORE and index.meta(row)["text"] == text:
+                    return
+            index.add(user_id, vector, [{
+                "text": text,
+                "kind": kind,
+                "session_id": session_id,
+                "created_at": datetime.now().isoformat(),
+            }])
+
+    def recall(self, user_id: str, query: str, k: int = None) -> List[dict]:
+        """召回与查询最相关的 k 条长期记忆"""
+        if not self.available or not user_id:
+            return []
+
+        with self._lock:
+            index = self._ensure_index()
+            if index is None:
+                return []
+            hits = index.search(user_id, self._embedder.embed(query), k or settings.long_term_recall_k)
+            return [{**index.meta(row), "score": score} for row, score in hits]
+
+    def close(self):
+        """关闭索引"""
+        with self._lock:
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+
+
+def is_preference(text: str) -> bool:
+    """判断用户消息是否表达了长期偏好（提问不算）"""
+    text = text.strip()
+    if not text or text.endswith(("?", "？", "吗")):
+        return False
+    return any(keyword in text for keyword in PREFERENCE_KEYWORDS)
+
+
+def trip_summary(slots: dict) -> str:
+    """将已收集的行程槽位压缩为一条摘要"""
+    return "历史行程：" + "，".join(f"{k}={v}" for k, v in slots.items())
+
+
+# 全局实例
+long_term_memory = LongTermMemory()
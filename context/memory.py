@@ -1,11 +1,514 @@
 """
 上下文工程 - 记忆管理
 """
-from typing import Optional, List
-from sqlalchemy import select, delete
+import asyncio
+import logging
+import sys
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Deque, Dict, Optional, List, Tuple
+from sqlalchemy import select, delete, insert, update, bindparam
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import async_session, SessionMemory
+from app.config import settings
+from app.database import async_session, Conversation, Message, SessionMemory
+from context.assembler import ContextAssembler
+from context.state_store import StateSnapshot, state_store
+from observability.metrics import metrics
+from observability.timing import timed
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    写后缓冲区
+    将各会话的插入攒批，由后台任务周期性地以多行插入一次提交；
+    按主键的更新同样攒批，同一行只保留最后一次取值，与插入在同一事务中执行；
+    未落库的行按会话索引，读取时合并，保证同一会话读己之写。
+
+    整批写入失败时放回队列，按指数退避重试；连续失败 max_retries 次后逐行单独写入，
+    单独写入仍失败的行丢弃，避免一行坏数据阻塞全部写入。积压超过 max_pending 时丢弃最旧的插入
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = 0.05,
+        batch_size: int = 500,
+        max_pending: int = 10000,
+        max_retries: int = 5,
+        max_backoff: float = 5.0
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self._pending: List[Tuple[type, dict]] = []
+        self._updates: Dict[Tuple[type, str], dict] = {}
+        self._by_session: Dict[Tuple[type, str], List[dict]] = defaultdict(list)
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # 连续整批写入失败的次数
+        self._failures = 0
+        self.stats = {"rows": 0, "commits": 0, "errors": 0, "dropped": 0}
+        self._dropped = metrics.counter("memory_write_dropped_total", "写后缓冲丢弃的行数", ("reason",))
+
+    def start(self):
+        """启动后台刷写任务"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务并刷写剩余数据"""
+        if self._task:
+            # 不直接取消任务，避免中断进行中的事务
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+            self._stopping = False
+        await self.flush()
+
+    async def add(self, model: type, row: dict) -> dict:
+        """加入一行待写数据，返回补全 id 与时间后的行"""
+        await self.add_many([(model, row)])
+        return row
+
+    async def add_many(self, rows: List[Tuple[type, dict]], updates: List[Tuple[type, dict]] = ()):
+        """
+        原子地加入多行插入与按主键的更新，保证它们在同一次刷写（同一事务）中落库
+
+        Args:
+            rows: [(模型, 行)]，行会补全 id 与时间
+            updates: [(模型, 含主键的取值)]
+        """
+        for model, row in rows:
+            row.setdefault("id", str(uuid.uuid4()))
+            row.setdefault("created_at", datetime.now())
+            self._pending.append((model, row))
+            self._by_session[(model, row["session_id"])].append(row)
+
+        for model, values in updates:
+            key = (model, values[_primary_key(model).key])
+            self._updates.setdefault(key, {}).update(values)
+
+        self.start()
+
+        size = len(self._pending) + len(self._updates)
+        if size >= self.max_pending:
+            # 背压：积压过多时同步刷写，刷写失败仍超限则丢弃最旧的插入
+            await self.flush()
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                dropped, self._pending = self._pending[:overflow], self._pending[overflow:]
+                self._forget(dropped)
+                self._count_dropped("overflow", len(dropped))
+                logger.error("写后缓冲积压超过上限 %d，丢弃最旧的 %d 行", self.max_pending, len(dropped))
+        elif size >= self.batch_size:
+            self._wakeup.set()
+
+    def pending(self, model: type, session_id: str) -> List[dict]:
+        """获取会话尚未落库（含正在落库）的行"""
+        return list(self._by_session.get((model, session_id), ()))
+
+    def discard(self, model: type, session_id: str):
+        """丢弃会话尚未落库的行"""
+        rows = self._by_session.pop((model, session_id), None)
+        if rows:
+            ids = {id(r) for r in rows}
+            self._pending = [(m, r) for m, r in self._pending if id(r) not in ids]
+
+    def discard_session(self, session_id: str):
+        """丢弃会话所有尚未落库的行与更新"""
+        for model, sid in list(self._by_session):
+            if sid == session_id:
+                self.discard(model, sid)
+        for key in [k for k in self._updates if k[1] == session_id]:
+            del self._updates[key]
+
+    def has_pending(self, session_id: str) -> bool:
+        """会话是否有尚未落库的行或更新"""
+        return any(sid == session_id for _, sid in self._by_session) or \
+            any(key == session_id for _, key in self._updates)
+
+    @asynccontextmanager
+    async def paused(self):
+        """
+        暂停刷写：持有期间没有行从未落库变为已落库（也不会有刷写进行中），
+        供需要先读数据库、再读未落库行的调用方保证两次读取之间不遗漏
+        """
+        async with self._flush_lock:
+            yield
+
+    async def sync_session(self, session_id: str):
+        """会话有尚未落库的写入时立即刷写，供直接读表的接口保证读己之写"""
+        if self.has_pending(session_id):
+            await self.flush()
+
+    async def flush(self):
+        """将当前积压的行以一次事务写入数据库"""
+        async with self._flush_lock:
+            if not self._pending and not self._updates:
+                return
+
+            batch, self._pending = self._pending, []
+            updates, self._updates = self._updates, {}
+            grouped: Dict[type, List[dict]] = defaultdict(list)
+            for model, row in batch:
+                grouped[model].append(row)
+
+            try:
+                async with async_session() as db:
+                    for model, rows in grouped.items():
+                        await db.execute(insert(model), rows)
+                    for (model, names), params in _group_updates(updates).items():
+                        await db.execute(_update_by_key(model, names), params)
+                    await db.commit()
+            except Exception:
+                self.stats["errors"] += 1
+                self._failures += 1
+                if self._failures < self.max_retries:
+                    # 放回队列等待下次重试，较新的更新优先
+                    logger.exception("记忆批量写入失败（第 %d 次），稍后重试", self._failures)
+                    self._requeue(batch, updates)
+                    return
+                logger.exception("记忆批量写入连续失败 %d 次，改为逐行写入", self._failures)
+                await self._write_isolated(batch, updates)
+                self._failures = 0
+                return
+
+            self._failures = 0
+            self.stats["rows"] += len(batch) + len(updates)
+            self.stats["commits"] += 1
+            self._forget(batch)
+
+    def _requeue(self, batch: List[Tuple[type, dict]], updates: Dict[Tuple[type, str], dict]):
+        self._pending = batch + self._pending
+        for key, values in updates.items():
+            self._updates[key] = {**values, **self._updates.get(key, {})}
+
+    async def _write_isolated(self, batch: List[Tuple[type, dict]], updates: Dict[Tuple[type, str], dict]):
+        """逐行单独提交，单独写入仍失败的行丢弃"""
+        for model, row in batch:
+            try:
+                async with async_session() as db:
+                    await db.execute(insert(model), [row])
+                    await db.commit()
+                self.stats["rows"] += 1
+            except Exception:
+                self._count_dropped("write_error", 1)
+                logger.exception("记忆写入失败，丢弃该行 session=%s id=%s", row.get("session_id"), row.get("id"))
+        self._forget(batch)
+
+        for key, values in updates.items():
+            try:
+                async with async_session() as db:
+                    for (model, names), params in _group_updates({key: values}).items():
+                        await db.execute(_update_by_key(model, names), params)
+                    await db.commit()
+                self.stats["rows"] += 1
+            except Exception:
+                self._count_dropped("write_error", 1)
+                logger.exception("记忆更新失败，丢弃该更新 table=%s key=%s", key[0].__tablename__, key[1])
+
+    def _forget(self, batch: List[Tuple[type, dict]]):
+        """已落库或已丢弃的行从读合并索引中移除"""
+        for model, row in batch:
+            key = (model, row["session_id"])
+            rows = self._by_session.get(key)
+            if rows:
+                try:
+                    rows.remove(row)
+                except ValueError:
+                    pass
+                if not rows:
+                    del self._by_session[key]
+
+    def _count_dropped(self, reason: str, count: int):
+        self.stats["dropped"] += count
+        self._dropped.labels(reason).inc(count)
+
+    def _delay(self) -> float:
+        """下次刷写前的等待时间，写入失败后按指数退避"""
+        if not self._failures:
+            return self.flush_interval
+        return min(self.flush_interval * 2 ** self._failures, self.max_backoff)
+
+    async def _run(self):
+        """后台刷写循环：达到批量或间隔到期时刷写"""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._delay())
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+def _primary_key(model: type):
+    return model.__table__.primary_key.columns[0]
+
+
+def _update_by_key(model: type, names: Tuple[str, ...]):
+    """按主键更新的语句，主键以 _k、取值以 _v_ 前缀的参数传入"""
+    key = _primary_key(model)
+    return (
+        update(model.__table__)
+        .where(key == bindparam("_k"))
+        .values({name: bindparam(f"_v_{name}") for name in names if name != key.key})
+    )
+
+
+def _group_updates(updates: Dict[Tuple[type, str], dict]) -> Dict[Tuple[type, tuple], List[dict]]:
+    """按 (模型, 更新列) 分组，每组以一次 executemany 执行"""
+    grouped: Dict[Tuple[type, tuple], List[dict]] = defaultdict(list)
+    for (model, _), values in updates.items():
+        key = _primary_key(model).key
+        grouped[(model, tuple(sorted(values)))].append({
+            "_k" if name == key else f"_v_{name}": value
+            for name, value in values.items()
+        })
+    return grouped
+
+
+# 全局实例
+write_buffer = WriteBehindBuffer(
+    flush_interval=settings.memory_flush_interval_ms / 1000,
+    batch_size=settings.memory_flush_batch_size,
+    max_pending=settings.memory_max_pending,
+    max_retries=settings.memory_flush_max_retries,
+)
+
+
+class _CacheEntry:
+    """单个会话的最近记忆窗口（旧的在前）"""
+
+    __slots__ = ("rows", "complete", "size")
+
+    def __init__(self, rows: List[dict], complete: bool):
+        self.rows: Deque[dict] = deque(rows)
+        # complete 表示窗口包含了该会话的全部记忆
+        self.complete = complete
+        self.size = sum(_row_size(r) for r in rows)
+
+
+def _row_size(row: dict) -> int:
+    """估算行占用的字节数"""
+    return sys.getsizeof(row["content"]) + 256
+
+
+class SessionContextCache:
+    """
+    会话上下文缓存
+    进程内按会话缓存最近的记忆窗口，读穿透加载，写入时原地追加而非失效；
+    按会话数和字节数做 LRU 淘汰。
+    缓存只感知本进程的写入：多个工作进程服务同一会话时，其他进程写入的消息不会出现在
+    已缓存的窗口中，直到该会话被淘汰后重新加载。多进程部署应按会话粘性路由，或关闭缓存
+    """
+
+    def __init__(self, window: int = 50, max_sessions: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.window = window
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._hit_counter = metrics.counter("context_cache_hits_total", "会话上下文缓存命中次数")
+        self._miss_counter = metrics.counter("context_cache_misses_total", "会话上下文缓存未命中次数")
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def load(self, session_id: str, rows_desc: List[dict]):
+        """加载会话窗口（按时间倒序传入）"""
+        self.remove(session_id)
+        entry = _CacheEntry(list(reversed(rows_desc)), complete=len(rows_desc) < self.window)
+        self._entries[session_id] = entry
+        self._bytes += entry.size
+        self._evict()
+
+    def append(self, row: dict):
+        """写入时原地追加到已缓存的会话窗口"""
+        entry = self._entries.get(row["session_id"])
+        if entry is None:
+            return
+
+        entry.rows.append(row)
+        size = _row_size(row)
+        entry.size += size
+        self._bytes += size
+
+        if len(entry.rows) > self.window:
+            dropped = entry.rows.popleft()
+            dropped_size = _row_size(dropped)
+            entry.size -= dropped_size
+            self._bytes -= dropped_size
+            entry.complete = False
+
+        self._evict()
+
+    def replace(self, row: dict):
+        """按 id 覆盖窗口中的行（如每会话一行的滚动摘要），不存在时追加"""
+        entry = self._entries.get(row["session_id"])
+        if entry is None:
+            return
+
+        for old in [r for r in entry.rows if r["id"] == row["id"]]:
+            entry.rows.remove(old)
+            size = _row_size(old)
+            entry.size -= size
+            self._bytes -= size
+        self.append(row)
+
+    def remove(self, session_id: str):
+        """移除会话窗口"""
+        entry = self._entries.pop(session_id, None)
+        if entry:
+            self._bytes -= entry.size
+
+    def recent(
+        self,
+        session_id: str,
+        predicate: Callable[[dict], bool],
+        limit: int
+    ) -> Optional[List[dict]]:
+        """
+        从窗口中按时间倒序取最近 limit 条匹配的记忆
+
+        Returns:
+            命中时返回行列表；窗口不足以回答时返回 None
+        """
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            rows = []
+            for row in reversed(entry.rows):
+                if predicate(row):
+                    rows.append(row)
+                    if len(rows) >= limit:
+                        break
+
+            if len(rows) >= limit or entry.complete:
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                self._hit_counter.inc()
+                return rows
+
+        self.misses += 1
+        self._miss_counter.inc()
+        return None
+
+    def _evict(self):
+        """按 LRU 淘汰超出会话数或字节上限的窗口"""
+        while self._entries and (
+            len(self._entries) > self.max_sessions or self._bytes > self.max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+
+    def session_ids(self, limit: int = None) -> List[str]:
+        """已缓存的会话，最近使用的在前"""
+        ids = list(reversed(self._entries))
+        return ids[:limit] if limit is not None else ids
+
+    def stats(self) -> dict:
+        """缓存统计"""
+        total = self.hits + self.misses
+        return {
+            "sessions": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# 全局实例
+context_cache = SessionContextCache(
+    window=settings.context_cache_window,
+    max_sessions=settings.context_cache_max_sessions,
+    max_bytes=settings.context_cache_max_bytes,
+)
+
+
+def _memory_row(m) -> dict:
+    """将 ORM 对象统一转换为行字典"""
+    if isinstance(m, dict):
+        return m
+    return {
+        "id": m.id,
+        "session_id": m.session_id,
+        "agent_name": m.agent_name,
+        "memory_type": m.memory_type,
+        "content": m.content,
+        "created_at": m.created_at,
+    }
+
+
+def _merge_recent(db_rows: list, pending: List[dict], limit: Optional[int]) -> List[dict]:
+    """合并已落库与未落库的行，按时间倒序取最近 limit 条"""
+    rows = [_memory_row(m) for m in db_rows]
+    if pending:
+        seen = {r["id"] for r in rows}
+        rows.extend(r for r in pending if r["id"] not in seen)
+        rows.sort(key=lambda r: r["created_at"], reverse=True)
+    return rows[:limit] if limit is not None else rows
+
+
+@dataclass
+class TurnCommit:
+    """
+    一轮对话的待提交写入
+    包括记忆条目、对话消息、会话更新时间以及有变化的状态快照，由 MemoryManager.commit_turn 在同一事务中提交
+    """
+    session_id: str
+    memories: List[dict] = field(default_factory=list)
+    messages: List[dict] = field(default_factory=list)
+    state: Optional[StateSnapshot] = None
+
+    def add_memory(self, agent_name: str, memory_type: str, content: str) -> dict:
+        """追加一条记忆"""
+        row = {
+            "id": str(uuid.uuid4()),
+            "session_id": self.session_id,
+            "agent_name": agent_name,
+            "memory_type": memory_type,
+            "content": content,
+            "created_at": datetime.now(),
+        }
+        self.memories.append(row)
+        return row
+
+    def add_message(self, role: str, content: str, extra_data: dict = None) -> dict:
+        """追加一条对话消息"""
+        row = {
+            "id": str(uuid.uuid4()),
+            "session_id": self.session_id,
+            "role": role,
+            "content": content,
+            "created_at": datetime.now(),
+            "extra_data": extra_data or {},
+        }
+        self.messages.append(row)
+        return row
+
+    def add_user_message(self, content: str, agent_name: str = "user"):
+        """用户消息：同时写入记忆与消息表"""
+        self.add_memory(agent_name, "user_message", content)
+        self.add_message("user", content)
+
+    def add_assistant_message(self, content: str, agent_name: str = "main", extra_data: dict = None):
+        """助手消息：同时写入记忆与消息表"""
+        self.add_memory(agent_name, "assistant_message", content)
+        self.add_message("assistant", content, extra_data)
 
 
 class MemoryManager:
@@ -29,8 +532,51 @@ class MemoryManager:
         """添加智能体专用记忆"""
         await self._add_memory(agent_name, memory_type, content)
 
+    @timed("memory_write")
+    async def put_agent_memory(self, memory_id: str, agent_name: str, memory_type: str, content: str) -> dict:
+        """按固定 id 写入智能体记忆，已存在时覆盖，用于每个会话只保留一行的记忆"""
+        row = {
+            "id": memory_id,
+            "session_id": self.session_id,
+            "agent_name": agent_name,
+            "memory_type": memory_type,
+            "content": content,
+            "created_at": datetime.now(),
+        }
+        values = {"content": content, "created_at": row["created_at"]}
+
+        async with async_session() as db:
+            result = await db.execute(
+                update(SessionMemory).where(SessionMemory.id == memory_id).values(**values)
+            )
+            if result.rowcount == 0:
+                try:
+                    await db.execute(insert(SessionMemory), [row])
+                except IntegrityError:
+                    # 并发写入同一行：对方已插入，改为覆盖
+                    await db.rollback()
+                    await db.execute(
+                        update(SessionMemory).where(SessionMemory.id == memory_id).values(**values)
+                    )
+            await db.commit()
+
+        context_cache.replace(row)
+        return row
+
+    @timed("memory_write")
     async def _add_memory(self, agent_name: str, memory_type: str, content: str):
         """添加记忆到数据库"""
+        if settings.memory_write_behind:
+            # 写后缓冲：不在响应路径上等待提交
+            row = await write_buffer.add(SessionMemory, {
+                "session_id": self.session_id,
+                "agent_name": agent_name,
+                "memory_type": memory_type,
+                "content": content,
+            })
+            context_cache.append(row)
+            return
+
         async with async_session() as db:
             memory = SessionMemory(
                 session_id=self.session_id,
@@ -41,8 +587,134 @@ class MemoryManager:
             db.add(memory)
             await db.commit()
 
-    async def get_context(self, agent_name: str = None, limit: int = 10) -> List[dict]:
-        """获取对话上下文"""
+        context_cache.append(_memory_row(memory))
+
+    def new_turn(self) -> TurnCommit:
+        """开始收集一轮对话的写入"""
+        return TurnCommit(self.session_id)
+
+    @timed("memory_write")
+    async def commit_turn(self, turn: TurnCommit) -> bool:
+        """
+        提交一轮对话：记忆、消息、会话更新时间与状态快照在同一事务中写入
+        没有状态快照且写后缓冲开启时，整轮作为一个单元加入缓冲，由下一次批量刷写提交；
+        有状态快照时需要同步得到 CAS 结果，整轮直接落库
+
+        Returns:
+            是否提交成功；状态快照版本冲突时整轮回滚并返回 False，调用方应合并最新快照后重试
+        """
+        touch = {"session_id": self.session_id, "updated_at": datetime.now()}
+
+        if turn.state is None and settings.memory_write_behind:
+            await write_buffer.add_many(
+                [(SessionMemory, r) for r in turn.memories] + [(Message, r) for r in turn.messages],
+                updates=[(Conversation, touch)]
+            )
+        else:
+            if settings.memory_write_behind:
+                # 先落库本会话更早的缓冲写入，保持各轮的提交顺序
+                await write_buffer.sync_session(self.session_id)
+            async with async_session() as db:
+                if turn.state is not None and not await state_store.save_in(db, turn.state):
+                    await db.rollback()
+                    return False
+                if turn.memories:
+                    await db.execute(insert(SessionMemory), turn.memories)
+                if turn.messages:
+                    await db.execute(insert(Message), turn.messages)
+                await db.execute(
+                    update(Conversation)
+                    .where(Conversation.session_id == self.session_id)
+                    .values(updated_at=touch["updated_at"])
+                )
+                await db.commit()
+            if turn.state is not None:
+                turn.state.version += 1
+
+        for row in turn.memories:
+            context_cache.append(row)
+        return True
+
+    async def _cached_recent(self, predicate: Callable[[dict], bool], limit: int) -> Optional[List[dict]]:
+        """
+        读穿透缓存：会话未缓存时先加载最近窗口，再尝试从窗口中回答
+
+        Returns:
+            命中时返回按时间倒序的行；需回源数据库时返回 None
+        """
+        if not settings.context_cache_enabled:
+            return None
+
+        await self.prime_cache()
+        return context_cache.recent(self.session_id, predicate, limit)
+
+    async def prime_cache(self):
+        """会话未缓存时加载最近窗口"""
+        if self.session_id in context_cache:
+            return
+
+        # 读库与读未落库行之间暂停刷写，否则期间刚落库的行两边都读不到，会永久缺失于缓存窗口
+        async with write_buffer.paused():
+            async with async_session() as db:
+                result = await db.execute(
+                    select(SessionMemory)
+                    .where(SessionMemory.session_id == self.session_id)
+                    .order_by(SessionMemory.created_at.desc())
+                    .limit(context_cache.window)
+                )
+                memories = result.scalars().all()
+            pending = self._pending()
+        context_cache.load(self.session_id, _merge_recent(memories, pending, context_cache.window))
+
+    def _pending(self) -> List[dict]:
+        """本会话尚未落库的记忆"""
+        return write_buffer.pending(SessionMemory, self.session_id)
+
+    @staticmethod
+    def _format_context(rows: List[dict]) -> List[dict]:
+        """格式化为上下文（旧的在前）"""
+        return [
+            {
+                "role": r["memory_type"].replace("_message", ""),
+                "content": r["content"],
+                "agent": r["agent_name"],
+                "timestamp": r["created_at"].isoformat()
+            }
+            for r in reversed(rows)
+        ]
+
+    @timed("memory_read")
+    async def get_context(
+        self,
+        agent_name: str = None,
+        limit: int = 10,
+        max_tokens: int = None
+    ) -> List[dict]:
+        """
+        获取对话上下文
+
+        Args:
+            agent_name: 只取该智能体的记忆
+            limit: 最多返回的条数
+            max_tokens: token 预算，从最新的记忆开始向前填充
+        """
+        context = await self._get_context(agent_name, limit)
+        if max_tokens is not None:
+            context = ContextAssembler().fit_history(context, max_tokens)
+        return context
+
+    async def _get_context(self, agent_name: str, limit: int) -> List[dict]:
+        """按条数获取对话上下文"""
+        def match(r: dict) -> bool:
+            if agent_name:
+                return r["agent_name"] == agent_name
+            # 滚动摘要不属于对话上下文
+            return r["memory_type"] != "summary"
+
+        rows = await self._cached_recent(match, limit)
+        if rows is not None:
+            return self._format_context(rows)
+
         async with async_session() as db:
             query = select(SessionMemory).where(
                 SessionMemory.session_id == self.session_id
@@ -50,25 +722,26 @@ class MemoryManager:
 
             if agent_name:
                 query = query.where(SessionMemory.agent_name == agent_name)
+            else:
+                query = query.where(SessionMemory.memory_type != "summary")
 
             query = query.order_by(SessionMemory.created_at.desc()).limit(limit)
 
             result = await db.execute(query)
             memories = result.scalars().all()
 
-            # 返回倒序（旧的在前）
-            return [
-                {
-                    "role": m.memory_type.replace("_message", ""),
-                    "content": m.content,
-                    "agent": m.agent_name,
-                    "timestamp": m.created_at.isoformat()
-                }
-                for m in reversed(memories)
-            ]
+        pending = [r for r in self._pending() if match(r)]
+
+        # 返回倒序（旧的在前）
+        return self._format_context(_merge_recent(memories, pending, limit))
 
+    @timed("memory_read")
     async def get_shared_context(self, agent_names: List[str], limit: int = 10) -> List[dict]:
         """获取跨智能体共享的上下文"""
+        rows = await self._cached_recent(lambda r: r["agent_name"] in agent_names, limit)
+        if rows is not None:
+            return self._format_context(rows)
+
         async with async_session() as db:
             result = await db.execute(
                 select(SessionMemory)
@@ -79,16 +752,11 @@ class MemoryManager:
             )
             memories = result.scalars().all()
 
-            return [
-                {
-                    "role": m.memory_type.replace("_message", ""),
-                    "content": m.content,
-                    "agent": m.agent_name,
-                    "timestamp": m.created_at.isoformat()
-                }
-                for m in reversed(memories)
-            ]
+        pending = [r for r in self._pending() if r["agent_name"] in agent_names]
+
+        return self._format_context(_merge_recent(memories, pending, limit))
 
+    @timed("memory_read")
     async def get_agent_memory(self, agent_name: str, memory_type: str = None) -> List[dict]:
         """获取特定智能体的记忆"""
         async with async_session() as db:
@@ -103,10 +771,26 @@ class MemoryManager:
             result = await db.execute(query.order_by(SessionMemory.created_at))
             memories = result.scalars().all()
 
-            return [{"type": m.memory_type, "content": m.content} for m in memories]
+        pending = [
+            r for r in self._pending()
+            if r["agent_name"] == agent_name and (not memory_type or r["memory_type"] == memory_type)
+        ]
+        rows = [_memory_row(m) for m in memories]
+        if pending:
+            seen = {r["id"] for r in rows}
+            rows.extend(r for r in pending if r["id"] not in seen)
+            rows.sort(key=lambda r: r["created_at"])
 
+        return [{"type": r["memory_type"], "content": r["content"]} for r in rows]
+
+    @timed("memory_write")
     async def clear(self):
         """清除会话记忆"""
+        # 先落库积压数据，避免删除后被写回
+        context_cache.remove(self.session_id)
+        write_buffer.discard(SessionMemory, self.session_id)
+        await write_buffer.flush()
+
         async with async_session() as db:
             await db.execute(
                 delete(SessionMemory).where(
@@ -115,21 +799,39 @@ class MemoryManager:
             )
             await db.commit()
 
+    @timed("memory_read")
     async def get_latest_intent(self) -> Optional[dict]:
         """获取最近的意图识别结果"""
-        async with async_session() as db:
-            result = await db.execute(
-                select(SessionMemory)
-                .where(
+        latest = await self.get_latest_memory("intent_result")
+
+        if latest:
+            return {"intent": latest["content"], "timestamp": latest["timestamp"]}
+
+        return None
+
+    @timed("memory_read")
+    async def get_latest_memory(self, memory_type: str, agent_name: str = None) -> Optional[dict]:
+        """获取最近一条指定类型的记忆"""
+        def match(r: dict) -> bool:
+            return r["memory_type"] == memory_type and (not agent_name or r["agent_name"] == agent_name)
+
+        rows = await self._cached_recent(match, 1)
+        if rows is None:
+            async with async_session() as db:
+                query = select(SessionMemory).where(
                     SessionMemory.session_id == self.session_id,
-                    SessionMemory.memory_type == "intent_result"
+                    SessionMemory.memory_type == memory_type
                 )
-                .order_by(SessionMemory.created_at.desc())
-                .limit(1)
-            )
-            memory = result.scalar_one_or_none()
+                if agent_name:
+                    query = query.where(SessionMemory.agent_name == agent_name)
 
-            if memory:
-                return {"intent": memory.content, "timestamp": memory.created_at.isoformat()}
+                result = await db.execute(query.order_by(SessionMemory.created_at.desc()).limit(1))
+                memory = result.scalar_one_or_none()
 
-            return None
+            pending = [r for r in self._pending() if match(r)]
+            rows = _merge_recent([memory] if memory else [], pending, 1)
+
+        if rows:
+            return {"content": rows[0]["content"], "timestamp": rows[0]["created_at"].isoformat()}
+
+        return None
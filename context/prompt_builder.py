@@ -5,6 +5,11 @@
 from typing import Optional
 from enum import Enum
 
+from app.config import settings
+from context.assembler import ContextAssembler, ContextSection, format_message, summary_text
+from context.prompt_compiler import CompiledPrompt, dynamic, prompt_compiler, static
+from context.state_store import StateSnapshot
+
 
 class ConversationStage(Enum):
     """对话阶段枚举"""
@@ -57,9 +62,25 @@ class PromptBuilder:
 请给用户一个友好的结束语，并告知后续操作。""",
     }
 
-    def __init__(self):
+    # 主智能体通用指令（静态前缀）
+    MAIN_INSTRUCTION = "你是阿里商旅差旅助手。请根据当前阶段处理用户输入，并输出你的响应。"
+
+    # 意图识别指令（静态前缀）
+    INTENT_INSTRUCTION = """请分析用户输入的意图。
+
+意图类型：
+- trip_planner: 行程规划
+- apply: 订单申请
+- rag_agent: 差旅政策/知识查询
+- info_query: 信息查询
+- collect: 事项收集
+
+请进行推理并输出结构化的意图识别结果。"""
+
+    def __init__(self, assembler: ContextAssembler = None):
         self.current_stage = ConversationStage.GREETING
         self.collected_info = {}
+        self.assembler = assembler or ContextAssembler()
 
     def set_stage(self, stage: ConversationStage):
         """设置当前阶段"""
@@ -77,19 +98,64 @@ class PromptBuilder:
         """获取已收集的信息"""
         return self.collected_info.copy()
 
-    def build_main_prompt(self, user_input: str, context: list = None) -> str:
+    def restore(self, snapshot: StateSnapshot):
+        """从快照恢复状态机，无需回放对话历史"""
+        try:
+            self.current_stage = ConversationStage(snapshot.stage)
+        except ValueError:
+            self.current_stage = ConversationStage.GREETING
+        self.collected_info = dict(snapshot.slots)
+
+    def apply_to(self, snapshot: StateSnapshot) -> bool:
+        """
+        将当前状态写入快照
+
+        Returns:
+            快照是否发生变化
         """
-        构建主智能体 Prompt
-        根据当前阶段动态选择不同的 Prompt 模板
+        changed = (
+            snapshot.stage != self.current_stage.value
+            or snapshot.slots != self.collected_info
+        )
+        snapshot.stage = self.current_stage.value
+        snapshot.slots = dict(self.collected_info)
+        return changed
+
+    def build_main_prompt(
+        self,
+        user_input: str,
+        context: list = None,
+        summary: dict = None,
+        memories: list = None
+    ) -> str:
+        """构建主智能体 Prompt 文本"""
+        return self.compile_main_prompt(user_input, context, summary, memories).text
+
+    def compile_main_prompt(
+        self,
+        user_input: str,
+        context: list = None,
+        summary: dict = None,
+        memories: list = None
+    ) -> CompiledPrompt:
+        """
+        编译主智能体 Prompt
+        根据当前阶段动态选择不同的 Prompt 模板，在 token 预算内按优先级装配上下文
+
+        Args:
+            user_input: 用户输入
+            context: 对话上下文（旧的在前）
+            summary: 滚动会话摘要，覆盖未逐字保留的早期对话
+            memories: 召回的用户长期记忆
         """
         stage_prompt = self.get_stage_prompt()
 
-        context_str = ""
-        if context:
-            context_str = "\n".join([
-                f"用户: {m.get('content', '')}"
-                for m in context[-5:]
-            ])
+        # 近期对话从最新一轮向前填充，不再按固定条数截取
+        history = self.assembler.fit_history(context or [], settings.context_history_tokens)
+        context_str = "\n".join(format_message(m) for m in history)
+
+        oldest = history[0].get("timestamp") if history else None
+        earlier = summary_text(summary, before=oldest) if summary else ""
 
         collected = ""
         if self.collected_info:
@@ -97,18 +163,30 @@ class PromptBuilder:
             for k, v in self.collected_info.items():
                 collected += f"- {k}: {v}\n"
 
-        prompt = f"""{stage_prompt}
-
-{collected}
-
-对话历史：
-{context_str}
-
-用户最新输入：{user_input}
-
-请根据当前阶段处理用户输入，并输出你的响应。"""
-
-        return prompt
+        sections = self.assembler.assemble([
+            ContextSection("stage", stage_prompt, required=True),
+            ContextSection("input", user_input, required=True),
+            ContextSection("collected", collected, priority=1),
+            ContextSection("history", context_str, priority=2),
+            ContextSection("summary", earlier, priority=3),
+            ContextSection("memories", "\n".join(f"- {m['text']}" for m in memories or []), priority=4),
+        ])
+
+        # 静态指令在前构成稳定前缀，会话数据按变化频率追加在尾部
+        segments = [
+            static(self.MAIN_INSTRUCTION),
+            static(stage_prompt),
+        ]
+        if sections.get("memories"):
+            segments.append(dynamic(f"用户长期偏好：\n{sections['memories']}"))
+        if sections.get("summary"):
+            segments.append(dynamic(f"早期对话摘要：\n{sections['summary']}"))
+        segments.append(dynamic(f"对话历史：\n{sections.get('history', '')}"))
+        if sections.get("collected"):
+            segments.append(dynamic(sections["collected"].strip()))
+        segments.append(dynamic(f"用户最新输入：{user_input}"))
+
+        return prompt_compiler.compile("prompt_builder.main", segments)
 
     def build_intent_prompt(self, user_input: str, rule_match: dict = None) -> str:
         """
@@ -120,25 +198,16 @@ class PromptBuilder:
         """
         if rule_match:
             # 快车道：简单意图
-            return f"""用户输入：{user_input}
-
-规则匹配结果：{rule_match}
-
-请直接路由到对应的子智能体。"""
+            return prompt_compiler.compile("prompt_builder.intent_fast", [
+                static("请直接路由到对应的子智能体。"),
+                dynamic(f"用户输入：{user_input}\n\n规则匹配结果：{rule_match}"),
+            ]).text
         else:
             # 慢车道：复杂意图
-            return f"""请分析以下用户输入的意图：
-
-用户输入：{user_input}
-
-意图类型：
-- trip_planner: 行程规划
-- apply: 订单申请
-- rag_agent: 差旅政策/知识查询
-- info_query: 信息查询
-- collect: 事项收集
-
-请进行推理并输出结构化的意图识别结果。"""
+            return prompt_compiler.compile("prompt_builder.intent_slow", [
+                static(self.INTENT_INSTRUCTION),
+                dynamic(f"用户输入：{user_input}"),
+            ]).text
 
     def get_next_stage(self, intent: str) -> ConversationStage:
         """
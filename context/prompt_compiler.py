@@ -0,0 +1,146 @@
+"""
+Prompt 编译
+将静态片段固定在稳定前缀、动态片段放在只追加的尾部，以便命中服务端前缀缓存；
+对前缀计算指纹，并按调用点统计可缓存前缀占比与前缀复用（命中前缀缓存的近似），
+统计同时以 prompt_* 指标导出
+"""
+import hashlib
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List
+
+from context.assembler import token_counter
+from observability.metrics import metrics
+
+_compiles = metrics.counter("prompt_compiles_total", "Prompt 编译次数", ("call_site",))
+_prefix_reuses = metrics.counter(
+    "prompt_prefix_reuses_total", "前缀指纹此前已出现过的编译次数（可命中前缀缓存）", ("call_site",)
+)
+_prefix_tokens = metrics.counter("prompt_prefix_tokens_total", "稳定前缀 token 数", ("call_site",))
+_prompt_tokens = metrics.counter("prompt_tokens_total", "Prompt 总 token 数", ("call_site",))
+_distinct_prefixes = metrics.gauge("prompt_distinct_prefixes", "调用点出现过的不同前缀数", ("call_site",))
+
+
+@dataclass
+class PromptSegment:
+    """Prompt 片段"""
+    text: str
+    static: bool = True
+
+
+def static(text: str) -> PromptSegment:
+    """静态片段：跨请求不变的指令"""
+    return PromptSegment(text, static=True)
+
+
+def dynamic(text: str) -> PromptSegment:
+    """动态片段：随会话变化的数据"""
+    return PromptSegment(text, static=False)
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(prefix: str) -> str:
+    """计算前缀指纹"""
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class CompiledPrompt:
+    """编译后的 Prompt"""
+    call_site: str
+    prefix: str
+    tail: str
+    fingerprint: str
+    prefix_tokens: int
+    tail_tokens: int
+
+    @property
+    def text(self) -> str:
+        """完整 Prompt 文本"""
+        if self.prefix and self.tail:
+            return f"{self.prefix}\n\n{self.tail}"
+        return self.prefix or self.tail
+
+    @property
+    def cacheable_ratio(self) -> float:
+        """可缓存前缀占比"""
+        total = self.prefix_tokens + self.tail_tokens
+        return self.prefix_tokens / total if total else 0.0
+
+    def as_messages(self) -> List[dict]:
+        """转换为对话消息：稳定前缀作为 system，动态尾部作为 user"""
+        messages = [{"role": "system", "content": self.prefix}]
+        if self.tail:
+            messages.append({"role": "user", "content": self.tail})
+        return messages
+
+
+@dataclass
+class CallSiteStats:
+    """调用点统计"""
+    calls: int = 0
+    reuses: int = 0
+    prefix_tokens: int = 0
+    total_tokens: int = 0
+    fingerprints: set = field(default_factory=set)
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "cacheable_ratio": self.prefix_tokens / self.total_tokens if self.total_tokens else 0.0,
+            "prefix_reuse_ratio": self.reuses / self.calls if self.calls else 0.0,
+            "distinct_prefixes": len(self.fingerprints),
+        }
+
+
+class PromptCompiler:
+    """
+    Prompt 编译器
+    静态片段按原顺序拼成前缀，动态片段按原顺序拼成尾部；
+    同一调用点的前缀应只随有限的静态状态变化
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, CallSiteStats] = {}
+
+    def compile(self, call_site: str, segments: List[PromptSegment]) -> CompiledPrompt:
+        """编译 Prompt"""
+        prefix = "\n\n".join(s.text for s in segments if s.static and s.text)
+        tail = "\n\n".join(s.text for s in segments if not s.static and s.text)
+
+        compiled = CompiledPrompt(
+            call_site=call_site,
+            prefix=prefix,
+            tail=tail,
+            fingerprint=fingerprint(prefix),
+            prefix_tokens=token_counter.count(prefix),
+            tail_tokens=token_counter.count(tail),
+        )
+
+        stats = self._stats.get(call_site)
+        if stats is None:
+            stats = self._stats[call_site] = CallSiteStats()
+        total_tokens = compiled.prefix_tokens + compiled.tail_tokens
+        reused = compiled.fingerprint in stats.fingerprints
+        stats.calls += 1
+        stats.prefix_tokens += compiled.prefix_tokens
+        stats.total_tokens += total_tokens
+        _compiles.labels(call_site).inc()
+        _prefix_tokens.labels(call_site).inc(compiled.prefix_tokens)
+        _prompt_tokens.labels(call_site).inc(total_tokens)
+        if reused:
+            stats.reuses += 1
+            _prefix_reuses.labels(call_site).inc()
+        else:
+            stats.fingerprints.add(compiled.fingerprint)
+            _distinct_prefixes.labels(call_site).set(len(stats.fingerprints))
+
+        return compiled
+
+    def stats(self) -> Dict[str, dict]:
+        """各调用点的可缓存前缀占比、前缀复用率与不同前缀数"""
+        return {site: s.to_dict() for site, s in self._stats.items()}
+
+
+# 全局实例
+prompt_compiler = PromptCompiler()
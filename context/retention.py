@@ -0,0 +1,303 @@
+"""
+上下文工程 - 会话保留策略
+按 session_expire_hours 清理过期会话：先归档为压缩 NDJSON，再分批删除，
+每批只持有很短的写事务。默认关闭，需设置 RETENTION_ENABLED=true 开启
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import AsyncGenerator, Dict, List, Optional
+from sqlalchemy import delete, func, select, union
+
+from app.config import settings
+from app.database import async_session, Conversation, ConversationState, Message, SessionMemory
+from app.serialization import ndjson_line
+from context.memory import context_cache, write_buffer
+from observability.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionReport:
+    """单次清理报告"""
+    started_at: datetime = field(default_factory=datetime.now)
+    sessions: int = 0
+    resumed: int = 0
+    rows: Dict[str, int] = field(default_factory=dict)
+    batches: int = 0
+    lock_seconds_total: float = 0.0
+    lock_seconds_max: float = 0.0
+    archive_path: Optional[str] = None
+
+    def record_batch(self, table: str, rows: int, lock_seconds: float):
+        self.rows[table] = self.rows.get(table, 0) + rows
+        self.batches += 1
+        self.lock_seconds_total += lock_seconds
+        self.lock_seconds_max = max(self.lock_seconds_max, lock_seconds)
+
+    def to_dict(self) -> dict:
+        return {
+            "started_at": self.started_at.isoformat(),
+            "sessions": self.sessions,
+            "resumed": self.resumed,
+            "rows": self.rows,
+            "rows_total": sum(self.rows.values()),
+            "batches": self.batches,
+            "lock_ms_total": round(self.lock_seconds_total * 1000, 3),
+            "lock_ms_max": round(self.lock_seconds_max * 1000, 3),
+            "archive_path": self.archive_path,
+        }
+
+
+class ArchiveWriter:
+    """
+    压缩 NDJSON 归档写入器，优先 zstd，不可用时使用 gzip
+    压缩与文件写入是同步操作，清理任务通过 asyncio.to_thread 调用
+    """
+
+    def __init__(self, directory: str, compression: str = "zstd"):
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+
+        self._zstd_writer = None
+        if compression == "zstd":
+            try:
+                import zstandard
+                self.path = os.path.join(directory, f"retention-{stamp}.ndjson.zst")
+                self._raw = open(self.path, "wb")
+                self._zstd_writer = zstandard.ZstdCompressor().stream_writer(self._raw)
+                return
+            except ImportError:
+                pass
+
+        self.path = os.path.join(directory, f"retention-{stamp}.ndjson.gz")
+        self._raw = gzip.open(self.path, "wb")
+
+    def write(self, table: str, rows: List[dict]):
+        """追加一批行"""
+        data = b"".join(ndjson_line({"table": table, "row": row}) for row in rows)
+        (self._zstd_writer or self._raw).write(data)
+
+    def close(self):
+        if self._zstd_writer is not None:
+            self._zstd_writer.close()
+        else:
+            self._raw.close()
+
+
+def _row_dict(obj) -> dict:
+    """ORM 对象转换为字典"""
+    return {c.key: getattr(obj, c.key) for c in obj.__table__.columns}
+
+
+class RetentionSweeper:
+    """
+    过期会话清理器
+    1. 按索引分批找出最后活跃时间早于过期时间的会话，跳过写后缓冲中仍有待写入的会话
+    2. 按主键分块读取各表中早于过期时间的行并写入归档
+    3. 每块在独立的短事务中按主键删除，并记录持锁时长
+    4. 清理缓存；清理期间用户回来产生的新写入（已落库或仍在缓冲中）保留，该会话不计入清理数
+    """
+
+    # 按依赖顺序清理，会话表最后删除：(模型, 主键, 时间列)
+    TABLES = [
+        (SessionMemory, SessionMemory.id, SessionMemory.created_at),
+        (Message, Message.id, Message.created_at),
+        (ConversationState, ConversationState.session_id, ConversationState.updated_at),
+        (Conversation, Conversation.session_id, Conversation.updated_at),
+    ]
+
+    def __init__(self):
+        self.expire_hours = settings.session_expire_hours
+        self.session_batch = settings.retention_session_batch
+        self.row_batch = settings.retention_row_batch
+        self.last_report: Optional[RetentionReport] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+    @property
+    def stopping(self) -> bool:
+        return self._stop_event is not None and self._stop_event.is_set()
+
+    async def _expired_sessions(self, cutoff: datetime, after: str) -> List[str]:
+        """找出一批过期会话（按 session_id 递增翻页）"""
+        async with async_session() as db:
+            result = await db.execute(
+                select(Conversation.session_id)
+                .where(Conversation.updated_at < cutoff, Conversation.session_id > after)
+                .order_by(Conversation.session_id)
+                .limit(self.session_batch)
+            )
+            return list(result.scalars().all())
+
+    async def _expired_orphans(self, cutoff: datetime) -> List[str]:
+        """
+        未创建会话记录、直接对话产生的过期会话，以最后一条记忆时间作为活跃时间
+        需要对记忆表做一次分组扫描，每轮清理只执行一次
+        """
+        async with async_session() as db:
+            result = await db.execute(
+                select(SessionMemory.session_id)
+                .where(SessionMemory.session_id.not_in(select(Conversation.session_id)))
+                .group_by(SessionMemory.session_id)
+                .having(func.max(SessionMemory.created_at) < cutoff)
+                .order_by(SessionMemory.session_id)
+            )
+            return list(result.scalars().all())
+
+    async def _expired_batches(self, cutoff: datetime) -> AsyncGenerator[List[str], None]:
+        """逐批产出过期会话：先按索引翻页会话表，再分批产出孤儿会话"""
+        after = ""
+        while True:
+            batch = await self._expired_sessions(cutoff, after)
+            if not batch:
+                break
+            after = batch[-1]
+            yield batch
+
+        orphans = await self._expired_orphans(cutoff)
+        for i in range(0, len(orphans), self.session_batch):
+            yield orphans[i:i + self.session_batch]
+
+    @staticmethod
+    def _active(session_ids: List[str]) -> List[str]:
+        """去掉写后缓冲中仍有待写入的会话：这些会话刚有活动，只是尚未落库"""
+        return [s for s in session_ids if not write_buffer.has_pending(s)]
+
+    @staticmethod
+    async def _resumed(session_ids: List[str], cutoff: datetime) -> set:
+        """
+        清理期间重新活跃的会话：仍有未落库的写入，或已落库了晚于过期时间的行
+        调用方需暂停写后缓冲的刷写，保证两处检查之间没有行从缓冲进入数据库
+        """
+        resumed = {s for s in session_ids if write_buffer.has_pending(s)}
+        async with async_session() as db:
+            result = await db.execute(union(
+                select(SessionMemory.session_id)
+                .where(SessionMemory.session_id.in_(session_ids), SessionMemory.created_at >= cutoff),
+                select(Message.session_id)
+                .where(Message.session_id.in_(session_ids), Message.created_at >= cutoff),
+            ))
+            resumed.update(result.scalars().all())
+        return resumed
+
+    async def _purge_table(
+        self,
+        model,
+        key,
+        stamp,
+        session_ids: List[str],
+        cutoff: datetime,
+        archive: ArchiveWriter,
+        report: RetentionReport
+    ):
+        """分块归档并删除某表中这些会话早于过期时间的行，清理期间新写入的行不受影响"""
+        while True:
+            async with async_session() as db:
+                result = await db.execute(
+                    select(model)
+                    .where(model.session_id.in_(session_ids), stamp < cutoff)
+                    .limit(self.row_batch)
+                )
+                rows = [_row_dict(r) for r in result.scalars().all()]
+
+            if not rows:
+                return
+
+            await asyncio.to_thread(archive.write, model.__tablename__, rows)
+
+            keys = [r[key.key] for r in rows]
+            start = time.perf_counter()
+            async with async_session() as db:
+                # 读取与删除之间会话记录或状态可能被更新，删除时再次比较时间
+                await db.execute(delete(model).where(key.in_(keys), stamp < cutoff))
+                await db.commit()
+            report.record_batch(model.__tablename__, len(rows), time.perf_counter() - start)
+
+            if len(rows) < self.row_batch:
+                return
+
+    async def run_once(self) -> RetentionReport:
+        """执行一次清理"""
+        report = RetentionReport()
+        cutoff = datetime.now() - timedelta(hours=self.expire_hours)
+        archive = await asyncio.to_thread(
+            ArchiveWriter, settings.retention_archive_dir, settings.retention_archive_compression
+        )
+        report.archive_path = archive.path
+
+        batches = self._expired_batches(cutoff)
+        try:
+            async for batch in batches:
+                if self.stopping:
+                    break
+
+                session_ids = self._active(batch)
+                if not session_ids:
+                    continue
+                for model, key, stamp in self.TABLES:
+                    await self._purge_table(model, key, stamp, session_ids, cutoff, archive, report)
+
+                # 用户在清理期间回来时，其新写入已保留；暂停刷写后再检查，避免漏掉刚落库的行
+                async with write_buffer.paused():
+                    resumed = await self._resumed(session_ids, cutoff)
+                for session_id in session_ids:
+                    context_cache.remove(session_id)
+
+                report.sessions += len(session_ids) - len(resumed)
+                report.resumed += len(resumed)
+                # 批次之间让出事件循环
+                await asyncio.sleep(0)
+        finally:
+            await batches.aclose()
+            await asyncio.to_thread(archive.close)
+
+        if not report.batches:
+            await asyncio.to_thread(os.remove, archive.path)
+            report.archive_path = None
+
+        rows_total = sum(report.rows.values())
+        metrics.counter("retention_rows_reclaimed_total", "保留策略清理的行数").inc(rows_total)
+        metrics.counter("retention_lock_seconds_total", "保留策略删除事务累计耗时").inc(report.lock_seconds_total)
+
+        self.last_report = report
+        if report.batches:
+            logger.info("会话清理完成: %s", json.dumps(report.to_dict(), ensure_ascii=False))
+        return report
+
+    def start(self):
+        """启动后台定时清理"""
+        if self._task is None or self._task.done():
+            self._stop_event = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台清理：当前批次完成后退出，不中断进行中的事务"""
+        if self._task:
+            self._stop_event.set()
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while not self.stopping:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("会话清理失败")
+            try:
+                await asyncio.wait_for(
+                    self._stop_event.wait(),
+                    timeout=settings.retention_interval_minutes * 60
+                )
+            except asyncio.TimeoutError:
+                pass
+
+
+# 全局实例
+retention_sweeper = RetentionSweeper()
@@ -0,0 +1,108 @@
+"""
+上下文工程 - 会话状态快照
+持久化对话状态机的阶段与已收集槽位，恢复会话只需一次主键查询
+"""
+from dataclasses import dataclass, field
+from typing import Optional
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session, ConversationState
+from observability.timing import timed
+
+
+@dataclass
+class StateSnapshot:
+    """会话状态快照"""
+    session_id: str
+    stage: str = "greeting"
+    slots: dict = field(default_factory=dict)
+    version: int = 0  # 0 表示尚未持久化
+
+
+class StateStore:
+    """
+    状态快照存储
+    按 session_id 主键读取；写入时比较版本号（CAS），并发写入只有一个成功
+    """
+
+    @timed("state")
+    async def load(self, session_id: str) -> StateSnapshot:
+        """加载快照，不存在时返回初始快照"""
+        async with async_session() as db:
+            state = await db.get(ConversationState, session_id)
+
+        if state is None:
+            return StateSnapshot(session_id=session_id)
+
+        return StateSnapshot(
+            session_id=session_id,
+            stage=state.stage,
+            slots=dict(state.slots or {}),
+            version=state.version,
+        )
+
+    @timed("state")
+    async def save(self, snapshot: StateSnapshot) -> bool:
+        """
+        比较并交换写入快照
+
+        Returns:
+            是否写入成功；版本冲突时返回 False，调用方应重新加载后重试
+        """
+        async with async_session() as db:
+            if not await self.save_in(db, snapshot):
+                await db.rollback()
+                return False
+            await db.commit()
+
+        snapshot.version += 1
+        return True
+
+    @staticmethod
+    async def save_in(db: AsyncSession, snapshot: StateSnapshot) -> bool:
+        """
+        在调用方的事务中比较并交换写入快照，不提交，也不修改快照版本号
+
+        Returns:
+            是否写入成功；版本冲突时返回 False，调用方应回滚整个事务
+        """
+        if snapshot.version == 0:
+            try:
+                await db.execute(insert(ConversationState).values(
+                    session_id=snapshot.session_id,
+                    version=1,
+                    stage=snapshot.stage,
+                    slots=snapshot.slots,
+                ))
+            except IntegrityError:
+                return False
+            return True
+
+        result = await db.execute(
+            update(ConversationState)
+            .where(
+                ConversationState.session_id == snapshot.session_id,
+                ConversationState.version == snapshot.version
+            )
+            .values(
+                version=snapshot.version + 1,
+                stage=snapshot.stage,
+                slots=snapshot.slots,
+            )
+        )
+        return result.rowcount == 1
+
+    async def delete(self, session_id: str):
+        """删除快照"""
+        async with async_session() as db:
+            await db.execute(
+                delete(ConversationState).where(ConversationState.session_id == session_id)
+            )
+            await db.commit()
+
+
+# 全局实例
+state_store = StateStore()
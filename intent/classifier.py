@@ -2,8 +2,11 @@
 意图分类器
 实现快车道（规则引擎）和慢车道（LLM分析）的分层处理
 """
-from typing import Optional
-from intent.recognizer import IntentRecognizer
+import re
+from functools import lru_cache
+from typing import Optional, Pattern, Tuple
+from intent.recognizer import IntentRecognizer, get_recognizer
+from observability.timing import timed
 
 
 class IntentClassifier:
@@ -41,27 +44,50 @@ class IntentClassifier:
         "确认信息": "collect",
     }
 
-    def __init__(self):
-        self.recognizer = IntentRecognizer()
+    @property
+    def recognizer(self) -> IntentRecognizer:
+        """慢车道识别器，进程内共享"""
+        return get_recognizer()
 
+    @classmethod
+    @lru_cache(maxsize=1)
+    def matchers(cls) -> Tuple[dict, Pattern]:
+        """
+        编译快车道匹配表，只编译一次
+
+        Returns:
+            (精确匹配表, 任一模式的预筛正则)
+        """
+        exact = dict(cls.FAST_LANE_PATTERNS)
+        any_pattern = re.compile("|".join(
+            re.escape(p) for p in sorted(cls.FAST_LANE_PATTERNS, key=len, reverse=True)
+        ))
+        return exact, any_pattern
+
+    @timed("intent")
     def classify(self, query: str) -> Optional[dict]:
         """
         意图分类
         返回结果或 None（需要走慢车道）
         """
         query = query.strip()
+        exact, any_pattern = self.matchers()
 
         # 快速精确匹配
-        for pattern, intent in self.FAST_LANE_PATTERNS.items():
-            if pattern == query:
-                return {
-                    "intent": intent,
-                    "type": "simple",
-                    "confidence": 1.0,
-                    "pattern": pattern
-                }
+        intent = exact.get(query)
+        if intent:
+            return {
+                "intent": intent,
+                "type": "simple",
+                "confidence": 1.0,
+                "pattern": query
+            }
+
+        # 不包含任何模式时直接走慢车道
+        if not any_pattern.search(query):
+            return None
 
-        # 模糊匹配
+        # 模糊匹配（按模式表顺序取第一个命中）
         for pattern, intent in self.FAST_LANE_PATTERNS.items():
             if pattern in query:
                 return {
@@ -4,7 +4,10 @@
 """
 from typing import Optional
 from app.config import settings
-from agentscope.models import DashScopeChatWrapper
+from context.assembler import token_counter
+from context.prompt_compiler import dynamic, prompt_compiler, static
+from observability.metrics import llm_call
+from observability.timing import timed
 
 
 class IntentRecognizer:
@@ -14,12 +17,16 @@ class IntentRecognizer:
     """
 
     def __init__(self):
+        # agentscope 导入较慢，只在首次走慢车道时加载
+        from agentscope.models import DashScopeChatWrapper
+
         self.model = DashScopeChatWrapper(
             config_name='dashscope',
             model_name=settings.dashscope_model,
             api_key=settings.dashscope_api_key,
         )
 
+    @timed("intent_llm")
     async def recognize(self, query: str, context: list) -> dict:
         """
         识别复杂意图
@@ -33,28 +40,17 @@ class IntentRecognizer:
         """
         prompt = self._build_prompt(query, context)
 
-        response = self.model(prompt)
+        with llm_call("intent_recognizer") as call:
+            response = self.model(prompt)
+        call.tokens(token_counter.count(prompt), token_counter.count(response.content))
 
         # 解析 LLM 响应
         result = self._parse_response(response.content)
 
         return result
 
-    def _build_prompt(self, query: str, context: list) -> str:
-        """构建提示词"""
-        context_str = ""
-        if context:
-            context_str = "\n".join([
-                f"用户: {m.get('content', '')[:100]}"
-                for m in context[-3:]
-            ])
-
-        return f"""你是一个意图识别专家。请分析用户的查询，理解其真实意图。
-
-上一轮对话：
-{context_str}
-
-当前用户查询：{query}
+    # 意图识别指令（静态前缀）
+    INSTRUCTION = """你是一个意图识别专家。请分析用户的查询，理解其真实意图。
 
 请进行两步推理：
 1. 先思考用户的意图是什么
@@ -68,15 +64,29 @@ class IntentRecognizer:
 - collect: 事项收集
 
 输出格式（JSON）：
-{{
+{
     "intent": "意图类型",
     "confidence": 0.0-1.0,
     "reasoning": "推理过程",
-    "entities": {{"实体信息"}}
-}}
+    "entities": {"实体信息"}
+}
 
 请直接输出 JSON，不要其他内容。"""
 
+    def _build_prompt(self, query: str, context: list) -> str:
+        """构建提示词：静态指令在前，对话数据在后"""
+        context_str = ""
+        if context:
+            context_str = "\n".join([
+                f"用户: {m.get('content', '')[:100]}"
+                for m in context[-3:]
+            ])
+
+        return prompt_compiler.compile("intent_recognizer", [
+            static(self.INSTRUCTION),
+            dynamic(f"上一轮对话：\n{context_str}\n\n当前用户查询：{query}"),
+        ]).text
+
     def _parse_response(self, response: str) -> dict:
         """解析 LLM 响应"""
         try:
@@ -104,3 +114,15 @@ class IntentRecognizer:
                 "reasoning": f"解析失败: {str(e)}",
                 "entities": {}
             }
+
+
+# 共享实例，首次使用时创建
+_recognizer: Optional[IntentRecognizer] = None
+
+
+def get_recognizer() -> IntentRecognizer:
+    """获取共享的意图识别器"""
+    global _recognizer
+    if _recognizer is None:
+        _recognizer = IntentRecognizer()
+    return _recognizer
@@ -2,11 +2,13 @@
 知识库客户端
 集成 MaxKB
 """
+import time
 from typing import List, Optional
-import httpx
 from pydantic import BaseModel
 
 from app.config import settings
+from observability.metrics import metrics
+from observability.timing import timed
 
 
 class KnowledgeResult(BaseModel):
@@ -16,17 +18,25 @@ class KnowledgeResult(BaseModel):
     similarity: float
 
 
+_query_latency = metrics.histogram("knowledge_query_duration_seconds", "知识库查询耗时")
+_query_errors = metrics.counter("knowledge_query_errors_total", "知识库查询失败次数")
+
+
 class KnowledgeClient:
     """MaxKB 知识库客户端"""
 
     def __init__(self):
         self.base_url = settings.maxkb_base_url
         self.api_key = settings.maxkb_api_key
+
+        # httpx 导入较慢，创建客户端时再加载
+        import httpx
         self.client = httpx.AsyncClient(
             base_url=self.base_url,
             timeout=30.0
         )
 
+    @timed("knowledge")
     async def query(
         self,
         query: str,
@@ -37,6 +47,7 @@ class KnowledgeClient:
         if not self.api_key:
             return self._mock_query(query, top_k)
 
+        start = time.perf_counter()
         try:
             response = await self.client.post(
                 "/api/v1/knowledge/chat",
@@ -49,7 +60,7 @@ class KnowledgeClient:
             response.raise_for_status()
             data = response.json()
 
-            return [
+            results = [
                 KnowledgeResult(
                     content=item.get("content", ""),
                     source=item.get("source", ""),
@@ -57,9 +68,13 @@ class KnowledgeClient:
                 )
                 for item in data.get("results", [])
             ]
+            return results
         except Exception as e:
+            _query_errors.inc()
             print(f"知识库查询失败: {e}")
             return self._mock_query(query, top_k)
+        finally:
+            _query_latency.observe(time.perf_counter() - start)
 
     def sync_query(
         self,
@@ -0,0 +1,174 @@
+"""
+事件循环延迟
+- LoopLagMonitor：后台任务按固定间隔休眠，实际唤醒时间与预期之差即为事件循环被阻塞的时长
+- LoopBlockWatchdog：阻塞超过阈值时抓取事件循环线程的调用栈，并关联所属会话与路由
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from app.config import settings
+from observability.metrics import metrics
+from observability.tracer import langfuse_client
+
+logger = logging.getLogger(__name__)
+
+# 延迟分桶（秒），覆盖 0.5ms ~ 5s
+LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+class LoopLagMonitor:
+    """事件循环延迟采样器"""
+
+    def __init__(self, interval: float = None):
+        self.interval = interval if interval is not None else settings.metrics_loop_lag_interval_ms / 1000
+        self._gauge = metrics.gauge("event_loop_lag_seconds", "最近一次采样的事件循环延迟")
+        self._histogram = metrics.histogram(
+            "event_loop_lag_distribution_seconds", "事件循环延迟分布", buckets=LAG_BUCKETS
+        )
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+    def start(self):
+        """启动后台采样"""
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._stop_event = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台采样"""
+        if self._task:
+            self._stop_event.set()
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while not self._stop_event.is_set():
+            expected = time.perf_counter() + self.interval
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stop_event.is_set():
+                break
+            lag = max(time.perf_counter() - expected, 0.0)
+            self._gauge.set(lag)
+            self._histogram.observe(lag)
+
+
+class LoopBlockWatchdog:
+    """
+    事件循环阻塞检测
+    事件循环内的心跳回调每半个阈值刷新一次时间戳；独立线程以同样的间隔检查，
+    发现心跳超过阈值未刷新时抓取事件循环线程当前的调用栈与正在运行的任务，
+    并从该任务所在的 trace 取得会话与路由。循环恢复后由心跳回调按心跳延迟记录阻塞时长，
+    写入指标与日志。未发生阻塞时只有一个定时回调和一个低频轮询线程
+    """
+
+    def __init__(self, threshold: float = None, stack_limit: int = None):
+        self.threshold = threshold if threshold is not None else settings.loop_watchdog_threshold_ms / 1000
+        self.stack_limit = stack_limit if stack_limit is not None else settings.loop_watchdog_stack_limit
+        self.interval = self.threshold / 2
+        self._blocks = metrics.counter("event_loop_blocks_total", "事件循环阻塞超过阈值的次数", ("route",))
+        self._duration = metrics.histogram(
+            "event_loop_block_duration_seconds", "超过阈值的事件循环阻塞时长", buckets=LAG_BUCKETS
+        )
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._beat = 0.0
+        # (心跳时间戳, 阻塞现场)，由检测线程写入、心跳回调取走
+        self._pending: Optional[tuple] = None
+
+    def start(self):
+        """在事件循环中启动心跳与检测线程"""
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopping.clear()
+        self._beat = time.monotonic()
+        self._handle = self._loop.call_later(self.interval, self._heartbeat, self._beat + self.interval)
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        """停止心跳与检测线程"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._handle.cancel()
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+        self._loop = None
+
+    def _heartbeat(self, expected: float):
+        """事件循环内的心跳，按实际与预期的唤醒时间差判断刚结束的阻塞"""
+        now = time.monotonic()
+        previous = self._beat
+        self._beat = now
+        lag = now - expected
+        if lag >= self.threshold:
+            self._report(previous, lag)
+        if not self._stopping.is_set():
+            self._handle = self._loop.call_later(self.interval, self._heartbeat, now + self.interval)
+
+    def _watch(self):
+        """检测线程：心跳超时时在阻塞仍在进行时抓取现场，每次阻塞只抓一次"""
+        captured = None
+        while not self._stopping.wait(self.interval):
+            beat = self._beat
+            if beat != captured and time.monotonic() - beat >= self.interval + self.threshold:
+                captured = beat
+                self._pending = (beat, self._capture())
+
+    def _capture(self) -> dict:
+        """抓取事件循环线程的调用栈、当前任务及其 trace 的会话与路由"""
+        info = {}
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is not None:
+            info["stack"] = "".join(traceback.format_stack(frame, limit=self.stack_limit))
+
+        # 3.11 没有跨线程获取当前任务的公开接口
+        task = getattr(asyncio.tasks, "_current_tasks", {}).get(self._loop)
+        if task is None:
+            return info
+        info["task"] = task.get_name()
+        coro = task.get_coro()
+        info["coroutine"] = getattr(coro, "__qualname__", repr(coro))
+
+        try:
+            handles = list(langfuse_client._active.values())
+        except RuntimeError:
+            # 事件循环线程恰好在修改
+            handles = []
+        for handle in handles:
+            if handle.task is task:
+                info["session_id"] = handle.metadata.get("session_id")
+                info["route"] = handle.route
+                info["trace_id"] = handle.id
+                break
+        return info
+
+    def _report(self, beat: float, lag: float):
+        pending, self._pending = self._pending, None
+        info = pending[1] if pending is not None and pending[0] == beat else {}
+        route = info.get("route") or "unknown"
+        self._blocks.labels(route).inc()
+        self._duration.observe(lag)
+        logger.warning(
+            "事件循环阻塞 %.1fms session=%s route=%s coroutine=%s",
+            lag * 1000, info.get("session_id"), route, info.get("coroutine"),
+            extra={"blocked_ms": round(lag * 1000, 3), **info}
+        )
+
+
+# 全局实例
+loop_lag_monitor = LoopLagMonitor()
+loop_block_watchdog = LoopBlockWatchdog()
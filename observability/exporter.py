@@ -0,0 +1,229 @@
+"""
+追踪导出
+trace、span、generation 记录先进入有界队列，由后台任务按批量或间隔统一导出，
+请求路径上不做网络 I/O；队列满时丢弃并计数。
+导出目标：本地 NDJSON 文件（离线可用）、本地追踪存储与 Langfuse（已配置时）；
+sampled_only 的目标只接收被采样的记录
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime
+from typing import Deque, List, Optional
+
+from app.config import settings
+from app.serialization import ndjson_line
+from observability.metrics import metrics
+from observability.trace_store import TraceStoreSink
+
+logger = logging.getLogger(__name__)
+
+
+class FileSink:
+    """按天滚动的本地 NDJSON 文件"""
+
+    name = "file"
+    sampled_only = True
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, day: datetime = None) -> str:
+        day = day or datetime.now()
+        return os.path.join(self.directory, f"traces-{day:%Y%m%d}.ndjson")
+
+    def _write(self, batch: List[dict]):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(), "ab") as f:
+            f.write(b"".join(ndjson_line(event) for event in batch))
+
+    async def export(self, batch: List[dict]):
+        await asyncio.to_thread(self._write, batch)
+
+
+class LangfuseSink:
+    """通过 Langfuse SDK 上报，每批只 flush 一次"""
+
+    name = "langfuse"
+    sampled_only = True
+
+    # trace 只接受这些字段，结束时间等仅写入本地文件
+    TRACE_FIELDS = {"id", "name", "input", "output", "metadata", "timestamp"}
+
+    def __init__(self, client):
+        self.client = client
+
+    def _send(self, batch: List[dict]):
+        for event in batch:
+            fields = {k: v for k, v in event.items() if k != "kind" and v is not None}
+            kind = event["kind"]
+            if kind == "trace":
+                self.client.trace(**{k: v for k, v in fields.items() if k in self.TRACE_FIELDS})
+            elif kind == "span":
+                self.client.span(**fields)
+            elif kind == "generation":
+                self.client.generation(**fields)
+        self.client.flush()
+
+    async def export(self, batch: List[dict]):
+        await asyncio.to_thread(self._send, batch)
+
+    @classmethod
+    def from_settings(cls) -> Optional["LangfuseSink"]:
+        """已配置密钥且安装了 langfuse 时创建"""
+        if not (settings.langfuse_public_key and settings.langfuse_secret_key):
+            return None
+        try:
+            from langfuse import Langfuse
+        except ImportError:
+            logger.warning("未安装 langfuse，不导出到 Langfuse")
+            return None
+        return cls(Langfuse(
+            public_key=settings.langfuse_public_key,
+            secret_key=settings.langfuse_secret_key,
+            host=settings.langfuse_host
+        ))
+
+
+class TraceExporter:
+    """
+    批量追踪导出器
+    submit 只做一次入队，可在任意线程调用；由生命周期启动的后台任务在积压达到批量
+    或间隔到期时导出，单个导出目标失败不影响其他目标。
+    目标失败时记录一次带调用栈的错误日志，持续失败期间降为 DEBUG（由日志管道限流），恢复后记录一条
+    """
+
+    def __init__(
+        self,
+        sinks: list = None,
+        flush_interval: float = 1.0,
+        batch_size: int = 100,
+        max_queue: int = 10000
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self._sinks = sinks
+        self._queue: Deque[dict] = deque()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._failing: set = set()
+
+        self._submitted = metrics.counter("trace_events_submitted_total", "提交导出的追踪记录数")
+        self._dropped = metrics.counter("trace_events_dropped_total", "丢弃的追踪记录数", ("reason",))
+        self._exported = metrics.counter("trace_events_exported_total", "已导出的追踪记录数", ("sink",))
+        self._queue_size = metrics.gauge("trace_export_queue_size", "待导出的追踪记录数")
+
+    @property
+    def sinks(self) -> list:
+        """导出目标，首次导出时按配置创建"""
+        if self._sinks is None:
+            sinks = []
+            if settings.trace_export_dir:
+                sinks.append(FileSink(settings.trace_export_dir))
+            store = TraceStoreSink.from_settings()
+            if store is not None:
+                sinks.append(store)
+            langfuse = LangfuseSink.from_settings()
+            if langfuse is not None:
+                sinks.append(langfuse)
+            self._sinks = sinks
+        return self._sinks
+
+    @property
+    def accepts_unsampled(self) -> bool:
+        """是否有导出目标接收未被采样的 trace"""
+        return any(not getattr(sink, "sampled_only", True) for sink in self.sinks)
+
+    def submit(self, event: dict) -> bool:
+        """加入一条追踪记录，队列已满时丢弃并返回 False"""
+        if len(self._queue) >= self.max_queue:
+            self._dropped.labels("queue_full").inc()
+            return False
+
+        self._queue.append(event)
+        self._submitted.inc()
+
+        # 积压达到批量时提前唤醒导出任务（可能来自线程池）
+        if len(self._queue) >= self.batch_size and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return True
+
+    def start(self):
+        """启动后台导出任务"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务并导出剩余记录"""
+        if self._task:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+            self._loop = None
+            self._stopping = False
+        await self.flush()
+
+    async def flush(self):
+        """按批导出当前积压的全部记录"""
+        async with self._flush_lock:
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                await self._export(batch)
+            self._queue_size.set(len(self._queue))
+
+    async def _export(self, batch: List[dict]):
+        sinks = self.sinks
+        if not sinks:
+            self._dropped.labels("no_sink").inc(len(batch))
+            return
+
+        sampled = None
+        for sink in sinks:
+            events = batch
+            if getattr(sink, "sampled_only", True):
+                if sampled is None:
+                    sampled = [event for event in batch if event.get("sampled", True)]
+                events = sampled
+            if not events:
+                continue
+            try:
+                await sink.export(events)
+            except Exception:
+                self._dropped.labels(f"{sink.name}_error").inc(len(events))
+                if sink.name in self._failing:
+                    logger.debug("追踪导出仍然失败(%s)，丢弃 %d 条", sink.name, len(events), exc_info=True)
+                else:
+                    self._failing.add(sink.name)
+                    logger.exception("追踪导出失败(%s)，丢弃 %d 条", sink.name, len(events))
+                continue
+
+            self._exported.labels(sink.name).inc(len(events))
+            if sink.name in self._failing:
+                self._failing.discard(sink.name)
+                logger.info("追踪导出已恢复(%s)", sink.name)
+
+    async def _run(self):
+        """后台导出循环：达到批量或间隔到期时导出"""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+# 全局实例
+trace_exporter = TraceExporter(
+    flush_interval=settings.trace_export_flush_interval_ms / 1000,
+    batch_size=settings.trace_export_batch_size,
+    max_queue=settings.trace_export_max_queue,
+)
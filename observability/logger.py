@@ -1,24 +1,193 @@
 """
 日志管理
+日志记录在调用线程只入队，由后台线程格式化并写入文件与控制台；
+消息按 % 参数延迟格式化，级别未开启时不做任何字符串拼接。
+每条记录附带会话、意图与阶段耗时等结构化字段，热路径上的 DEBUG 日志按调用点限流
 """
 import logging
-import json
+import logging.handlers
+import os
+import queue
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 from app.config import settings
+from app.serialization import dumps_str
+from observability.metrics import metrics
 
+# 由 setup_logging 启动的后台写入线程
+_listener: Optional[logging.handlers.QueueListener] = None
 
-def setup_logging():
-    """设置日志"""
-    logging.basicConfig(
-        level=logging.DEBUG if settings.debug else logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('./logs/agentchekong.log'),
-            logging.StreamHandler()
-        ]
-    )
+# 应用自身的 logger，debug 开启时调到 DEBUG；第三方库（aiosqlite、httpx 等）保持 log_level
+APP_LOGGERS = ("agents", "app", "chain", "context", "intent", "knowledge", "observability", "evaluation",
+               "agentchekong")
+
+_dropped = metrics.counter("log_records_dropped_total", "日志队列已满而丢弃的记录数")
+_suppressed = metrics.counter("log_records_suppressed_total", "DEBUG 日志限流丢弃的记录数")
+
+# LogRecord 的标准属性，其余属性视为结构化字段
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def _context_fields() -> dict:
+    """当前请求的会话、意图与阶段耗时"""
+    from observability.timing import get_timings
+    from observability.tracer import current_trace
+
+    fields = {}
+    trace = current_trace()
+    if trace is not None:
+        if trace.metadata.get("session_id"):
+            fields["session_id"] = trace.metadata["session_id"]
+        if trace.intent:
+            fields["intent"] = trace.intent
+        fields["trace_id"] = trace.id
+    timings = get_timings()
+    if timings is not None and timings.durations:
+        fields["stages_ms"] = {name: round(s * 1000, 3) for name, s in timings.durations.items()}
+    return fields
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    DEBUG 及以下级别按调用点（logger + 消息模板）限流，每秒最多 rate 条；
+    被限流的条数在下一条放行的记录中以 suppressed 字段给出
+    """
+
+    def __init__(self, rate: int):
+        super().__init__()
+        self.rate = rate
+        self._windows: Dict[Tuple[str, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate <= 0:
+            return True
+
+        key = (record.name, record.msg if isinstance(record.msg, str) else repr(type(record.msg)))
+        now = int(time.monotonic())
+        window = self._windows.get(key)
+        if window is None or window[0] != now:
+            suppressed = window[2] if window else 0
+            self._windows[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+
+        if window[1] < self.rate:
+            window[1] += 1
+            return True
+
+        window[2] += 1
+        _suppressed.inc()
+        return False
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    入队前只补充上下文字段，不格式化消息；队列已满时丢弃并计数
+    （记录只在本进程内消费，参数对象在写入前不应被修改）
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        for key, value in _context_fields().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped.inc()
+
+
+class JSONFormatter(logging.Formatter):
+    """每条记录一行 JSON，附带结构化字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        try:
+            return dumps_str(entry)
+        except TypeError:
+            # 结构化字段中有无法序列化的对象时退化为字符串
+            return dumps_str({key: value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+                              for key, value in entry.items()})
+
+
+class TextFormatter(logging.Formatter):
+    """文本格式，结构化字段以 key=value 追加在末尾"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        extra = " ".join(
+            f"{key}={value}" for key, value in vars(record).items() if key not in _RESERVED
+        )
+        return f"{text} {extra}" if extra else text
+
+
+def _level(name: str) -> int:
+    """日志级别名转换为数值，无法识别时为 INFO"""
+    level = logging.getLevelName(str(name).upper())
+    return level if isinstance(level, int) else logging.INFO
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """设置日志：根 logger 只挂队列处理器，文件与控制台写入在后台线程完成"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    os.makedirs(settings.log_dir, exist_ok=True)
+    formatter = JSONFormatter() if settings.log_format == "json" else TextFormatter()
+    handlers = [
+        logging.FileHandler(os.path.join(settings.log_dir, "agentchekong.log"), encoding="utf-8"),
+        logging.StreamHandler(),
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=settings.log_queue_size)
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(settings.log_debug_rate_limit))
+
+    root = logging.getLogger()
+    root.setLevel(_level(settings.log_level))
+    root.addHandler(queue_handler)
+    if settings.debug:
+        for name in APP_LOGGERS:
+            logging.getLogger(name).setLevel(logging.DEBUG)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """写完队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, ContextQueueHandler)]:
+        root.removeHandler(handler)
+    _listener = None
 
 
 class AgentLogger:
@@ -35,38 +204,42 @@ class AgentLogger:
     def log_request(self, query: str, intent: str = None):
         """记录请求"""
         self.logger.info(
-            f"[请求] session={self.session_id} intent={intent} query={query[:100]}"
+            "[请求] session=%s intent=%s query=%.100s", self.session_id, intent, query,
+            extra={"session_id": self.session_id, "intent": intent}
         )
 
     def log_response(self, response: str, tools_used: list = None):
         """记录响应"""
         self.logger.info(
-            f"[响应] session={self.session_id} tools={tools_used} response={response[:100]}"
+            "[响应] session=%s tools=%s response=%.100s", self.session_id, tools_used, response,
+            extra={"session_id": self.session_id}
         )
 
     def log_tool_call(self, tool_name: str, args: dict, result: any):
         """记录工具调用"""
         self.logger.info(
-            f"[工具] session={self.session_id} tool={tool_name} args={args} result={str(result)[:100]}"
+            "[工具] session=%s tool=%s args=%s result=%.100s", self.session_id, tool_name, args, result,
+            extra={"session_id": self.session_id, "tool": tool_name}
         )
 
     def log_error(self, error: str, context: dict = None):
         """记录错误"""
         self.logger.error(
-            f"[错误] session={self.session_id} error={error} context={context}"
+            "[错误] session=%s error=%s context=%s", self.session_id, error, context,
+            extra={"session_id": self.session_id}
         )
 
 
 class JSONLogger:
-    """JSON 格式日志"""
+    """JSON 格式日志（经由日志队列异步写出）"""
+
+    _logger = logging.getLogger("agentchekong.events")
 
     @staticmethod
     def log(level: str, event: str, data: dict):
-        """记录 JSON 日志"""
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "level": level,
-            "event": event,
-            **data
-        }
-        print(json.dumps(log_entry, ensure_ascii=False))
+        """记录 JSON 日志，data 作为结构化字段输出"""
+        levelno = logging.getLevelName(level.upper())
+        if not isinstance(levelno, int):
+            levelno = logging.INFO
+        if JSONLogger._logger.isEnabledFor(levelno):
+            JSONLogger._logger.log(levelno, event, extra={"event": event, "data": data})
@@ -0,0 +1,393 @@
+"""
+指标收集
+进程内计数器、仪表盘与直方图，供各子系统记录运行指标，并以 Prometheus 文本格式导出
+
+热路径上的更新只做整数/浮点累加，不加锁：服务运行在单个事件循环中，
+线程池中的少量更新依赖 GIL，极端情况下丢失个别计数可以接受
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Sequence, Tuple
+
+from observability.timing import stage
+
+# 默认直方图分桶（秒），覆盖 1ms ~ 30s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """
+    指标基类
+    声明了 labelnames 时通过 labels() 获取子指标，子指标按标签值缓存
+    """
+
+    TYPE = ""
+
+    def __init__(self, name: str, description: str = "", labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+
+    def labels(self, *values, **kwargs) -> "_Metric":
+        """获取指定标签值的子指标"""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self) -> "_Metric":
+        raise NotImplementedError
+
+    def _series(self) -> Iterator[Tuple[Tuple[Tuple[str, str], ...], "_Metric"]]:
+        """遍历 (标签, 指标) 序列"""
+        if not self.labelnames:
+            yield (), self
+            return
+        for values, child in list(self._children.items()):
+            yield tuple(zip(self.labelnames, values)), child
+
+    def _samples(self, labels) -> List[Tuple[str, tuple, float]]:
+        raise NotImplementedError
+
+    def expose(self) -> List[str]:
+        """Prometheus 文本格式"""
+        lines = [
+            f"# HELP {self.name} {self.description or self.name}",
+            f"# TYPE {self.name} {self.TYPE}",
+        ]
+        for labels, metric in self._series():
+            for suffix, extra, value in metric._samples(labels):
+                lines.append(f"{self.name}{suffix}{_format_labels(labels + extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    TYPE = "counter"
+
+    def __init__(self, name: str, description: str = "", labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self.value = 0.0
+
+    def _new_child(self) -> "Counter":
+        return Counter(self.name, self.description)
+
+    def inc(self, amount: float = 1.0):
+        """增加计数"""
+        self.value += amount
+
+    def _samples(self, labels):
+        return [("", (), self.value)]
+
+
+class Gauge(_Metric):
+    """可增可减的仪表盘"""
+
+    TYPE = "gauge"
+
+    def __init__(self, name: str, description: str = "", labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self.value = 0.0
+
+    def _new_child(self) -> "Gauge":
+        return Gauge(self.name, self.description)
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    @contextmanager
+    def track_inprogress(self):
+        """进入时加一，退出时减一"""
+        self.value += 1
+        try:
+            yield
+        finally:
+            self.value -= 1
+
+    def _samples(self, labels):
+        return [("", (), self.value)]
+
+
+class Histogram(_Metric):
+    """
+    分桶直方图
+    observe 只做一次二分查找和两次累加，导出时再计算累积桶
+    """
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str = "",
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 最后一个桶对应 +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.description, buckets=self.buckets)
+
+    def observe(self, value: float):
+        """记录一个观测值"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self):
+        """记录代码块耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def _samples(self, labels):
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            samples.append(("_bucket", (("le", _format_value(bound)),), cumulative))
+        samples.append(("_sum", (), self.sum))
+        samples.append(("_count", (), cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics.setdefault(name, cls(name, *args, **kwargs))
+        if not isinstance(metric, cls):
+            raise ValueError(f"指标 {name} 已注册为 {metric.TYPE}")
+        return metric
+
+    def counter(self, name: str, description: str = "", labelnames: Sequence[str] = ()) -> Counter:
+        """获取或创建计数器"""
+        return self._get_or_create(Counter, name, description, labelnames)
+
+    def gauge(self, name: str, description: str = "", labelnames: Sequence[str] = ()) -> Gauge:
+        """获取或创建仪表盘"""
+        return self._get_or_create(Gauge, name, description, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        description: str = "",
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """获取或创建直方图"""
+        return self._get_or_create(Histogram, name, description, labelnames, buckets)
+
+    def snapshot(self) -> Dict[str, float]:
+        """导出当前所有计数器与仪表盘的值（直方图导出观测次数）"""
+        result = {}
+        for name, metric in self._metrics.items():
+            for labels, series in metric._series():
+                key = name + _format_labels(labels)
+                result[key] = series.count if isinstance(series, Histogram) else series.value
+        return result
+
+    def expose(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+# 全局实例
+metrics = MetricsRegistry()
+
+# Prometheus 文本格式的 Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class LLMCall:
+    """一次模型调用的指标记录"""
+
+    __slots__ = ("caller",)
+
+    _latency = metrics.histogram("llm_request_duration_seconds", "模型调用耗时", ("caller",))
+    _tokens = metrics.counter("llm_tokens_total", "模型调用 token 数", ("caller", "kind"))
+    _errors = metrics.counter("llm_errors_total", "模型调用失败次数", ("caller",))
+
+    def __init__(self, caller: str):
+        self.caller = caller
+
+    def tokens(self, prompt: int = 0, completion: int = 0):
+        """记录提示词与生成的 token 数"""
+        if prompt:
+            self._tokens.labels(self.caller, "prompt").inc(prompt)
+        if completion:
+            self._tokens.labels(self.caller, "completion").inc(completion)
+
+
+@contextmanager
+def llm_call(caller: str) -> Iterator[LLMCall]:
+    """记录模型调用的耗时与失败次数，token 数由调用方通过 LLMCall.tokens 补充"""
+    call = LLMCall(caller)
+    start = time.perf_counter()
+    try:
+        with stage("llm"):
+            yield call
+    except Exception:
+        LLMCall._errors.labels(caller).inc()
+        raise
+    finally:
+        LLMCall._latency.labels(caller).observe(time.perf_counter() - start)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI 中间件：按路由模板记录请求数、总耗时与首字节耗时
+    未匹配路由的请求统一记为 unmatched，避免标签基数膨胀
+    """
+
+    _requests = metrics.counter("http_requests_total", "HTTP 请求数", ("method", "route", "status"))
+    _latency = metrics.histogram("http_request_duration_seconds", "HTTP 请求耗时", ("method", "route"))
+    _first_byte = metrics.histogram("http_response_first_byte_seconds", "HTTP 响应首字节耗时", ("method", "route"))
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = {"status": 500, "first_byte": False}
+
+        def route() -> str:
+            # 子路由中的路由模板不含挂载前缀，按已匹配的路径参数还原出前缀
+            matched = scope.get("route")
+            template = getattr(matched, "path_format", None)
+            if not template:
+                return "unmatched"
+            try:
+                suffix = template.format(**scope.get("path_params", {}))
+            except (KeyError, IndexError, ValueError):
+                return template
+            path = scope["path"]
+            return path[:len(path) - len(suffix)] + template if path.endswith(suffix) else template
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body" and not state["first_byte"]:
+                state["first_byte"] = True
+                self._first_byte.labels(scope["method"], route()).observe(time.perf_counter() - start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            method, path = scope["method"], route()
+            self._latency.labels(method, path).observe(time.perf_counter() - start)
+            self._requests.labels(method, path, state["status"]).inc()
+
+
+async def llm_stream(caller: str, iterator: AsyncIterator, count_tokens: Callable[[str], int] = None) -> AsyncIterator:
+    """
+    记录流式模型调用：耗时只累计生成数据块的时间，不含下游消费；
+    提供 count_tokens 时按文本块统计生成的 token 数
+    """
+    call = LLMCall(caller)
+    iterator = iterator.__aiter__()
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                with stage("llm"):
+                    chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception:
+                LLMCall._errors.labels(caller).inc()
+                raise
+            finally:
+                elapsed += time.perf_counter() - start
+
+            if count_tokens is not None and isinstance(chunk, dict) and chunk.get("type") == "text":
+                call.tokens(completion=count_tokens(chunk.get("content") or ""))
+            yield chunk
+    finally:
+        LLMCall._latency.labels(caller).observe(elapsed)
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+_active_streams = metrics.gauge("chat_active_streams", "进行中的流式对话数", ("route",))
+_first_token = metrics.histogram("chat_time_to_first_token_seconds", "流式对话首个文本块耗时", ("route",))
+
+
+async def track_stream(route: str, iterator: AsyncIterator) -> AsyncIterator:
+    """记录流式对话的并发数与首个文本块耗时（TTFT）"""
+    active = _active_streams.labels(route)
+    first_token = _first_token.labels(route)
+    iterator = iterator.__aiter__()
+    start = time.perf_counter()
+    waiting = True
+    active.inc()
+    try:
+        async for chunk in iterator:
+            if waiting and isinstance(chunk, dict) and chunk.get("type") == "text":
+                first_token.observe(time.perf_counter() - start)
+                waiting = False
+            yield chunk
+    finally:
+        active.dec()
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
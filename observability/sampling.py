@@ -0,0 +1,93 @@
+"""
+追踪采样
+- 头部采样：按意图或路由配置的比例保留，按 trace id 哈希决定，同一 trace 结果稳定
+- 尾部采样：trace 结束时满足慢请求、出错或走慢车道任一条件即保留
+trace 期间的 span 先缓存在内存中，结束时统一决定导出或丢弃
+"""
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app.config import settings
+from observability.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SamplingDecision:
+    """采样决定"""
+    sampled: bool
+    reason: str
+
+
+class TraceSampler:
+    """头部 + 尾部采样策略"""
+
+    def __init__(
+        self,
+        ratio: float = None,
+        route_ratios: Dict[str, float] = None,
+        intent_ratios: Dict[str, float] = None,
+        tail_latency_ms: float = None,
+        tail_errors: bool = None,
+        tail_slow_lane: bool = None
+    ):
+        self.ratio = settings.trace_sample_ratio if ratio is None else ratio
+        self.route_ratios = settings.trace_sample_routes if route_ratios is None else route_ratios
+        self.intent_ratios = settings.trace_sample_intents if intent_ratios is None else intent_ratios
+        self.tail_latency_ms = settings.trace_tail_latency_ms if tail_latency_ms is None else tail_latency_ms
+        self.tail_errors = settings.trace_tail_errors if tail_errors is None else tail_errors
+        self.tail_slow_lane = settings.trace_tail_slow_lane if tail_slow_lane is None else tail_slow_lane
+        self._decisions = metrics.counter("trace_sampling_decisions_total", "追踪采样决定", ("decision", "reason"))
+
+    def head_ratio(self, route: Optional[str] = None, intent: Optional[str] = None) -> float:
+        """头部采样比例：意图配置优先，其次路由，最后默认比例"""
+        if intent is not None and intent in self.intent_ratios:
+            return self.intent_ratios[intent]
+        if route is not None and route in self.route_ratios:
+            return self.route_ratios[route]
+        return self.ratio
+
+    def head(self, trace_id: str, route: Optional[str] = None, intent: Optional[str] = None) -> bool:
+        """按 trace id 哈希判断是否命中头部采样"""
+        ratio = self.head_ratio(route, intent)
+        if ratio >= 1:
+            return True
+        if ratio <= 0:
+            return False
+        return int(trace_id.replace("-", "")[:8], 16) / 0x100000000 < ratio
+
+    def decide(
+        self,
+        trace_id: str,
+        duration_ms: float,
+        route: Optional[str] = None,
+        intent: Optional[str] = None,
+        lane: Optional[str] = None,
+        error: bool = False
+    ) -> SamplingDecision:
+        """trace 结束时决定是否保留"""
+        if error and self.tail_errors:
+            decision = SamplingDecision(True, "error")
+        elif self.tail_latency_ms and duration_ms >= self.tail_latency_ms:
+            decision = SamplingDecision(True, "latency")
+        elif lane == "slow" and self.tail_slow_lane:
+            decision = SamplingDecision(True, "slow_lane")
+        elif self.head(trace_id, route, intent):
+            decision = SamplingDecision(True, "head")
+        else:
+            decision = SamplingDecision(False, "head")
+
+        self._decisions.labels("keep" if decision.sampled else "drop", decision.reason).inc()
+        logger.log(
+            logging.INFO if decision.sampled and decision.reason != "head" else logging.DEBUG,
+            "trace %s %s reason=%s route=%s intent=%s lane=%s duration_ms=%.1f",
+            trace_id, "sampled" if decision.sampled else "dropped", decision.reason,
+            route, intent, lane, duration_ms
+        )
+        return decision
+
+
+# 全局实例
+trace_sampler = TraceSampler()
@@ -0,0 +1,206 @@
+"""
+分阶段耗时
+基于 contextvar 记录一次请求内各阶段（意图分类、记忆读写、知识检索、智能体、SSE 写出）的耗时，
+以 Server-Timing 响应头和 SSE timing 事件输出；同时按调用栈路径汇总，供本地追踪存储绘制火焰图
+"""
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Optional
+
+_perf_counter = time.perf_counter
+
+
+class StageTimings:
+    """
+    一次请求的阶段耗时
+    同名阶段累加；同名阶段嵌套时只计最外层，避免重复计时。
+    paths 按调用栈路径（如 "agent;agent_rag;llm"）汇总 [首次开始偏移, 累计耗时, 次数]
+    """
+
+    __slots__ = ("started_at", "durations", "counts", "paths", "_active", "_stack")
+
+    def __init__(self):
+        self.started_at = _perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.paths: Dict[str, list] = {}
+        self._active = set()
+        self._stack: List[str] = []
+
+    def add(self, name: str, seconds: float):
+        """累加一个阶段的耗时"""
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def add_path(self, path: str, start: float, seconds: float):
+        """按调用栈路径累加耗时，start 为 perf_counter 时间"""
+        entry = self.paths.get(path)
+        if entry is None:
+            self.paths[path] = [start - self.started_at, seconds, 1]
+        else:
+            entry[1] += seconds
+            entry[2] += 1
+
+    def total_ms(self) -> float:
+        return (_perf_counter() - self.started_at) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "stages": {
+                name: {"ms": round(seconds * 1000, 3), "count": self.counts[name]}
+                for name, seconds in self.durations.items()
+            },
+            "total_ms": round(self.total_ms(), 3),
+        }
+
+    def server_timing(self) -> str:
+        """格式化为 Server-Timing 头"""
+        parts = [
+            f"{name};dur={seconds * 1000:.3f}"
+            for name, seconds in self.durations.items()
+        ]
+        parts.append(f"total;dur={self.total_ms():.3f}")
+        return ", ".join(parts)
+
+
+# 当前请求的阶段耗时；同一请求派生的任务复制上下文后共享同一对象
+_current_timings: ContextVar[Optional[StageTimings]] = ContextVar("stage_timings", default=None)
+
+
+def get_timings() -> Optional[StageTimings]:
+    """获取当前请求的阶段耗时"""
+    return _current_timings.get()
+
+
+def start_timings() -> tuple:
+    """当前上下文未开启计时时（如 WebSocket）开启一份，返回 (timings, token)，token 为 None 表示沿用已有计时"""
+    timings = _current_timings.get()
+    if timings is not None:
+        return timings, None
+    timings = StageTimings()
+    return timings, _current_timings.set(timings)
+
+
+def stop_timings(token):
+    """撤销 start_timings 开启的计时"""
+    if token is None:
+        return
+    try:
+        _current_timings.reset(token)
+    except ValueError:
+        # 流式响应的生成器在其他上下文中被关闭
+        pass
+
+
+class stage:
+    """
+    阶段计时上下文管理器，同步与异步代码均可使用：
+
+        with stage("knowledge"):
+            ...
+
+    当前请求未开启计时时不做任何记录
+    """
+
+    __slots__ = ("name", "timings", "start", "path")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.timings = None
+
+    def __enter__(self):
+        timings = _current_timings.get()
+        if timings is not None and self.name not in timings._active:
+            timings._active.add(self.name)
+            stack = timings._stack
+            self.path = f"{stack[-1]};{self.name}" if stack else self.name
+            stack.append(self.path)
+            self.timings = timings
+            self.start = _perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        timings = self.timings
+        if timings is not None:
+            elapsed = _perf_counter() - self.start
+            timings.add(self.name, elapsed)
+            timings.add_path(self.path, self.start, elapsed)
+            timings._active.discard(self.name)
+            stack = timings._stack
+            if stack and stack[-1] == self.path:
+                stack.pop()
+            elif self.path in stack:
+                # 同一请求的并发任务交错退出
+                stack.remove(self.path)
+            self.timings = None
+        return False
+
+
+def timed(name: str):
+    """为函数或协程函数计时的装饰器"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def timed_iter(name: str, iterator: AsyncIterator) -> AsyncIterator:
+    """
+    为异步迭代器计时，只累计生成每个元素的耗时，不包含下游消费的时间
+    """
+    iterator = iterator.__aiter__()
+    try:
+        while True:
+            with stage(name):
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+            yield item
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI 中间件：为每个 HTTP 请求开启阶段计时，并在响应头中写入 Server-Timing
+
+    流式响应的响应头在生成开始前发送，阶段耗时由 SSE timing 事件补充
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = StageTimings()
+        token = _current_timings.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timings.reset(token)
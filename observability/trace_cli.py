@@ -0,0 +1,138 @@
+"""
+本地追踪存储查询
+
+子命令：
+- slowest：最慢的若干轮对话
+- stages：各阶段耗时汇总
+- flame：某个会话每轮的文本火焰图（横轴为时间，缩进为调用层级）
+
+用法：
+    python -m observability.trace_cli slowest --limit 20 --hours 24
+    python -m observability.trace_cli stages --session <session_id>
+    python -m observability.trace_cli flame <session_id> --turns 5 --width 60
+    python -m observability.trace_cli flame --trace <trace_id>
+"""
+import argparse
+from datetime import datetime, timedelta
+from typing import List
+
+from app.config import settings
+from observability.trace_store import TraceStore
+
+
+def _since(hours: float):
+    return datetime.now() - timedelta(hours=hours) if hours else None
+
+
+def _turn_line(turn) -> str:
+    flags = " ERROR" if turn["error"] else ""
+    return (
+        f"{turn['started_at'][:19]}  {turn['duration_ms']:10.1f}ms  "
+        f"session={turn['session_id'] or '-'}  intent={turn['intent'] or '-'}  "
+        f"lane={turn['lane'] or '-'}  route={turn['route'] or '-'}  trace={turn['trace_id']}{flags}"
+    )
+
+
+def flame_lines(turn, spans: List, width: int = 60) -> List[str]:
+    """
+    一轮的文本火焰图：每个调用栈路径一行，按层级缩进，条形的位置与长度对应开始时间与累计耗时。
+    多次进入的阶段（如流式逐块计时）从首次开始处画出累计耗时
+    """
+    total = max(turn["duration_ms"], max((s["start_ms"] + s["duration_ms"] for s in spans), default=0.0), 1e-6)
+    label_width = max((len(s["name"]) + 2 * s["depth"] for s in spans), default=5)
+    lines = [f"{'total':<{label_width}} |{'█' * width}| {turn['duration_ms']:9.1f}ms"]
+    for span in spans:
+        label = "  " * span["depth"] + span["name"]
+        offset = min(width - 1, int(span["start_ms"] / total * width))
+        length = max(1, min(width - offset, round(span["duration_ms"] / total * width)))
+        bar = " " * offset + "█" * length + " " * (width - offset - length)
+        count = f"  x{span['count']}" if span["count"] > 1 else ""
+        lines.append(f"{label:<{label_width}} |{bar}| {span['duration_ms']:9.1f}ms{count}")
+    return lines
+
+
+def cmd_slowest(store: TraceStore, args):
+    rows = store.slowest(args.limit, args.session, _since(args.hours))
+    if not rows:
+        print("没有记录")
+        return
+    for turn in rows:
+        print(_turn_line(turn))
+        if args.stages:
+            top = [s for s in store.spans(turn["trace_id"]) if s["depth"] == 0]
+            top.sort(key=lambda s: s["duration_ms"], reverse=True)
+            print("    " + "  ".join(f"{s['name']}={s['duration_ms']:.1f}ms" for s in top))
+
+
+def cmd_stages(store: TraceStore, args):
+    since = _since(args.hours)
+    summary = store.summary(args.session, since)
+    if not summary["turns"]:
+        print("没有记录")
+        return
+    print(
+        f"turns={summary['turns']}  total={summary['total_ms']:.1f}ms  "
+        f"avg={summary['total_ms'] / summary['turns']:.1f}ms  errors={summary['errors']}"
+    )
+    print(f"{'stage':24s} {'total_ms':>12s} {'share':>7s} {'avg/turn':>10s} {'max':>10s} {'turns':>6s} {'calls':>7s}")
+    for row in store.stage_breakdown(args.session, since):
+        share = row["total_ms"] / summary["total_ms"] * 100 if summary["total_ms"] else 0.0
+        print(
+            f"{row['name']:24s} {row['total_ms']:12.1f} {share:6.1f}% {row['avg_ms']:10.1f} "
+            f"{row['max_ms']:10.1f} {row['turns']:6d} {row['calls']:7d}"
+        )
+
+
+def cmd_flame(store: TraceStore, args):
+    if args.trace:
+        turn = store.turn(args.trace)
+        turns = [turn] if turn is not None else []
+    elif args.session:
+        turns = store.turns(args.session, args.turns)
+    else:
+        print("需要指定 session_id 或 --trace")
+        return
+    if not turns:
+        print("没有记录")
+        return
+    for turn in turns:
+        print(_turn_line(turn))
+        for line in flame_lines(turn, store.spans(turn["trace_id"]), args.width):
+            print("  " + line)
+        print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地追踪存储查询")
+    parser.add_argument("--db", default=settings.trace_store_path, help="追踪存储路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    slowest = sub.add_parser("slowest", help="最慢的若干轮对话")
+    slowest.add_argument("--limit", type=int, default=20)
+    slowest.add_argument("--session", help="只看某个会话")
+    slowest.add_argument("--hours", type=float, default=0, help="只看最近若干小时，0 表示不限")
+    slowest.add_argument("--stages", action="store_true", help="同时列出顶层阶段耗时")
+    slowest.set_defaults(func=cmd_slowest)
+
+    stages = sub.add_parser("stages", help="各阶段耗时汇总")
+    stages.add_argument("--session", help="只看某个会话")
+    stages.add_argument("--hours", type=float, default=0, help="只看最近若干小时，0 表示不限")
+    stages.set_defaults(func=cmd_stages)
+
+    flame = sub.add_parser("flame", help="会话每轮的文本火焰图")
+    flame.add_argument("session", nargs="?", help="会话 ID")
+    flame.add_argument("--trace", help="只看某一轮（trace id）")
+    flame.add_argument("--turns", type=int, default=10, help="最近的轮数")
+    flame.add_argument("--width", type=int, default=60, help="火焰图宽度（字符）")
+    flame.set_defaults(func=cmd_flame)
+
+    args = parser.parse_args(argv)
+    store = TraceStore(args.db)
+    try:
+        args.func(store, args)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
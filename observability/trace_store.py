@@ -0,0 +1,219 @@
+"""
+本地追踪存储
+每轮对话（一个 trace）及其按调用栈汇总的阶段耗时写入本地 SQLite，
+未配置 Langfuse 或 trace 未被采样时耗时数据同样保留，供 trace_cli 查询最慢轮次与火焰图。
+写入由 trace_exporter 后台任务按批完成，一批一个事务
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from app.config import settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    trace_id TEXT PRIMARY KEY,
+    session_id TEXT,
+    name TEXT,
+    route TEXT,
+    intent TEXT,
+    lane TEXT,
+    error INTEGER NOT NULL DEFAULT 0,
+    sampled INTEGER NOT NULL DEFAULT 0,
+    started_at TEXT NOT NULL,
+    duration_ms REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_turns_session_started ON turns (session_id, started_at);
+CREATE INDEX IF NOT EXISTS ix_turns_started ON turns (started_at);
+CREATE TABLE IF NOT EXISTS spans (
+    trace_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    start_ms REAL NOT NULL,
+    duration_ms REAL NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_spans_trace ON spans (trace_id);
+"""
+
+
+def _iso(value) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+class TraceStore:
+    """
+    基于 SQLite 的追踪存储
+    连接可跨线程使用，写入由导出任务串行调用；WAL 模式下 CLI 可在服务运行时并发读取
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def write(self, events: List[dict]) -> int:
+        """
+        写入一批导出记录中的 trace，返回写入的 span 数
+        同一 trace 再次写入时整体替换：轮次按主键覆盖，旧的 span 先删除
+        """
+        turns = {}
+        spans = {}
+        for event in events:
+            if event.get("kind") != "trace":
+                continue
+            metadata = event.get("metadata") or {}
+            trace_id = event["id"]
+            turns[trace_id] = (
+                trace_id,
+                metadata.get("session_id"),
+                event.get("name"),
+                metadata.get("route"),
+                metadata.get("intent"),
+                metadata.get("lane"),
+                int(bool(metadata.get("error"))),
+                int(bool(event.get("sampled", True))),
+                _iso(event.get("timestamp")),
+                metadata.get("duration_ms") or 0.0,
+            )
+            spans[trace_id] = [
+                (trace_id, span["path"], span["path"].rsplit(";", 1)[-1], span["path"].count(";"),
+                 span["start_ms"], span["ms"], span["count"])
+                for span in event.get("stages") or ()
+            ]
+
+        if not turns:
+            return 0
+        rows = [row for trace_spans in spans.values() for row in trace_spans]
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM spans WHERE trace_id = ?", [(trace_id,) for trace_id in turns])
+            self.conn.executemany("INSERT OR REPLACE INTO turns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", turns.values())
+            self.conn.executemany("INSERT INTO spans VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def prune(self, before: datetime) -> int:
+        """删除早于 before 的轮次及其 span，返回删除的轮次数"""
+        cutoff = before.isoformat()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM spans WHERE trace_id IN (SELECT trace_id FROM turns WHERE started_at < ?)", (cutoff,)
+            )
+            return self.conn.execute("DELETE FROM turns WHERE started_at < ?", (cutoff,)).rowcount
+
+    def slowest(self, limit: int = 20, session_id: str = None, since: datetime = None) -> List[sqlite3.Row]:
+        """最慢的若干轮"""
+        where, params = self._filters(session_id, since)
+        return self.conn.execute(
+            f"SELECT * FROM turns{where} ORDER BY duration_ms DESC LIMIT ?", (*params, limit)
+        ).fetchall()
+
+    def turns(self, session_id: str, limit: int = 50) -> List[sqlite3.Row]:
+        """会话内最近的若干轮，按时间先后排列"""
+        rows = self.conn.execute(
+            "SELECT * FROM turns WHERE session_id = ? ORDER BY started_at DESC LIMIT ?", (session_id, limit)
+        ).fetchall()
+        return rows[::-1]
+
+    def turn(self, trace_id: str) -> Optional[sqlite3.Row]:
+        return self.conn.execute("SELECT * FROM turns WHERE trace_id = ?", (trace_id,)).fetchone()
+
+    def spans(self, trace_id: str) -> List[sqlite3.Row]:
+        """一轮的 span，按开始时间排列"""
+        return self.conn.execute(
+            "SELECT * FROM spans WHERE trace_id = ? ORDER BY start_ms, depth", (trace_id,)
+        ).fetchall()
+
+    def stage_breakdown(self, session_id: str = None, since: datetime = None) -> List[sqlite3.Row]:
+        """各阶段的总耗时、平均每轮耗时与出现轮数（嵌套阶段按名称汇总）"""
+        where, params = self._filters(session_id, since, prefix="t.")
+        return self.conn.execute(
+            f"""
+            SELECT s.name AS name,
+                   SUM(s.duration_ms) AS total_ms,
+                   SUM(s.count) AS calls,
+                   COUNT(DISTINCT s.trace_id) AS turns,
+                   SUM(s.duration_ms) / COUNT(DISTINCT s.trace_id) AS avg_ms,
+                   MAX(s.duration_ms) AS max_ms
+            FROM spans s JOIN turns t ON t.trace_id = s.trace_id{where}
+            GROUP BY s.name ORDER BY total_ms DESC
+            """,
+            params,
+        ).fetchall()
+
+    def summary(self, session_id: str = None, since: datetime = None) -> sqlite3.Row:
+        """轮数、总耗时与出错轮数"""
+        where, params = self._filters(session_id, since)
+        return self.conn.execute(
+            f"SELECT COUNT(*) AS turns, COALESCE(SUM(duration_ms), 0) AS total_ms, "
+            f"COALESCE(SUM(error), 0) AS errors FROM turns{where}",
+            params,
+        ).fetchone()
+
+    @staticmethod
+    def _filters(session_id: str = None, since: datetime = None, prefix: str = "") -> tuple:
+        clauses, params = [], []
+        if session_id:
+            clauses.append(f"{prefix}session_id = ?")
+            params.append(session_id)
+        if since is not None:
+            clauses.append(f"{prefix}started_at >= ?")
+            params.append(since.isoformat())
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), tuple(params)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class TraceStoreSink:
+    """
+    trace_exporter 的导出目标：写入本地追踪存储，按保留天数定期清理；
+    未被采样的 trace 也会写入
+    """
+
+    name = "trace_store"
+    sampled_only = False
+
+    # 清理间隔（秒）
+    PRUNE_INTERVAL = 3600
+
+    def __init__(self, store: TraceStore, retention_days: int = 7):
+        self.store = store
+        self.retention_days = retention_days
+        self._pruned_at = 0.0
+
+    def _write(self, batch: List[dict]):
+        self.store.write(batch)
+        if self.retention_days > 0 and time.monotonic() - self._pruned_at >= self.PRUNE_INTERVAL:
+            self._pruned_at = time.monotonic()
+            self.store.prune(datetime.now() - timedelta(days=self.retention_days))
+
+    async def export(self, batch: List[dict]):
+        await asyncio.to_thread(self._write, batch)
+
+    @classmethod
+    def from_settings(cls) -> Optional["TraceStoreSink"]:
+        """配置了存储路径时创建"""
+        if not settings.trace_store_path:
+            return None
+        return cls(TraceStore(settings.trace_store_path), settings.trace_store_retention_days)
@@ -1,57 +1,162 @@
 """
 Langfuse 集成
-实现可观测性
+实现可观测性；记录交给 trace_exporter 异步批量导出，请求路径上不做网络刷写。
+trace 内的 span 与生成记录先缓存，trace 结束时由 trace_sampler 决定导出或丢弃；
+trace 记录附带按调用栈汇总的阶段耗时，未被采样时仍交给本地追踪存储
 """
-from typing import Optional, Any
+import asyncio
+import time
+import uuid
+from contextvars import ContextVar
+from typing import AsyncIterator, List, Optional, Any
 from datetime import datetime
 from contextlib import asynccontextmanager
 
 from app.config import settings
+from observability.exporter import trace_exporter
+from observability.metrics import metrics
+from observability.sampling import trace_sampler
+from observability.timing import StageTimings, start_timings, stop_timings
+
+
+class TraceHandle:
+    """进行中的追踪，可在其下创建跨度与生成记录"""
+
+    def __init__(self, client: "LangfuseClient", name: str, metadata: dict = None, route: str = None):
+        self.client = client
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.metadata = metadata or {}
+        self.route = route
+        self.intent: Optional[str] = None
+        self.lane: Optional[str] = None
+        self.error = False
+        self.start_time = datetime.now()
+        self.started_at = time.perf_counter()
+        self.input: Any = None
+        self.output: Any = None
+        self.events: List[dict] = []
+        self.timings: Optional[StageTimings] = None
+        # 创建 trace 的任务，供事件循环阻塞检测关联会话
+        self.task: Optional[asyncio.Task] = None
+
+    def buffer(self, event: dict):
+        """缓存一条子记录，等待采样决定"""
+        if len(self.events) >= settings.trace_max_buffered_events:
+            _buffer_overflow.inc()
+            return
+        self.events.append(event)
+
+    def stages(self) -> List[dict]:
+        """trace 期间的阶段耗时，按调用栈路径汇总，开始时间相对 trace 开始"""
+        timings = self.timings
+        if timings is None:
+            return []
+        offset = timings.started_at - self.started_at
+        return [
+            {
+                "path": path,
+                "start_ms": round(max(0.0, start + offset) * 1000, 3),
+                "ms": round(seconds * 1000, 3),
+                "count": count,
+            }
+            for path, (start, seconds, count) in timings.paths.items()
+        ]
+
+    def span(self, name: str, **kwargs) -> str:
+        return self.client.create_span(self.id, name, **kwargs)
+
+    def generation(self, name: str, **kwargs) -> str:
+        return self.client.create_generation(self.id, name, **kwargs)
+
+
+_buffer_overflow = metrics.counter("trace_buffer_overflow_total", "超出单个 trace 缓存上限而丢弃的记录数")
+
+# 当前请求的 trace，智能体与工具通过它补充意图、车道和跨度
+_current_trace: ContextVar[Optional[TraceHandle]] = ContextVar("current_trace", default=None)
+
+
+def current_trace() -> Optional[TraceHandle]:
+    """获取当前请求的 trace"""
+    return _current_trace.get()
 
 
 class LangfuseClient:
     """Langfuse 客户端封装"""
 
-    def __init__(self):
-        self.client = None
-        self._initialized = False
-
-    def _ensure_initialized(self):
-        """确保已初始化"""
-        if not self._initialized:
-            if settings.langfuse_public_key and settings.langfuse_secret_key:
-                try:
-                    from langfuse import Langfuse
-                    self.client = Langfuse(
-                        public_key=settings.langfuse_public_key,
-                        secret_key=settings.langfuse_secret_key,
-                        host=settings.langfuse_host
-                    )
-                    self._initialized = True
-                except ImportError:
-                    print("Warning: langfuse not installed")
-            else:
-                print("Warning: Langfuse not configured")
+    def __init__(self, exporter=None, sampler=None):
+        self.exporter = exporter or trace_exporter
+        self.sampler = sampler or trace_sampler
+        self._active = {}
 
     @asynccontextmanager
-    async def trace(self, name: str, metadata: dict = None):
-        """创建追踪上下文"""
-        self._ensure_initialized()
-
-        if not self.client:
-            # 无 Langfuse 时返回空上下文
-            yield None
+    async def trace(self, name: str, metadata: dict = None, route: str = None):
+        """创建追踪上下文，退出时按采样决定提交追踪记录及其子记录"""
+        handle = TraceHandle(self, name, metadata, route)
+        handle.task = asyncio.current_task()
+        self._active[handle.id] = handle
+        ctx_token = _current_trace.set(handle)
+        handle.timings, timings_token = start_timings()
+        try:
+            yield handle
+        except (GeneratorExit, asyncio.CancelledError):
+            # 客户端断开不算失败
+            handle.metadata = {**handle.metadata, "cancelled": True}
+            raise
+        except Exception as e:
+            handle.error = True
+            handle.metadata = {**handle.metadata, "error": repr(e)}
+            raise
+        finally:
+            stop_timings(timings_token)
+            try:
+                _current_trace.reset(ctx_token)
+            except ValueError:
+                # 流式响应的生成器在其他上下文中被关闭
+                pass
+            self._active.pop(handle.id, None)
+            self._finish(handle)
+
+    def _finish(self, handle: TraceHandle):
+        duration_ms = (time.perf_counter() - handle.started_at) * 1000
+        decision = self.sampler.decide(
+            handle.id, duration_ms,
+            route=handle.route, intent=handle.intent, lane=handle.lane, error=handle.error
+        )
+        if not decision.sampled and not self.exporter.accepts_unsampled:
             return
 
-        trace = self.client.trace(
-            name=name,
-            metadata=metadata or {}
-        )
+        self.exporter.submit({
+            "kind": "trace",
+            "sampled": decision.sampled,
+            "id": handle.id,
+            "name": handle.name,
+            "input": handle.input,
+            "output": handle.output,
+            "metadata": {
+                **handle.metadata,
+                "route": handle.route,
+                "intent": handle.intent,
+                "lane": handle.lane,
+                "duration_ms": round(duration_ms, 3),
+                "sampling": decision.reason,
+            },
+            "timestamp": handle.start_time,
+            "end_time": datetime.now(),
+            "stages": handle.stages(),
+        })
+        if not decision.sampled:
+            return
+        for event in handle.events:
+            self.exporter.submit(event)
 
-        try:
-            yield trace
-        finally:
-            self.client.flush()
+    def _record(self, event: dict):
+        """所属 trace 进行中时缓存，否则直接提交"""
+        handle = self._active.get(event["trace_id"])
+        if handle is not None:
+            handle.buffer(event)
+        else:
+            self.exporter.submit(event)
 
     def create_generation(
         self,
@@ -60,22 +165,25 @@ class LangfuseClient:
         input: Any,
         output: Any,
         model: str = None,
-        metadata: dict = None
-    ):
-        """创建生成记录"""
-        self._ensure_initialized()
-
-        if not self.client:
-            return None
-
-        return self.client.generation(
-            trace_id=trace_id,
-            name=name,
-            input=input,
-            output=output,
-            model=model,
-            metadata=metadata or {}
-        )
+        metadata: dict = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> str:
+        """创建生成记录，返回记录 id"""
+        generation_id = str(uuid.uuid4())
+        self._record({
+            "kind": "generation",
+            "id": generation_id,
+            "trace_id": trace_id,
+            "name": name,
+            "input": input,
+            "output": output,
+            "model": model,
+            "metadata": metadata or {},
+            "start_time": start_time or datetime.now(),
+            "end_time": end_time,
+        })
+        return generation_id
 
     def create_span(
         self,
@@ -83,21 +191,36 @@ class LangfuseClient:
         name: str,
         input: Any = None,
         output: Any = None,
-        metadata: dict = None
-    ):
-        """创建跨度"""
-        self._ensure_initialized()
-
-        if not self.client:
-            return None
-
-        return self.client.span(
-            trace_id=trace_id,
-            name=name,
-            input=input,
-            output=output,
-            metadata=metadata or {}
-        )
+        metadata: dict = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> str:
+        """创建跨度，返回记录 id"""
+        span_id = str(uuid.uuid4())
+        self._record({
+            "kind": "span",
+            "id": span_id,
+            "trace_id": trace_id,
+            "name": name,
+            "input": input,
+            "output": output,
+            "metadata": metadata or {},
+            "start_time": start_time or datetime.now(),
+            "end_time": end_time,
+        })
+        return span_id
+
+    async def trace_stream(self, name: str, iterator: AsyncIterator, metadata: dict = None, route: str = None):
+        """在一个 trace 内迭代流式响应"""
+        iterator = iterator.__aiter__()
+        try:
+            async with self.trace(name, metadata, route):
+                async for chunk in iterator:
+                    yield chunk
+        finally:
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
 
 
 # 全局实例
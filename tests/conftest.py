@@ -0,0 +1,31 @@
+"""
+测试公共配置：使用内存数据库，关闭后台清理
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("RETENTION_ENABLED", "false")
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+
+@pytest.fixture
+def memory_db(monkeypatch):
+    """
+    返回协程函数：在当前事件循环中创建独立的内存数据库并建表，
+    替换传入模块的 async_session，返回 (engine, 会话工厂)
+    """
+    from app.database import Base
+
+    async def setup(*modules):
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        for module in modules:
+            monkeypatch.setattr(module, "async_session", factory)
+        return engine, factory
+
+    return setup
@@ -0,0 +1,78 @@
+"""
+批量导出导入测试：压缩往返、重复导入幂等、冲突与坏行报错
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from app.bulk import BulkError, export_ndjson, import_ndjson
+from app.config import settings
+from app.database import Conversation, Message
+
+
+async def _seed(factory):
+    async with factory() as db:
+        db.add_all([
+            Conversation(session_id="s1", user_id="u1", title="北京出差", updated_at=datetime(2026, 1, 1)),
+            Conversation(session_id="s2", user_id="u2", title="上海出差"),
+        ])
+        db.add_all([Message(session_id="s1", role="user", content=f"第{i}条") for i in range(5)])
+        db.add(Message(session_id="s2", role="user", content="其他用户"))
+        await db.commit()
+
+
+async def _chunks(data: bytes, size: int = 7):
+    # 小块输入，覆盖跨块的行与压缩帧
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def _count(factory, model) -> int:
+    async with factory() as db:
+        return (await db.execute(select(func.count()).select_from(model))).scalar()
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_export_import_round_trip(memory_db, monkeypatch, compression):
+    monkeypatch.setattr(settings, "bulk_batch_size", 2)
+
+    async def run():
+        source, source_factory = await memory_db()
+        target, target_factory = await memory_db()
+        await _seed(source_factory)
+
+        stream = await export_ndjson(user_id="u1", compression=compression, session_factory=source_factory)
+        data = b"".join([chunk async for chunk in stream])
+
+        counts = await import_ndjson(_chunks(data), session_factory=target_factory)
+        assert counts == {"conversations": 1, "messages": 5}
+        async with target_factory() as db:
+            conversation = await db.get(Conversation, "s1")
+        assert conversation.updated_at == datetime(2026, 1, 1)
+
+        # 默认跳过已存在的行，重复导入不改变数据
+        await import_ndjson(_chunks(data), session_factory=target_factory)
+        assert await _count(target_factory, Message) == 5
+
+        with pytest.raises(IntegrityError):
+            await import_ndjson(_chunks(data), on_conflict="fail", session_factory=target_factory)
+
+        await source.dispose()
+        await target.dispose()
+
+    asyncio.run(run())
+
+
+def test_invalid_input_rejected(memory_db):
+    async def run():
+        engine, factory = await memory_db()
+        with pytest.raises(BulkError, match="第 2 行"):
+            await import_ndjson(_chunks(b'{"table": "messages", "row": {}}\nnot json\n'), session_factory=factory)
+        with pytest.raises(BulkError, match="不支持的表"):
+            await export_ndjson(tables=["users"], session_factory=factory)
+        await engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,49 @@
+"""
+WebSocket 多路复用接口测试：格式错误的消息不应关闭连接
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers.chat import _parse_ws_frame, router
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("text, error", [
+    ("not json", ValueError),
+    ("[1, 2]", TypeError),
+    ('{"op": "credit", "session_id": "s", "credit": "many"}', ValueError),
+    ('{"op": "credit", "session_id": "s", "credit": null}', TypeError),
+    ('{"op": "credit", "session_id": "s", "credit": -1}', ValueError),
+    ('{"op": "chat", "session_id": "s", "message": {"a": 1}}', TypeError),
+    ('{"op": "chat", "session_id": 1}', TypeError),
+    (None, TypeError),
+])
+def test_parse_ws_frame_rejects_malformed_frames(text, error):
+    with pytest.raises(error):
+        _parse_ws_frame(text)
+
+
+def test_parse_ws_frame_normalizes_credit():
+    assert _parse_ws_frame('{"op": "credit", "session_id": "s", "credit": "8"}')["credit"] == 8
+
+
+def test_malformed_frames_keep_connection_open(client):
+    with client.websocket_connect("/chat/ws") as ws:
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_bytes(b"\x00\x01")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"op": "credit", "session_id": "s", "credit": "many"})
+        assert ws.receive_json()["type"] == "error"
+
+        ws.send_json({"op": "unknown", "session_id": "s"})
+        frame = ws.receive_json()
+        assert frame["session_id"] == "s"
+        assert "unknown" in frame["content"]
@@ -0,0 +1,57 @@
+"""
+会话上下文缓存测试：加载窗口时与刷写并发，不遗漏刚落库的行
+"""
+import asyncio
+
+import context.memory as memory
+from app.database import SessionMemory
+from context.memory import MemoryManager, SessionContextCache, WriteBehindBuffer
+
+
+def test_prime_cache_does_not_lose_rows_flushed_during_load(memory_db, monkeypatch):
+    async def run():
+        engine, factory = await memory_db(memory)
+        buffer = WriteBehindBuffer(batch_size=1000)
+        cache = SessionContextCache(window=10)
+        monkeypatch.setattr(memory, "write_buffer", buffer)
+        monkeypatch.setattr(memory, "context_cache", cache)
+
+        await buffer.add(SessionMemory, {"session_id": "s1", "agent_name": "user",
+                                         "memory_type": "user_message", "content": "你好"})
+
+        class FlushDuringSelect:
+            """读库时恰好有一次刷写并发执行"""
+
+            def __init__(self):
+                self.session = factory()
+
+            async def __aenter__(self):
+                db = await self.session.__aenter__()
+                execute = db.execute
+
+                async def racing_execute(*args, **kwargs):
+                    result = await execute(*args, **kwargs)
+                    if not flushes:
+                        # 只在缓存加载的那次读库后触发刷写，并给它足够的时间完成
+                        flushes.append(asyncio.create_task(buffer.flush()))
+                        await asyncio.wait(flushes, timeout=0.5)
+                    return result
+
+                db.execute = racing_execute
+                return db
+
+            async def __aexit__(self, *exc):
+                return await self.session.__aexit__(*exc)
+
+        flushes = []
+        monkeypatch.setattr(memory, "async_session", FlushDuringSelect)
+        await MemoryManager("s1").prime_cache()
+        await asyncio.gather(*flushes)
+
+        rows = cache.recent("s1", lambda r: True, 10)
+        assert [r["content"] for r in rows] == ["你好"]
+        assert buffer.pending(SessionMemory, "s1") == []
+        await buffer.stop()
+        await engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+"""
+日志设置测试：根 logger 按 log_level，debug 只放开应用自身的 logger
+"""
+import logging
+
+import pytest
+
+from app.config import settings
+from observability.logger import APP_LOGGERS, setup_logging, shutdown_logging
+
+
+@pytest.fixture
+def restore_levels():
+    names = ("",) + APP_LOGGERS
+    levels = {name: logging.getLogger(name).level for name in names}
+    yield
+    shutdown_logging()
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+
+@pytest.mark.parametrize("debug, app_debug", [(True, True), (False, False)])
+def test_debug_only_raises_app_loggers(monkeypatch, tmp_path, restore_levels, debug, app_debug):
+    monkeypatch.setattr(settings, "log_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "log_level", "info")
+    monkeypatch.setattr(settings, "debug", debug)
+
+    setup_logging()
+    assert logging.getLogger().level == logging.INFO
+    assert not logging.getLogger("aiosqlite").isEnabledFor(logging.DEBUG)
+    assert not logging.getLogger("httpx").isEnabledFor(logging.DEBUG)
+    assert logging.getLogger("context.memory").isEnabledFor(logging.DEBUG) is app_debug
+    assert logging.getLogger("agentchekong.events").isEnabledFor(logging.DEBUG) is app_debug
+
+
+def test_unknown_level_falls_back_to_info(monkeypatch, tmp_path, restore_levels):
+    monkeypatch.setattr(settings, "log_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "log_level", "loud")
+    monkeypatch.setattr(settings, "debug", False)
+
+    setup_logging()
+    assert logging.getLogger().level == logging.INFO
@@ -0,0 +1,66 @@
+"""
+长期记忆测试：偏好识别、重复内容去重、索引目录单写者
+"""
+import pytest
+
+from context.long_term import is_preference, trip_summary
+
+np = pytest.importorskip("numpy")
+
+from context.long_term import IndexLockedError, LongTermMemory, VectorIndex  # noqa: E402
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("我出差总是住全季", True),
+    ("我习惯坐早班机", True),
+    ("我一般周一出发", False),
+    ("帮我订公司附近的酒店", False),
+    ("我住在杭州", False),
+    ("你喜欢哪家酒店？", False),
+])
+def test_is_preference(text, expected):
+    assert is_preference(text) is expected
+
+
+def test_remember_skips_duplicates(tmp_path):
+    memory = LongTermMemory(str(tmp_path), dim=64)
+    summary = trip_summary({"destination": "北京", "departure_date": "2026-11-01"})
+    try:
+        for _ in range(3):
+            memory.remember("u1", summary, "trip", "s1")
+        memory.remember("u1", "我习惯坐早班机", "preference", "s1")
+        memory.remember("u2", summary, "trip", "s2")
+
+        assert memory._index.count == 3
+        assert [m["text"] for m in memory.recall("u1", summary, k=5)] == [summary, "我习惯坐早班机"]
+    finally:
+        memory.close()
+
+
+def test_index_single_writer(tmp_path):
+    pytest.importorskip("fcntl")
+    index = VectorIndex(str(tmp_path), dim=8)
+    try:
+        with pytest.raises(IndexLockedError):
+            VectorIndex(str(tmp_path), dim=8)
+
+        # 被占用时长期记忆降级为不可用，而不是与持有者并发写入
+        other = LongTermMemory(str(tmp_path), dim=8)
+        other.remember("u1", "我习惯坐早班机")
+        assert other.recall("u1", "早班机") == []
+        assert not other.available
+    finally:
+        index.close()
+
+    reopened = VectorIndex(str(tmp_path), dim=8)
+    reopened.close()
+
+
+def test_warm_opens_index(tmp_path):
+    memory = LongTermMemory(str(tmp_path), dim=8)
+    try:
+        assert memory.warm() == 0
+        memory.remember("u1", "我习惯坐早班机")
+        assert memory.warm() == 1
+    finally:
+        memory.close()
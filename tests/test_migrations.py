@@ -0,0 +1,173 @@
+"""
+迁移测试：按版本号顺序执行、重复执行不再应用、多进程同时启动时每个版本只应用一次
+"""
+import asyncio
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import app.migrations as migrations
+from app.migrations import MIGRATIONS, Migration, run_migrations, schema_migrations
+
+
+def test_versions_are_unique_and_appended_in_order():
+    versions = [m.version for m in MIGRATIONS]
+    assert versions == sorted(versions)
+    assert len(set(versions)) == len(versions)
+
+
+def _recording(version: int, log: list) -> Migration:
+    def upgrade(conn):
+        log.append(version)
+        conn.execute(text(f"CREATE TABLE t{version} (id INTEGER)"))
+
+    return Migration(version, f"m{version}", upgrade)
+
+
+def test_run_in_version_order_once(monkeypatch, tmp_path):
+    log = []
+    monkeypatch.setattr(migrations, "MIGRATIONS", [_recording(v, log) for v in (3, 1, 2)])
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'm.db'}")
+        assert await run_migrations(engine) == [1, 2, 3]
+        assert await run_migrations(engine) == []
+        async with engine.connect() as conn:
+            rows = (await conn.execute(select(schema_migrations.c.version))).scalars().all()
+        await engine.dispose()
+        return rows
+
+    assert sorted(asyncio.run(run())) == [1, 2, 3]
+    assert log == [1, 2, 3]
+
+
+def test_failed_migration_is_not_recorded(monkeypatch, tmp_path):
+    def broken(conn):
+        conn.execute(text("CREATE TABLE half_done (id INTEGER)"))
+        raise RuntimeError("升级失败")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [Migration(1, "broken", broken)])
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'm.db'}")
+        try:
+            await run_migrations(engine)
+        except RuntimeError:
+            pass
+        assert await migrations.applied_versions(engine) == set()
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_concurrent_workers_apply_each_version_once(monkeypatch, tmp_path):
+    log = []
+    monkeypatch.setattr(migrations, "MIGRATIONS", [_recording(v, log) for v in (1, 2, 3)])
+    url = f"sqlite+aiosqlite:///{tmp_path / 'm.db'}"
+
+    async def run():
+        engines = [create_async_engine(url) for _ in range(4)]
+        # 先建好版本表，模拟各进程同时读到“尚未应用”
+        await migrations.applied_versions(engines[0])
+        results = await asyncio.gather(*(run_migrations(e) for e in engines))
+        for engine in engines:
+            await engine.dispose()
+        return results
+
+    results = asyncio.run(run())
+    assert sorted(v for applied in results for v in applied) == [1, 2, 3]
+    assert sorted(log) == [1, 2, 3]
+
+
+def test_waiting_past_busy_timeout_retries(monkeypatch, tmp_path):
+    log = []
+
+    def slow(conn):
+        # 持有写锁的时间远超其他进程的忙等待时间
+        time.sleep(0.3)
+        log.append(1)
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [Migration(1, "slow", slow)])
+    url = f"sqlite+aiosqlite:///{tmp_path / 'm.db'}"
+
+    async def worker():
+        engine = create_async_engine(url, connect_args={"timeout": 0.05})
+        try:
+            return await run_migrations(engine)
+        finally:
+            await engine.dispose()
+
+    async def prepare():
+        engine = create_async_engine(url)
+        await migrations.applied_versions(engine)
+        await engine.dispose()
+
+    asyncio.run(prepare())
+    # 升级在事件循环线程中执行，每个工作进程用独立线程和事件循环模拟
+    with ThreadPoolExecutor(3) as pool:
+        results = list(pool.map(lambda _: asyncio.run(worker()), range(3)))
+    assert sorted(v for applied in results for v in applied) == [1]
+    assert log == [1]
+
+
+def test_fresh_database_does_not_build_dropped_indexes(tmp_path):
+    dropped = re.compile(r"\b(ix_messages_session_created|ix_conversations_user_updated)\b")
+
+    async def run():
+        from app.database import Base
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'm.db'}")
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        assert await run_migrations(engine) == [m.version for m in MIGRATIONS]
+        async with engine.connect() as conn:
+            indexes = await conn.run_sync(lambda c: {i["name"] for i in inspect(c).get_indexes("messages")})
+        await engine.dispose()
+        return statements, indexes
+
+    statements, indexes = asyncio.run(run())
+    assert not [s for s in statements if s.startswith("CREATE INDEX") and dropped.search(s)]
+    assert "ix_messages_session_created_id" in indexes
+
+
+class _RecordingConnection:
+    """记录执行的语句，模拟 PostgreSQL 连接"""
+
+    class dialect:
+        name = "postgresql"
+
+    def __init__(self, invalid=()):
+        self.statements = []
+        self.invalid = set(invalid)
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+        invalid = params is not None and params.get("name") in self.invalid
+
+        class Result:
+            def first(self):
+                return (1,) if invalid else None
+
+        return Result()
+
+
+def test_postgres_indexes_are_built_concurrently():
+    conn = _RecordingConnection(invalid={"ix_a"})
+    migrations._ddl(
+        migrations._create_index("ix_a", "t", "a", "b"),
+        migrations._drop_index("ix_old"),
+    )(conn)
+
+    ddl = [s for s in conn.statements if not s.startswith("SELECT")]
+    assert ddl == [
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_a",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_a ON t (a, b)",
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_old",
+    ]
+    assert all(not m.transactional for m in MIGRATIONS)
@@ -0,0 +1,135 @@
+"""
+流多路复用器测试：信用额度流控、并发上限与取消
+"""
+import asyncio
+
+import pytest
+
+from chain.multiplexer import StreamMultiplexer
+
+
+async def _chunks(n: int):
+    for i in range(n):
+        yield {"type": "text", "content": str(i)}
+
+
+async def _settle():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_stream_pauses_when_credit_is_exhausted_and_resumes_on_grant():
+    async def run():
+        frames = []
+
+        async def send(frame):
+            frames.append(frame)
+
+        mux = StreamMultiplexer(send, initial_credit=2)
+        assert await mux.open("s1", _chunks(5))
+        await _settle()
+        assert [f["content"] for f in frames] == ["0", "1"]
+
+        mux.grant("s1", 2)
+        await _settle()
+        assert [f["content"] for f in frames] == ["0", "1", "2", "3"]
+
+        mux.grant("s1", 10)
+        await mux.channels["s1"].task
+        assert [f["content"] for f in frames] == ["0", "1", "2", "3", "4"]
+        assert all(f["session_id"] == "s1" for f in frames)
+        assert "s1" not in mux.channels
+
+    asyncio.run(run())
+
+
+def test_credit_is_tracked_per_session():
+    async def run():
+        frames = []
+
+        async def send(frame):
+            frames.append(frame)
+
+        mux = StreamMultiplexer(send, initial_credit=1)
+        await mux.open("a", _chunks(3))
+        await mux.open("b", _chunks(3))
+        await _settle()
+        mux.grant("b", 2)
+        await _settle()
+
+        by_session = {}
+        for frame in frames:
+            by_session.setdefault(frame["session_id"], []).append(frame["content"])
+        assert by_session == {"a": ["0"], "b": ["0", "1", "2"]}
+        await mux.close()
+
+    asyncio.run(run())
+
+
+def test_open_rejects_duplicate_session_and_stream_limit():
+    async def run():
+        frames = []
+
+        async def send(frame):
+            frames.append(frame)
+
+        mux = StreamMultiplexer(send, initial_credit=0, max_streams=1)
+        assert await mux.open("a", _chunks(1))
+        assert not await mux.open("a", _chunks(1))
+        assert not await mux.open("b", _chunks(1))
+        assert [f["type"] for f in frames] == ["error", "error"]
+        await mux.close()
+        assert mux.channels == {}
+
+    asyncio.run(run())
+
+
+def test_cancel_closes_the_generator():
+    async def run():
+        closed = asyncio.Event()
+
+        async def endless():
+            try:
+                while True:
+                    yield {"type": "text", "content": "x"}
+            finally:
+                closed.set()
+
+        frames = []
+
+        async def send(frame):
+            frames.append(frame)
+
+        mux = StreamMultiplexer(send, initial_credit=0)
+        await mux.open("s1", endless())
+        await _settle()
+        task = mux.channels["s1"].task
+        mux.cancel("s1")
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert closed.is_set()
+        # 客户端取消的流以终止帧结束
+        assert frames == [{"session_id": "s1", "type": "cancelled", "reason": "client_cancel"}]
+
+    asyncio.run(run())
+
+
+def test_close_cancels_without_terminal_frames():
+    async def run():
+        frames = []
+
+        async def endless():
+            while True:
+                yield {"type": "text", "content": "x"}
+
+        async def send(frame):
+            frames.append(frame)
+
+        mux = StreamMultiplexer(send, initial_credit=0)
+        await mux.open("s1", endless())
+        await _settle()
+        await mux.close()
+        # 连接已关闭，不再写入
+        assert frames == []
+
+    asyncio.run(run())
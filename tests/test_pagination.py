@@ -0,0 +1,98 @@
+"""
+键集分页测试：游标编解码、同一时间的行按主键排序、翻页间新写入不重复不遗漏
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+import app.pagination as pagination
+from app.database import Message
+from app.pagination import decode_cursor, encode_cursor, fetch_page, iter_pages
+
+COLUMNS = [Message.created_at, Message.id]
+START = datetime(2026, 1, 1, 9, 0, 0)
+
+
+def _message(i: int, created_at: datetime) -> Message:
+    return Message(id=f"m-{i:03d}", session_id="page-session", role="user", content=str(i), created_at=created_at)
+
+
+def _query():
+    return select(Message).where(Message.session_id == "page-session")
+
+
+def _ids(rows) -> list:
+    return [r["id"] for r in rows]
+
+
+def _serialize(m: Message) -> dict:
+    return {"id": m.id}
+
+
+def test_cursor_round_trip():
+    values = [START + timedelta(microseconds=123), "m-001"]
+    assert decode_cursor(encode_cursor(values), COLUMNS) == values
+
+
+@pytest.mark.parametrize("cursor", ["不是游标", encode_cursor(["m-001"]), encode_cursor({"a": 1}),
+                                    encode_cursor(["昨天", "m-001"])])
+def test_invalid_cursor_rejected(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor, COLUMNS)
+    assert exc.value.status_code == 400
+
+
+def test_pages_cover_ties_exactly_once(memory_db):
+    async def run():
+        engine, factory = await memory_db(pagination)
+        async with factory() as db:
+            # 每三条共用一个时间戳，翻页依赖主键区分先后
+            db.add_all([_message(i, START + timedelta(seconds=i // 3)) for i in range(10)])
+            await db.commit()
+
+        pages = []
+        cursor = None
+        while True:
+            rows, cursor = await fetch_page(_query(), COLUMNS, cursor, 4, _serialize, descending=False)
+            pages.append(_ids(rows))
+            if cursor is None:
+                break
+        assert pages == [
+            ["m-000", "m-001", "m-002", "m-003"],
+            ["m-004", "m-005", "m-006", "m-007"],
+            ["m-008", "m-009"],
+        ]
+
+        rows = [r async for r in iter_pages(
+            lambda c: fetch_page(_query(), COLUMNS, c, 3, _serialize)
+        )]
+        assert _ids(rows) == [f"m-{i:03d}" for i in reversed(range(10))]
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_new_rows_between_pages_do_not_shift_results(memory_db):
+    async def run():
+        engine, factory = await memory_db(pagination)
+        async with factory() as db:
+            db.add_all([_message(i, START + timedelta(seconds=i)) for i in range(6)])
+            await db.commit()
+
+        first, cursor = await fetch_page(_query(), COLUMNS, None, 3, _serialize)
+        assert _ids(first) == ["m-005", "m-004", "m-003"]
+
+        # 倒序翻页期间写入更新的消息，不会挤进后续页
+        async with factory() as db:
+            db.add(_message(99, START + timedelta(hours=1)))
+            await db.commit()
+
+        second, cursor = await fetch_page(_query(), COLUMNS, cursor, 3, _serialize)
+        assert _ids(second) == ["m-002", "m-001", "m-000"]
+        assert cursor is None
+        await engine.dispose()
+
+    asyncio.run(run())
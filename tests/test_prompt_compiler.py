@@ -0,0 +1,23 @@
+"""Prompt 编译统计与指标导出"""
+from context.prompt_compiler import PromptCompiler, dynamic, static
+from observability.metrics import metrics
+
+
+def test_stats_exported_per_call_site():
+    compiler = PromptCompiler()
+    site = "test.prompt_stats"
+    for query in ("北京", "上海", "广州"):
+        compiler.compile(site, [static("你是差旅助手。"), dynamic(query)])
+    compiler.compile(site, [static("你是酒店助手。"), dynamic("杭州")])
+
+    stats = compiler.stats()[site]
+    assert stats["calls"] == 4
+    assert stats["distinct_prefixes"] == 2
+    assert stats["prefix_reuse_ratio"] == 0.5
+
+    snapshot = metrics.snapshot()
+    label = f'{{call_site="{site}"}}'
+    assert snapshot[f"prompt_compiles_total{label}"] == 4
+    assert snapshot[f"prompt_prefix_reuses_total{label}"] == 2
+    assert snapshot[f"prompt_distinct_prefixes{label}"] == 2
+    assert snapshot[f"prompt_tokens_total{label}"] > snapshot[f"prompt_prefix_tokens_total{label}"] > 0
@@ -0,0 +1,138 @@
+"""
+保留策略测试：过期会话归档后删除，写后缓冲中仍有待写入的会话跳过，清理期间回来的用户写入保留
+"""
+import asyncio
+import gzip
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+import context.memory as memory
+import context.retention as retention
+from app.config import settings
+from app.database import Conversation, SessionMemory
+from context.memory import WriteBehindBuffer
+from context.retention import RetentionSweeper
+
+
+def _memory(session_id: str, created_at: datetime) -> SessionMemory:
+    return SessionMemory(session_id=session_id, agent_name="main", memory_type="user_message",
+                         content="你好", created_at=created_at)
+
+
+async def _sessions(factory) -> set:
+    async with factory() as db:
+        return set((await db.execute(select(SessionMemory.session_id).distinct())).scalars().all())
+
+
+def test_expired_sessions_archived_and_deleted(memory_db, monkeypatch, tmp_path):
+    async def run():
+        engine, factory = await memory_db(memory, retention)
+        buffer = WriteBehindBuffer()
+        monkeypatch.setattr(retention, "write_buffer", buffer)
+        monkeypatch.setattr(settings, "retention_archive_dir", str(tmp_path))
+        monkeypatch.setattr(settings, "retention_archive_compression", "gzip")
+
+        old = datetime.now() - timedelta(hours=settings.session_expire_hours + 1)
+        async with factory() as db:
+            db.add(Conversation(session_id="expired", user_id="u1", title="出差", updated_at=old))
+            db.add_all([_memory("expired", old), _memory("busy", old), _memory("fresh", datetime.now())])
+            await db.commit()
+
+        # busy 会话的新写入还在缓冲中，未落库
+        await buffer.add(SessionMemory, {"session_id": "busy", "agent_name": "main",
+                                         "memory_type": "user_message", "content": "还在"})
+
+        report = await RetentionSweeper().run_once()
+        assert report.sessions == 1
+        assert report.rows == {"session_memories": 1, "conversations": 1}
+        assert await _sessions(factory) == {"busy", "fresh"}
+        async with factory() as db:
+            assert (await db.execute(select(func.count()).select_from(Conversation))).scalar() == 0
+
+        with gzip.open(report.archive_path, "rt", encoding="utf-8") as f:
+            archived = [json.loads(line) for line in f]
+        assert sorted(r["table"] for r in archived) == ["conversations", "session_memories"]
+        assert {r["row"]["session_id"] for r in archived} == {"expired"}
+
+        await buffer.stop()
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_writes_racing_the_purge_are_kept(memory_db, monkeypatch, tmp_path):
+    async def run():
+        engine, factory = await memory_db(memory, retention)
+        buffer = WriteBehindBuffer()
+        monkeypatch.setattr(retention, "write_buffer", buffer)
+        monkeypatch.setattr(settings, "retention_archive_dir", str(tmp_path))
+
+        old = datetime.now() - timedelta(hours=settings.session_expire_hours + 1)
+        async with factory() as db:
+            db.add_all([_memory("flushed", old), _memory("buffered", old)])
+            await db.commit()
+
+        sweeper = RetentionSweeper()
+        purge_table = sweeper._purge_table
+
+        async def purge_with_race(model, key, stamp, session_ids, cutoff, archive, report):
+            # 删除过程中两个会话的用户都回来了：一条写入已刷写落库，另一条还在缓冲中
+            if model is SessionMemory:
+                for session_id in ("flushed", "buffered"):
+                    await buffer.add(SessionMemory, {"session_id": session_id, "agent_name": "main",
+                                                     "memory_type": "user_message", "content": "回来了"})
+                    if session_id == "flushed":
+                        await buffer.flush()
+            await purge_table(model, key, stamp, session_ids, cutoff, archive, report)
+
+        sweeper._purge_table = purge_with_race
+        report = await sweeper.run_once()
+
+        assert report.sessions == 0
+        assert report.resumed == 2
+        assert report.rows == {"session_memories": 2}
+        assert buffer.has_pending("buffered")
+        await buffer.flush()
+        async with factory() as db:
+            contents = (await db.execute(select(SessionMemory.content))).scalars().all()
+        assert contents == ["回来了", "回来了"]
+
+        await buffer.stop()
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_orphans_queried_once_per_sweep(memory_db, monkeypatch, tmp_path):
+    async def run():
+        engine, factory = await memory_db(memory, retention)
+        monkeypatch.setattr(retention, "write_buffer", WriteBehindBuffer())
+        monkeypatch.setattr(settings, "retention_archive_dir", str(tmp_path))
+        monkeypatch.setattr(settings, "retention_session_batch", 2)
+
+        old = datetime.now() - timedelta(hours=settings.session_expire_hours + 1)
+        async with factory() as db:
+            db.add_all([Conversation(session_id=f"c{i}", user_id="u1", title="出差", updated_at=old)
+                        for i in range(3)])
+            db.add_all([_memory(f"o{i}", old) for i in range(5)])
+            await db.commit()
+
+        sweeper = RetentionSweeper()
+        expired_orphans = sweeper._expired_orphans
+        calls = []
+
+        async def count_orphans(cutoff):
+            calls.append(cutoff)
+            return await expired_orphans(cutoff)
+
+        sweeper._expired_orphans = count_orphans
+        report = await sweeper.run_once()
+
+        assert len(calls) == 1
+        assert report.sessions == 8
+        assert await _sessions(factory) == set()
+        await engine.dispose()
+
+    asyncio.run(run())
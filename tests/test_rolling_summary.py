@@ -0,0 +1,107 @@
+"""
+滚动摘要测试：只折叠滑出窗口的对话，每个会话只保留一行摘要
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+import context.memory as memory
+from app.config import settings
+from app.database import SessionMemory
+from context.assembler import RollingSummary, summary_text
+from context.memory import MemoryManager
+
+
+def _messages(n: int, start: datetime) -> list:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "content": f"第{i}条消息。后面的内容不进入摘要",
+         "timestamp": (start + timedelta(seconds=i)).isoformat()}
+        for i in range(n)
+    ]
+
+
+def test_fold_upserts_one_row_per_session(memory_db):
+    async def run():
+        engine, factory = await memory_db(memory)
+        manager = MemoryManager("summary-session")
+        summary = RollingSummary(manager)
+        messages = _messages(6, datetime(2026, 1, 1))
+
+        await summary.fold(messages[:2])
+        await summary.fold(messages[:4])
+        folded = await summary.fold(messages[:4])
+
+        async with factory() as db:
+            rows = (await db.execute(
+                select(func.count()).select_from(SessionMemory).where(SessionMemory.memory_type == "summary")
+            )).scalar()
+        assert rows == 1
+        assert [e["text"] for e in folded["entries"]] == ["用户: 第0条消息。", "助手: 第1条消息。",
+                                                          "用户: 第2条消息。", "助手: 第3条消息。"]
+        assert (await summary.load()) == folded
+        assert summary_text(folded, before=messages[2]["timestamp"]) == "用户: 第0条消息。\n助手: 第1条消息。"
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_fold_without_new_messages_does_not_write(memory_db):
+    async def run():
+        engine, factory = await memory_db(memory)
+        manager = MemoryManager("summary-idle")
+        summary = RollingSummary(manager)
+
+        assert (await summary.fold([])) == {"entries": [], "upto": None}
+        async with factory() as db:
+            rows = (await db.execute(select(func.count()).select_from(SessionMemory))).scalar()
+        assert rows == 0
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_slow_lane_turn_compiles_prompt(memory_db, monkeypatch, tmp_path):
+    pytest.importorskip("numpy")
+    import agents.main_plan_agent as main_plan_agent
+    import context.state_store as state_store_module
+    from context.long_term import LongTermMemory
+
+    monkeypatch.setattr(settings, "memory_write_behind", False)
+    monkeypatch.setattr(settings, "context_history_tokens", 40)
+    long_term = LongTermMemory(str(tmp_path), dim=64)
+    monkeypatch.setattr(main_plan_agent, "long_term_memory", long_term)
+
+    async def run():
+        engine, factory = await memory_db(memory, state_store_module)
+        agent = main_plan_agent.MainPlanAgent("served-session", user_id="u1")
+        for i in range(6):
+            await agent.memory_manager.add_user_message(f"第{i}条消息。后面的内容不进入摘要")
+        long_term.remember("u1", "我出差总是住全季", "preference", "earlier-session")
+
+        prompts = []
+        compile_prompt = agent.compile_prompt
+
+        async def spy(message):
+            prompts.append(await compile_prompt(message))
+            return prompts[-1]
+
+        agent.compile_prompt = spy
+        await agent.chat("这次住哪里比较好")
+
+        # 慢车道的请求会折叠滚动摘要，并把召回的长期记忆编入主 Prompt
+        assert len(prompts) == 1
+        assert "我出差总是住全季" in prompts[0].text
+        async with factory() as db:
+            rows = (await db.execute(
+                select(func.count()).select_from(SessionMemory).where(SessionMemory.memory_type == "summary")
+            )).scalar()
+        assert rows == 1
+        await engine.dispose()
+
+    try:
+        asyncio.run(run())
+    finally:
+        long_term.close()
@@ -0,0 +1,63 @@
+"""
+采样测试：头部比例按意图、路由、默认依次生效，同一 trace 结果稳定；尾部条件按出错、慢请求、慢车道优先
+"""
+import uuid
+
+import pytest
+
+from observability.sampling import TraceSampler
+
+
+def _sampler(**kwargs) -> TraceSampler:
+    options = dict(ratio=0.1, route_ratios={"/api/v1/chat": 0.5}, intent_ratios={"rag_agent": 1.0},
+                   tail_latency_ms=2000, tail_errors=True, tail_slow_lane=True)
+    options.update(kwargs)
+    return TraceSampler(**options)
+
+
+def test_head_ratio_precedence():
+    sampler = _sampler()
+    assert sampler.head_ratio("/api/v1/chat", "rag_agent") == 1.0
+    assert sampler.head_ratio("/api/v1/chat", "chat") == 0.5
+    assert sampler.head_ratio("/api/v1/other", None) == 0.1
+
+
+def test_head_is_stable_and_follows_ratio():
+    sampler = _sampler()
+    ids = [str(uuid.uuid5(uuid.NAMESPACE_OID, str(i))) for i in range(4000)]
+
+    first = [sampler.head(i, "/api/v1/chat") for i in ids]
+    assert first == [sampler.head(i, "/api/v1/chat") for i in ids]
+    assert 0.45 < sum(first) / len(ids) < 0.55
+
+    # 比例更低的集合是比例更高的集合的子集，调高比例不会丢掉已采样的 trace
+    low = {i for i in ids if sampler.head(i)}
+    assert low <= {i for i, kept in zip(ids, first) if kept}
+    assert all(sampler.head(i, intent="rag_agent") for i in ids)
+    assert not any(_sampler(ratio=0).head(i) for i in ids)
+
+
+def test_head_boundary():
+    sampler = _sampler(ratio=0.5)
+    assert sampler.head("7fffffff-0000-0000-0000-000000000000")
+    assert not sampler.head("80000000-0000-0000-0000-000000000000")
+
+
+@pytest.mark.parametrize("kwargs, expected", [
+    ({"duration_ms": 5000, "lane": "slow", "error": True}, (True, "error")),
+    ({"duration_ms": 5000, "lane": "slow"}, (True, "latency")),
+    ({"duration_ms": 2000}, (True, "latency")),
+    ({"duration_ms": 10, "lane": "slow"}, (True, "slow_lane")),
+    ({"duration_ms": 10, "lane": "fast"}, (False, "head")),
+    ({"duration_ms": 10, "intent": "rag_agent"}, (True, "head")),
+])
+def test_tail_decisions(kwargs, expected):
+    # 该 trace id 不命中 10% 的默认头部采样
+    decision = _sampler().decide("ffffffff-0000-0000-0000-000000000000", **kwargs)
+    assert (decision.sampled, decision.reason) == expected
+
+
+def test_tail_conditions_can_be_disabled():
+    sampler = _sampler(tail_latency_ms=0, tail_errors=False, tail_slow_lane=False)
+    decision = sampler.decide("ffffffff-0000-0000-0000-000000000000", 60000, lane="slow", error=True)
+    assert (decision.sampled, decision.reason) == (False, "head")
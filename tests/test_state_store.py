@@ -0,0 +1,68 @@
+"""
+会话状态快照测试：CAS 写入，并发冲突时只有一方成功，重新加载后可重试
+"""
+import asyncio
+
+import context.state_store as state_store_module
+from context.state_store import StateSnapshot, StateStore
+
+
+def test_save_bumps_version(memory_db):
+    async def run():
+        await memory_db(state_store_module)
+        store = StateStore()
+
+        snapshot = await store.load("cas-session")
+        assert snapshot.version == 0
+        snapshot.stage = "trip_planning"
+        snapshot.slots = {"destination": "北京"}
+        assert await store.save(snapshot)
+        assert snapshot.version == 1
+
+        loaded = await store.load("cas-session")
+        assert (loaded.stage, loaded.slots, loaded.version) == ("trip_planning", {"destination": "北京"}, 1)
+
+    asyncio.run(run())
+
+
+def test_concurrent_update_conflicts_then_retries(memory_db):
+    async def run():
+        await memory_db(state_store_module)
+        store = StateStore()
+        first = StateSnapshot("cas-session", stage="greeting")
+        assert await store.save(first)
+
+        a = await store.load("cas-session")
+        b = await store.load("cas-session")
+        a.slots = {"destination": "上海"}
+        b.slots = {"departure_date": "2026-11-01"}
+
+        assert await store.save(a)
+        assert not await store.save(b)
+        assert b.version == 1
+
+        # 冲突方基于最新快照合并后重试
+        latest = await store.load("cas-session")
+        latest.slots.update(b.slots)
+        assert await store.save(latest)
+
+        final = await store.load("cas-session")
+        assert final.version == 3
+        assert final.slots == {"destination": "上海", "departure_date": "2026-11-01"}
+
+    asyncio.run(run())
+
+
+def test_concurrent_insert_conflicts(memory_db):
+    async def run():
+        await memory_db(state_store_module)
+        store = StateStore()
+        a = StateSnapshot("cas-new", stage="trip_planning")
+        b = StateSnapshot("cas-new", stage="order_confirm")
+
+        assert await store.save(a)
+        assert not await store.save(b)
+        assert b.version == 0
+        assert (await store.load("cas-new")).stage == "trip_planning"
+
+    asyncio.run(run())
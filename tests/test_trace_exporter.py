@@ -0,0 +1,45 @@
+"""
+追踪导出测试：单个目标失败不影响其他目标，失败与恢复经由日志记录
+"""
+import asyncio
+import logging
+
+from observability.exporter import TraceExporter
+
+
+class _Sink:
+    sampled_only = True
+
+    def __init__(self, name: str):
+        self.name = name
+        self.failing = False
+        self.received = []
+
+    async def export(self, batch):
+        if self.failing:
+            raise ConnectionError("目标不可用")
+        self.received.extend(batch)
+
+
+def test_sink_failure_logged_once_until_recovery(caplog):
+    async def run():
+        good, bad = _Sink("good"), _Sink("bad")
+        exporter = TraceExporter(sinks=[bad, good], batch_size=10)
+        bad.failing = True
+
+        for i in range(3):
+            exporter.submit({"kind": "trace", "id": str(i)})
+            await exporter.flush()
+        bad.failing = False
+        exporter.submit({"kind": "trace", "id": "3"})
+        await exporter.flush()
+        return good, bad
+
+    with caplog.at_level(logging.DEBUG, logger="observability.exporter"):
+        good, bad = asyncio.run(run())
+
+    assert [e["id"] for e in good.received] == ["0", "1", "2", "3"]
+    assert [e["id"] for e in bad.received] == ["3"]
+    levels = [r.levelname for r in caplog.records if r.name == "observability.exporter"]
+    assert levels == ["ERROR", "DEBUG", "DEBUG", "INFO"]
+    assert caplog.records[0].exc_info is not None
@@ -0,0 +1,88 @@
+"""
+本地追踪存储测试：重复写入同一 trace 时整体替换，trace_cli 的最慢轮次、阶段汇总与火焰图输出
+"""
+from datetime import datetime
+
+import pytest
+
+from observability.trace_cli import main
+from observability.trace_store import TraceStore
+
+
+def _trace(trace_id: str, session_id: str, duration_ms: float, stages: list, minute: int = 0) -> dict:
+    return {
+        "kind": "trace",
+        "id": trace_id,
+        "name": "chat",
+        "timestamp": datetime(2026, 1, 1, 9, minute),
+        "metadata": {"session_id": session_id, "intent": "chat", "lane": "slow",
+                     "route": "/api/chat", "duration_ms": duration_ms},
+        "stages": [{"path": path, "start_ms": start, "ms": ms, "count": count}
+                   for path, start, ms, count in stages],
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TraceStore(str(tmp_path / "traces.db"))
+    store.write([
+        _trace("t-fast", "s1", 40.0, [("intent", 0.0, 5.0, 1), ("agent", 5.0, 30.0, 1)], minute=0),
+        _trace("t-slow", "s1", 100.0, [
+            ("intent", 0.0, 10.0, 1),
+            ("agent", 10.0, 80.0, 1),
+            ("agent;memory_read", 10.0, 20.0, 2),
+        ], minute=1),
+    ])
+    yield store
+    store.close()
+
+
+def test_rewriting_a_trace_replaces_its_spans(store):
+    rewritten = _trace("t-slow", "s1", 120.0, [("intent", 0.0, 10.0, 1), ("agent", 10.0, 100.0, 1)], minute=1)
+    assert store.write([rewritten]) == 2
+    assert store.write([rewritten, rewritten]) == 2
+
+    assert [s["path"] for s in store.spans("t-slow")] == ["intent", "agent"]
+    assert store.turn("t-slow")["duration_ms"] == 120.0
+    assert [s["name"] for s in store.spans("t-fast")] == ["intent", "agent"]
+
+
+def test_slowest(store, capsys):
+    assert [t["trace_id"] for t in store.slowest(limit=1)] == ["t-slow"]
+
+    main(["--db", store.path, "slowest", "--limit", "2", "--stages"])
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 4
+    assert "trace=t-slow" in lines[0] and "100.0ms" in lines[0]
+    assert lines[1].split() == ["agent=80.0ms", "intent=10.0ms"]
+    assert "trace=t-fast" in lines[2]
+
+
+def test_stages(store, capsys):
+    breakdown = {row["name"]: row for row in store.stage_breakdown()}
+    assert breakdown["agent"]["total_ms"] == 110.0
+    assert breakdown["agent"]["turns"] == 2
+    assert breakdown["memory_read"]["calls"] == 2
+
+    main(["--db", store.path, "stages", "--session", "s1"])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == ["turns=2", "total=140.0ms", "avg=70.0ms", "errors=0"]
+    assert [line.split()[0] for line in lines[2:]] == ["agent", "memory_read", "intent"]
+    assert lines[2].split()[:3] == ["agent", "110.0", "78.6%"]
+
+
+def test_flame(store, capsys):
+    main(["--db", store.path, "flame", "--trace", "t-slow", "--width", "10"])
+    lines = capsys.readouterr().out.splitlines()
+    assert "trace=t-slow" in lines[0]
+    assert lines[1:5] == [
+        "  total         |██████████|     100.0ms",
+        "  intent        |█         |      10.0ms",
+        "  agent         | ████████ |      80.0ms",
+        "    memory_read | ██       |      20.0ms  x2",
+    ]
+
+
+def test_empty_store(tmp_path, capsys):
+    main(["--db", str(tmp_path / "empty.db"), "flame", "missing-session"])
+    assert capsys.readouterr().out.strip() == "没有记录"
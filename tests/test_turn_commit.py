@@ -0,0 +1,102 @@
+"""
+整轮提交测试：状态快照与本轮消息同一事务写入，版本冲突时整轮回滚，由调用方合并后重试
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+import context.memory as memory
+import context.state_store as state_store_module
+from app.config import settings
+from app.database import Message, SessionMemory
+from agents.main_plan_agent import MainPlanAgent
+from context.memory import MemoryManager
+from context.prompt_builder import ConversationStage
+from context.state_store import StateSnapshot, state_store
+
+
+async def _count(factory, model) -> int:
+    async with factory() as db:
+        return (await db.execute(select(func.count()).select_from(model))).scalar()
+
+
+def _turn(manager: MemoryManager, state: StateSnapshot = None):
+    turn = manager.new_turn()
+    turn.add_user_message("帮我规划去北京的行程")
+    turn.add_assistant_message("好的")
+    turn.state = state
+    return turn
+
+
+@pytest.fixture
+def write_through(monkeypatch):
+    monkeypatch.setattr(settings, "memory_write_behind", False)
+
+
+def test_state_committed_with_turn(memory_db, write_through):
+    async def run():
+        engine, factory = await memory_db(memory, state_store_module)
+        manager = MemoryManager("turn-session")
+        snapshot = StateSnapshot("turn-session", stage="info_collect", slots={"destination": "北京"})
+
+        assert await manager.commit_turn(_turn(manager, snapshot))
+        assert snapshot.version == 1
+        assert await _count(factory, Message) == 2
+        assert (await state_store.load("turn-session")).slots == {"destination": "北京"}
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_conflict_rolls_back_whole_turn(memory_db, write_through):
+    async def run():
+        engine, factory = await memory_db(memory, state_store_module)
+        manager = MemoryManager("turn-session")
+        assert await state_store.save(StateSnapshot("turn-session"))
+
+        stale = await state_store.load("turn-session")
+        assert await state_store.save(await state_store.load("turn-session"))
+
+        stale.stage = "info_collect"
+        turn = _turn(manager, stale)
+        assert not await manager.commit_turn(turn)
+        assert stale.version == 1
+        assert await _count(factory, Message) == 0
+        assert await _count(factory, SessionMemory) == 0
+
+        # 合并最新快照后重试，同一批行只写入一次
+        turn.state = await state_store.load("turn-session")
+        turn.state.stage = "info_collect"
+        assert await manager.commit_turn(turn)
+        assert await _count(factory, Message) == 2
+        assert (await state_store.load("turn-session")).version == 3
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_agent_replays_turn_on_conflict(memory_db, write_through):
+
+    async def run():
+        engine, factory = await memory_db(memory, state_store_module)
+        agent = MainPlanAgent("turn-session")
+        snapshot = await state_store.load("turn-session")
+        agent.prompt_builder.restore(snapshot)
+
+        # 另一个请求抢先写入了目的地
+        other = await state_store.load("turn-session")
+        other.slots = {"destination": "北京"}
+        assert await state_store.save(other)
+
+        agent.prompt_builder.set_stage(ConversationStage.INFO_COLLECT)
+        agent.prompt_builder.update_info("departure_date", "2026-11-01")
+        await agent._commit_turn(_turn(agent.memory_manager), snapshot)
+
+        final = await state_store.load("turn-session")
+        assert final.stage == ConversationStage.INFO_COLLECT.value
+        assert final.slots == {"destination": "北京", "departure_date": "2026-11-01"}
+        assert await _count(factory, Message) == 2
+        await engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,173 @@
+"""
+写后缓冲测试：整批失败后的重试、坏行隔离与积压上限，删除会话与进行中的刷写互斥
+"""
+import asyncio
+
+from sqlalchemy import func, select
+
+import context.memory as memory
+from app.database import SessionMemory
+from context.memory import WriteBehindBuffer
+
+
+def _row(session_id: str, content="hello") -> dict:
+    return {"session_id": session_id, "agent_name": "main", "memory_type": "user", "content": content}
+
+
+async def _count(factory) -> int:
+    async with factory() as db:
+        return (await db.execute(select(func.count()).select_from(SessionMemory))).scalar()
+
+
+def test_flush_writes_batch_in_one_commit(memory_db):
+    async def run():
+        engine, factory = await memory_db(memory)
+        buffer = WriteBehindBuffer(batch_size=1000)
+        await buffer.add_many([(SessionMemory, _row("s1")), (SessionMemory, _row("s2"))])
+        assert len(buffer.pending(SessionMemory, "s1")) == 1
+
+        await buffer.flush()
+        assert await _count(factory) == 2
+        assert buffer.stats["commits"] == 1
+        assert buffer.pending(SessionMemory, "s1") == []
+        await buffer.stop()
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_bad_row_is_retried_then_isolated_and_dropped(memory_db):
+    async def run():
+        engine, factory = await memory_db(memory)
+        buffer = WriteBehindBuffer(batch_size=1000, max_retries=3)
+        await buffer.add_many([
+            (SessionMemory, _row("s1")),
+            (SessionMemory, _row("bad", content=None)),
+            (SessionMemory, _row("s2")),
+        ])
+
+        await buffer.flush()
+        await buffer.flush()
+        # 重试次数内整批放回队列
+        assert await _count(factory) == 0
+        assert buffer.stats["errors"] == 2
+        assert len(buffer.pending(SessionMemory, "s1")) == 1
+
+        await buffer.flush()
+        # 达到重试上限后逐行写入，坏行丢弃，其余落库
+        assert await _count(factory) == 2
+        assert buffer.stats["dropped"] == 1
+        assert buffer.pending(SessionMemory, "bad") == []
+        assert buffer.pending(SessionMemory, "s1") == []
+
+        # 坏行不再阻塞后续写入
+        await buffer.add(SessionMemory, _row("s3"))
+        await buffer.flush()
+        assert await _count(factory) == 3
+        await buffer.stop()
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_failed_flush_keeps_newer_updates(memory_db):
+    async def run():
+        engine, factory = await memory_db(memory)
+        buffer = WriteBehindBuffer(batch_size=1000, max_retries=5)
+        row = await buffer.add(SessionMemory, _row("s1"))
+        await buffer.flush()
+
+        await buffer.add_many([(SessionMemory, _row("bad", content=None))],
+                              updates=[(SessionMemory, {"id": row["id"], "content": "old"})])
+        await buffer.flush()
+        await buffer.add_many([], updates=[(SessionMemory, {"id": row["id"], "content": "new"})])
+        buffer.discard_session("bad")
+        await buffer.flush()
+
+        async with factory() as db:
+            content = (await db.execute(select(SessionMemory.content))).scalar()
+        assert content == "new"
+        await buffer.stop()
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_backlog_is_bounded_when_flush_keeps_failing(monkeypatch):
+    async def run():
+        def broken_session():
+            raise ConnectionError("database is down")
+
+        monkeypatch.setattr(memory, "async_session", broken_session)
+        buffer = WriteBehindBuffer(batch_size=1000, max_pending=10, max_retries=1000)
+        for i in range(25):
+            await buffer.add(SessionMemory, _row(f"s{i}"))
+
+        assert len(buffer._pending) <= 10
+        assert buffer.stats["dropped"] == 15
+        # 丢弃的是最旧的行
+        assert buffer.pending(SessionMemory, "s0") == []
+        assert len(buffer.pending(SessionMemory, "s24")) == 1
+        buffer._stopping = True
+        buffer._wakeup.set()
+        await buffer._task
+
+    asyncio.run(run())
+
+
+def test_backoff_grows_with_consecutive_failures():
+    buffer = WriteBehindBuffer(flush_interval=0.05, max_backoff=1.0)
+    assert buffer._delay() == 0.05
+    buffer._failures = 3
+    assert buffer._delay() == 0.4
+    buffer._failures = 10
+    assert buffer._delay() == 1.0
+
+
+def test_delete_conversation_waits_for_inflight_flush(memory_db, monkeypatch):
+    import app.routers.conversation as conversation
+
+    async def run():
+        engine, factory = await memory_db(conversation)
+        buffer = WriteBehindBuffer(batch_size=1000)
+        monkeypatch.setattr(conversation, "write_buffer", buffer)
+        await buffer.add(SessionMemory, _row("s1"))
+        writing = asyncio.Event()
+        release = asyncio.Event()
+
+        class SlowFlush:
+            """刷写已取走这批行，写库前停住"""
+
+            def __init__(self):
+                self.session = factory()
+
+            async def __aenter__(self):
+                db = await self.session.__aenter__()
+                execute = db.execute
+
+                async def slow_execute(*args, **kwargs):
+                    writing.set()
+                    await release.wait()
+                    return await execute(*args, **kwargs)
+
+                db.execute = slow_execute
+                return db
+
+            async def __aexit__(self, *exc):
+                return await self.session.__aexit__(*exc)
+
+        monkeypatch.setattr(memory, "async_session", SlowFlush)
+        flush = asyncio.create_task(buffer.flush())
+        await writing.wait()
+
+        # 刷写进行中删除会话：删除需等这次刷写完成，否则这批行会在删除后被写回
+        delete = asyncio.create_task(conversation.delete_conversation("s1"))
+        await asyncio.sleep(0.05)
+        release.set()
+        await asyncio.gather(flush, delete)
+
+        assert await _count(factory) == 0
+        await buffer.stop()
+        await engine.dispose()
+
+    asyncio.run(run())